@@ -0,0 +1,85 @@
+"""
+Time from process start to the initialize response of the Java language
+server: launched with a bare `java -jar`, with Java-CodeIntel's tuned JVM
+options, and with those plus the AppCDS archive dumped from jdtls.classlist.
+
+Usage: python3 benchmarks/jdtls_startup.py [--root PROJECT] [--java JAVA] [--runs N]
+
+Run build.sh first so dist/ has the server and its jdtls.classlist.
+"""
+import os
+import ast
+import sys
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from lspbench import DIST_PATH, SRC_PATH, Server
+
+sys.path.insert(0, os.path.join(SRC_PATH, 'plugins'))
+
+from CodeIntelCommon import cds  # noqa: E402
+
+
+def plugin_jvm_args():
+    """The JVM_ARGS list in Java-CodeIntel/plugin.py (which needs sublime to be imported)."""
+    with open(os.path.join(SRC_PATH, 'plugins', 'Java-CodeIntel', 'plugin.py')) as f:
+        for node in ast.parse(f.read()).body:
+            if isinstance(node, ast.Assign) and [t.id for t in node.targets if isinstance(t, ast.Name)] == ['JVM_ARGS']:
+                return ast.literal_eval(node.value)
+
+
+def time_to_initialize(java, jvm_args, server_dir, root, runs):
+    platform = {'darwin': 'osx', 'win32': 'windows'}.get(sys.platform, 'linux')
+    times = []
+    for _ in range(runs):
+        data_dir = tempfile.mkdtemp()
+        server = Server([java] + jvm_args + [
+            "-jar", os.path.join(server_dir, "plugins", "org.eclipse.equinox.launcher.jar"),
+            "-configuration", os.path.join(server_dir, "config_" + platform),
+            "-data", data_dir,
+        ], cwd=root)
+        try:
+            times.append(server.initialize(root))
+        finally:
+            server.close()
+            shutil.rmtree(data_dir, ignore_errors=True)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=os.getcwd())
+    parser.add_argument("--java", default="java")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+    server_dir = os.path.join(DIST_PATH, "Java-CodeIntel", "server")
+    launcher = os.path.join(server_dir, "plugins", "org.eclipse.equinox.launcher.jar")
+    classlist = os.path.join(server_dir, "jdtls.classlist")
+    if not os.path.exists(launcher):
+        parser.error("{} not found, run build.sh first".format(launcher))
+
+    tuned = plugin_jvm_args()
+    modes = [("bare", []), ("tuned", tuned)]
+    archive_dir = tempfile.mkdtemp()
+    try:
+        if os.path.exists(classlist):
+            archive = os.path.join(archive_dir, "jdtls.jsa")
+            cds.dump(args.java, tuned, [launcher], classlist, archive)
+            if os.path.exists(archive):
+                modes.append(("tuned + CDS", tuned + ["-Xshare:auto", "-XX:SharedArchiveFile=" + archive]))
+            else:
+                print("{} could not dump an archive from {}".format(args.java, classlist))
+        else:
+            print("{} not found, run jdtls_classlist.py".format(classlist))
+        for name, jvm_args in modes:
+            elapsed = time_to_initialize(args.java, jvm_args, server_dir, root, args.runs)
+            print("{:<14} {:>8.0f}ms".format(name, elapsed * 1000))
+    finally:
+        shutil.rmtree(archive_dir)
+
+
+if __name__ == '__main__':
+    main()
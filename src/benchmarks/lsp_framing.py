@@ -0,0 +1,205 @@
+"""
+Throughput of the proxies' framing (CodeIntelCommon/server/jsonrpc.py) on
+server traffic: every message decoded and encoded again (how the pool used
+to forward them), versus passed through with only its id read and replaced,
+plus full decoding/encoding with every JSON codec available.
+
+Usage: python3 benchmarks/lsp_framing.py [RECORDING.server...] [--repeat N]
+
+Recordings are made by running the editor with CODEINTEL_LSP_RECORD=DIR (see
+lsproxy.py), one per server. Without any, synthetic traffic shaped like
+tsserver's and cquery's (large completion and workspace/symbol responses,
+lots of small notifications) is used.
+
+Before timing, every message (and KEY_ORDERS, messages with their fields in
+unusual orders) is checked to be told apart the same way passed through as
+decoded.
+"""
+import io
+import json
+import time
+import random
+import argparse
+
+from lspbench import COMMON_SERVER_PATH  # noqa: F401 (puts jsonrpc on the path)
+
+import jsonrpc  # noqa: E402
+
+
+# Bodies with their top-level scalars after nested values, nested values
+# holding the same keys, or scalars straddling the end of the head.
+KEY_ORDERS = [
+    b'{"params":{"x":1},"method":"m","meta":{}}',
+    b'{"result":[1],"extra":{},"id":3,"z":{}}',
+    b'{"jsonrpc":"2.0","method":"r","params":{"a":{}},"id":7}',
+    b'{"jsonrpc":"2.0","params":{"method":"x"},"method":"n"}',
+    b'{"jsonrpc":"2.0","result":{"id":9},"id":2}',
+    b'{"jsonrpc":"2.0","params":{"s":"\\u00e9"},"method":"n"}',
+    b'{"error":{"code":1},"id":null}',
+    b'{"jsonrpc":"2.0","id":1,"result":{"items":[]}}',
+    b'{"jsonrpc":"2.0","method":"n","params":{"a":{}}}',
+    # An id cut by the end of the scanned head (HEAD_SIZE).
+    b'{"jsonrpc":"2.0","pad":"' + b'x' * (jsonrpc.HEAD_SIZE - 35) + b'","id":123456,"result":null}',
+]
+
+
+def routing(message):
+    return (message.get('id'), message.get('method'),
+            message.is_request(), message.is_notification(), message.is_response())
+
+
+def check(data):
+    """Checks that every message is told apart the same passed through as decoded, returns how many."""
+    bodies = list(KEY_ORDERS)
+    reader = jsonrpc.FrameReader(io.BytesIO(data))
+    while True:
+        body = reader.read_frame()
+        if body is None:
+            break
+        bodies.append(bytes(body))
+    for body in bodies:
+        passed = routing(jsonrpc.Message(body))
+        decoded = routing(jsonrpc.Message(data=json.loads(body.decode('utf-8'))))
+        if passed != decoded:
+            raise AssertionError("{!r}: {} passed through, {} decoded".format(body[:200], passed, decoded))
+    return len(bodies)
+
+
+def line_reader(stream):
+    """The frames of stream, read line by line (the framing before jsonrpc.FrameReader)."""
+    while True:
+        content_length = None
+        while True:
+            line = stream.readline()
+            if not line:
+                return
+            line = line.strip()
+            if not line:
+                break
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                content_length = int(value.strip())
+        body = stream.read(content_length)
+        if len(body) < content_length:
+            return
+        yield body
+
+
+def decode_all(data):
+    count = 0
+    for body in line_reader(io.BytesIO(data)):
+        message = json.loads(body.decode('utf-8'))
+        message = dict(message, id=message.get('id', 0) + 1) if 'id' in message else message
+        body = json.dumps(message, separators=(',', ':')).encode('utf-8')
+        b"Content-Length: " + str(len(body)).encode('ascii') + b"\r\n\r\n" + body
+        count += 1
+    return count
+
+
+def pass_through(data):
+    count = 0
+    reader = jsonrpc.FrameReader(io.BytesIO(data))
+    while True:
+        message = reader.read()
+        if message is None:
+            return count
+        if message.is_response():
+            message = message.with_id(message.get('id', 0) + 1)
+        message.buffers()
+        count += 1
+
+
+def codec_decode_all(codec):
+    def run(data):
+        count = 0
+        reader = jsonrpc.FrameReader(io.BytesIO(data))
+        while True:
+            body = reader.read_frame()
+            if body is None:
+                return count
+            message = codec.loads(body)
+            if 'id' in message:
+                message['id'] = message.get('id', 0) + 1
+            jsonrpc.Message(data=message).buffers()
+            count += 1
+    return run
+
+
+def synthetic_traffic():
+    rng = random.Random(1)
+    words = ["get", "set", "value", "index", "Node", "Buffer", "render", "state", "props", "handle", "Event"]
+    messages = []
+    request_id = 0
+    for _ in range(40):
+        request_id += 1
+        messages.append({'jsonrpc': "2.0", 'id': request_id, 'result': {'isIncomplete': False, 'items': [{
+            'label': "".join(rng.choice(words) for _ in range(3)),
+            'kind': rng.randint(1, 25),
+            'detail': "(method) " + " ".join(rng.choice(words) for _ in range(6)),
+            'sortText': str(rng.randint(0, 9999)),
+            'data': {'file': "/work/src/app.ts", 'offset': rng.randint(0, 100000)},
+        } for _ in range(rng.randint(500, 3000))]}})
+    for _ in range(10):
+        request_id += 1
+        messages.append({'jsonrpc': "2.0", 'id': request_id, 'result': [{
+            'name': "".join(rng.choice(words) for _ in range(2)),
+            'kind': rng.randint(1, 25),
+            'location': {
+                'uri': "file:///work/src/{}/{}.cc".format(rng.choice(words), rng.choice(words)),
+                'range': {'start': {'line': rng.randint(0, 5000), 'character': 0}, 'end': {'line': 0, 'character': 10}},
+            },
+        } for _ in range(rng.randint(2000, 10000))]})
+    for i in range(3000):
+        messages.append({'jsonrpc': "2.0", 'method': "$cquery/progress", 'params': {
+            'indexRequestCount': 3000 - i, 'doIdMapCount': 0, 'loadPreviousIndexCount': 0,
+            'onIdMappedCount': 0, 'onIndexedCount': i, 'activeThreads': 8}})
+    for i in range(500):
+        messages.append({'jsonrpc': "2.0", 'method': "textDocument/publishDiagnostics", 'params': {
+            'uri': "file:///work/src/file{}.ts".format(i % 50), 'diagnostics': [{
+                'range': {'start': {'line': d, 'character': 1}, 'end': {'line': d, 'character': 9}},
+                'severity': 1, 'message': " ".join(rng.choice(words) for _ in range(8)),
+            } for d in range(rng.randint(0, 20))]}})
+    rng.shuffle(messages)
+    return b"".join(jsonrpc.encode_message(m) for m in messages)
+
+
+def measure(run, data, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = run(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recordings", nargs='*')
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    traffic = []
+    for path in args.recordings:
+        with open(path, 'rb') as f:
+            traffic.append((path, f.read()))
+    if not traffic:
+        traffic.append(("synthetic", synthetic_traffic()))
+
+    runs = [("decode all (json)", decode_all), ("pass-through", pass_through)]
+    for name in sorted(jsonrpc.CODECS):
+        try:
+            codec = jsonrpc.CODECS[name]()
+        except ImportError:
+            continue
+        runs.append(("decode all ({}, buffers)".format(name), codec_decode_all(codec)))
+
+    for name, data in traffic:
+        print("{}: {:.1f} MB, {} messages checked".format(name, len(data) / 1e6, check(data)))
+        for run_name, run in runs:
+            count, elapsed = measure(run, data, args.repeat)
+            print("  {:<28} {:>8.1f} MB/s {:>10.0f} msgs/s".format(run_name, len(data) / 1e6 / elapsed, count / elapsed))
+
+
+if __name__ == '__main__':
+    main()
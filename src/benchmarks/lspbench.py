@@ -0,0 +1,122 @@
+"""
+Helpers shared by the benchmarks: starting servers, talking LSP to them and
+reading process statistics (from /proc, so Linux only).
+"""
+import os
+import sys
+import time
+import subprocess
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIST_PATH = os.path.join(SRC_PATH, 'dist')
+COMMON_SERVER_PATH = os.path.join(SRC_PATH, 'plugins', 'CodeIntelCommon', 'server')
+
+sys.path.insert(0, COMMON_SERVER_PATH)
+
+from jsonrpc import Reader, write_message  # noqa: E402
+
+# (plugin, server script, arguments) for every Node based server.
+NODE_SERVERS = [
+    ("CSS-CodeIntel", "css-languageserver.js", ["--stdio"]),
+    ("HTML-CodeIntel", "html-languageserver.js", ["--stdio"]),
+    ("JSON-CodeIntel", "vscode-json-languageserver.js", ["--stdio"]),
+    ("YAML-CodeIntel", "yaml-language-server.js", ["--stdio"]),
+    ("Markdown-CodeIntel", "markdown-language-server.js", ["--stdio"]),
+    ("Vue-CodeIntel", "vue-language-server.js", []),
+    ("PHP-CodeIntel", "intelephense-server.js", ["--stdio"]),
+    ("Flow-CodeIntel", "flow-language-server.js", ["--stdio"]),
+    ("OCaml-CodeIntel", "ocaml-language-server.js", ["--stdio"]),
+]
+
+
+def server_script(plugin, script):
+    return os.path.join(DIST_PATH, plugin, 'server', script)
+
+
+class Server(object):
+    def __init__(self, args, cwd=None, env=None, stderr=subprocess.DEVNULL):
+        self.args = args
+        self.started = time.time()
+        self.process = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            cwd=cwd,
+            env=env)
+        self.reader = Reader(self.process.stdout)
+        self.next_id = 0
+
+    def notify(self, method, params=None):
+        write_message(self.process.stdin, {'jsonrpc': "2.0", 'method': method, 'params': params or {}})
+
+    def request(self, method, params=None):
+        self.next_id += 1
+        request_id = self.next_id
+        write_message(self.process.stdin, {'jsonrpc': "2.0", 'id': request_id, 'method': method, 'params': params or {}})
+        while True:
+            message = self.reader.read_message()
+            if message is None:
+                raise RuntimeError("{} exited while waiting for {}".format(self.args[0], method))
+            if 'method' in message:
+                if 'id' in message:
+                    # Requests from the server get an empty answer.
+                    write_message(self.process.stdin, {'jsonrpc': "2.0", 'id': message['id'], 'result': None})
+                continue
+            if message.get('id') == request_id:
+                return message
+
+    def initialize(self, root):
+        """Returns the seconds from process start to the initialize response."""
+        self.request("initialize", {
+            'processId': os.getpid(),
+            'rootPath': root,
+            'rootUri': "file://" + root,
+            'capabilities': {},
+            'initializationOptions': {},
+        })
+        elapsed = time.time() - self.started
+        self.notify("initialized")
+        return elapsed
+
+    def close(self):
+        try:
+            self.request("shutdown")
+            self.notify("exit")
+            self.process.wait(5)
+        except (IOError, OSError, RuntimeError, subprocess.TimeoutExpired):
+            pass
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+
+def children(pid):
+    result = []
+    try:
+        for tid in os.listdir("/proc/{}/task".format(pid)):
+            with open("/proc/{}/task/{}/children".format(pid, tid)) as f:
+                result.extend(int(p) for p in f.read().split())
+    except (IOError, OSError):
+        pass
+    return result
+
+
+def rss(pid, recursive=True):
+    """Returns the resident set size of pid (and its descendants) in bytes."""
+    total = 0
+    try:
+        with open("/proc/{}/status".format(pid)) as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    if recursive:
+        for child in children(pid):
+            total += rss(child)
+    return total
+
+
+def megabytes(size):
+    return "{:.1f} MB".format(size / 1024.0 / 1024.0)
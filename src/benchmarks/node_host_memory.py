@@ -0,0 +1,78 @@
+"""
+Resident memory of the Node based servers when every one of them runs in its
+own Node process versus all of them running inside the shared Node host.
+
+Usage: python3 benchmarks/node_host_memory.py [--root PROJECT] [--settle SECONDS]
+
+Servers which haven't been built into dist/ are skipped. The hosted numbers
+include the lsnode.py bridge processes; when servers are pooled (the default)
+the pool daemon talks to the host directly and there are no bridges.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from lspbench import COMMON_SERVER_PATH, NODE_SERVERS, Server, server_script, rss, megabytes
+
+
+def start_all(make_args, root):
+    servers = []
+    for plugin, script, args in NODE_SERVERS:
+        path = server_script(plugin, script)
+        if not os.path.exists(path):
+            print("  {:<20} not built, skipped".format(plugin))
+            continue
+        server = Server(make_args(path, args), cwd=root)
+        server.plugin = plugin
+        try:
+            server.initialize(root)
+        except RuntimeError as e:
+            print("  {:<20} {}".format(plugin, e))
+            continue
+        servers.append(server)
+    return servers
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=os.getcwd())
+    parser.add_argument("--settle", type=float, default=3.0)
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+
+    print("Separate Node processes:")
+    servers = start_all(lambda path, server_args: ["node", path] + server_args, root)
+    time.sleep(args.settle)
+    separate = 0
+    for server in servers:
+        size = rss(server.process.pid)
+        separate += size
+        print("  {:<20} {:>10}".format(server.plugin, megabytes(size)))
+    for server in servers:
+        server.close()
+    print("  {:<20} {:>10}".format("total", megabytes(separate)))
+
+    state_dir = tempfile.mkdtemp()
+    try:
+        print("Shared Node host:")
+        lsnode = os.path.join(COMMON_SERVER_PATH, "lsnode.py")
+        servers = start_all(lambda path, server_args: [sys.executable, lsnode, "--state-dir", state_dir, "--", "node", path] + server_args, root)
+        time.sleep(args.settle)
+        with open(os.path.join(state_dir, "lsnode-node.json")) as f:
+            host = rss(json.load(f)['pid'])
+        bridges = sum(rss(server.process.pid, recursive=False) for server in servers)
+        for server in servers:
+            server.close()
+        print("  {:<20} {:>10}".format("node host", megabytes(host)))
+        print("  {:<20} {:>10}".format("bridges", megabytes(bridges)))
+        print("  {:<20} {:>10}".format("total", megabytes(host + bridges)))
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Time from process start to the initialize response for every Node based
+server, loading the bundle plainly versus through the lscache.js V8 code cache
+loader.
+
+Usage: python3 benchmarks/node_startup.py [--root PROJECT] [--runs N]
+
+Run build.sh first so dist/ has the bundles and their *.js.cache files.
+"""
+import os
+import argparse
+import statistics
+
+from lspbench import COMMON_SERVER_PATH, NODE_SERVERS, Server, server_script
+
+SERVERS = NODE_SERVERS + [
+    ("JavaScript-CodeIntel", os.path.join("lsp-tsserver", "dist", "server.js"), ["--logVerbosity", "terse"]),
+]
+
+
+def time_to_initialize(args, root, runs):
+    times = []
+    for _ in range(runs):
+        server = Server(args, cwd=root)
+        try:
+            times.append(server.initialize(root))
+        finally:
+            server.close()
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=os.getcwd())
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+    lscache = os.path.join(COMMON_SERVER_PATH, "lscache.js")
+
+    print("{:<22} {:>10} {:>10} {:>8}".format("server", "plain", "cached", "speedup"))
+    for plugin, script, server_args in SERVERS:
+        path = server_script(plugin, script)
+        if not os.path.exists(path):
+            print("{:<22} not built, skipped".format(plugin))
+            continue
+        if not os.path.exists(path + ".cache"):
+            print("{:<22} has no {}.cache".format(plugin, os.path.basename(path)))
+        try:
+            plain = time_to_initialize(["node", path] + server_args, root, args.runs)
+            cached = time_to_initialize(["node", lscache, path] + server_args, root, args.runs)
+        except RuntimeError as e:
+            print("{:<22} {}".format(plugin, e))
+            continue
+        print("{:<22} {:>8.0f}ms {:>8.0f}ms {:>7.2f}x".format(plugin, plain * 1000, cached * 1000, plain / cached))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Start time of the Python language server, from process start to the
+initialize response (when pyls has loaded its plugins' entry points, and so
+imported the whole stack), from the loose tree versus the precompiled zip
+built by pyls_zip.py.
+
+Usage: python3 benchmarks/pyls_import.py [--server DIR] [--python PYTHON] [--root PROJECT] [--runs N] [--profile N]
+
+"loose, no bytecode" is what a read-only install (no __pycache__ can be
+written) pays on every start. --profile runs every mode once more under
+`-X importtime` (Python 3.7+, not timed as it slows the imports down) and
+lists its N slowest top level imports up to the initialize response.
+"""
+import os
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from lspbench import DIST_PATH, Server
+
+
+def start(python, server, env, root, python_args=(), stderr=subprocess.DEVNULL):
+    """Returns the seconds pyls took to answer initialize."""
+    server = Server(
+        [python] + list(python_args) + [os.path.join(server, "pyls.py")],
+        cwd=root, env=dict(os.environ, **env), stderr=stderr)
+    try:
+        return server.initialize(root)
+    finally:
+        server.close()
+
+
+def run(python, server, env, root, runs):
+    return statistics.median(start(python, server, env, root) for _ in range(runs))
+
+
+def profile(python, server, env, root):
+    """Returns the (cumulative microseconds, module) of the top level imports of a start."""
+    with tempfile.TemporaryFile() as log:
+        start(python, server, env, root, ["-X", "importtime"], log)
+        log.seek(0)
+        lines = log.read().decode('utf-8', 'replace').splitlines()
+    imports = []
+    for line in lines:
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            imports.append((int(cumulative), name.strip()))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", default=os.path.join(DIST_PATH, "Python-CodeIntel", "server"))
+    parser.add_argument("--python", default="python3")
+    parser.add_argument("--root", default=os.getcwd())
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--profile", type=int, default=0, metavar="N")
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+
+    major = subprocess.check_output([args.python, "-c", "import sys; print(sys.version_info[0])"]).strip().decode()
+    archive = os.path.join(args.server, "pyls-py{}.zip".format(major))
+    if not os.path.exists(archive):
+        parser.error("{} not found, run pyls_zip.py first".format(archive))
+
+    empty_prefix = tempfile.mkdtemp()
+    try:
+        modes = [
+            ("loose", {'CODEINTEL_PYLS_ZIP': "0"}),
+            ("loose, no bytecode", {'CODEINTEL_PYLS_ZIP': "0", 'PYTHONDONTWRITEBYTECODE': "1", 'PYTHONPYCACHEPREFIX': empty_prefix}),
+            ("zip", {'CODEINTEL_PYLS_ZIP': "1"}),
+        ]
+        # warm up the OS file cache
+        run(args.python, args.server, modes[0][1], root, 1)
+        for name, env in modes:
+            print("{:<20} {:>8.0f}ms".format(name, run(args.python, args.server, env, root, args.runs) * 1000))
+        if args.profile:
+            for name, env in modes:
+                imports = profile(args.python, args.server, env, root)
+                print("\n{}: {} top level imports, {:.0f}ms".format(
+                    name, len(imports), sum(cumulative for cumulative, _ in imports) / 1000))
+                for cumulative, module in sorted(imports, reverse=True)[:args.profile]:
+                    print("  {:<40} {:>8.1f}ms".format(module, cumulative / 1000))
+    finally:
+        shutil.rmtree(empty_prefix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Cost of finding the schema for a file: every fileMatch glob of the JSON
+catalog tried one by one (how the servers do it) versus the compiled
+CodeIntelCommon.schemamatch.Matcher, over a synthetic 100k path workspace.
+
+Usage: python3 benchmarks/schema_match.py [--files N] [--explain PATH...]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+from lspbench import SRC_PATH
+
+sys.path.insert(0, os.path.join(SRC_PATH, 'plugins'))
+
+from CodeIntelCommon.schemamatch import Matcher, glob_to_regex  # noqa: E402
+from schemastore import load_catalog  # noqa: E402
+
+DIRS = ["src", "lib", "test", "docs", "config", "tasks", ".circleci", ".vscode", "packages/app", "node_modules/x"]
+NAMES = ["index", "main", "util", "README", "settings", "data", "schema", "app"]
+EXTENSIONS = [".js", ".ts", ".py", ".json", ".yml", ".yaml", ".md", ".css", ".html", ".txt"]
+
+
+def workspace(catalog, files):
+    """Paths of mostly unrelated files, with some named as the catalog expects."""
+    rng = random.Random(1)
+    literals = [p.replace('*', rng.choice(NAMES)) for s in catalog for p in s.get('fileMatch', ())]
+    paths = []
+    for _ in range(files):
+        directory = "/".join(rng.choice(DIRS) for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.1:
+            name = rng.choice(literals)
+        else:
+            name = rng.choice(NAMES) + rng.choice(EXTENSIONS)
+        paths.append("/work/{}/{}".format(directory, name))
+    return paths
+
+
+def naive(catalog):
+    patterns = [
+        (re.compile('(?:^|/){}$'.format(glob_to_regex(p.lstrip('/')))), schema)
+        for schema in catalog for p in schema.get('fileMatch', ())
+    ]
+
+    def match(path):
+        for regex, schema in patterns:
+            if regex.search(path):
+                return schema
+    return match
+
+
+def timed(match, paths):
+    start = time.perf_counter()
+    matched = sum(1 for path in paths if match(path))
+    return (time.perf_counter() - start) / len(paths), matched
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--explain", nargs='*', default=[])
+    args = parser.parse_args()
+
+    catalog = load_catalog(os.path.join(SRC_PATH, "plugins", "JSON-CodeIntel", "catalog.json"))
+    start = time.perf_counter()
+    matcher = Matcher(catalog)
+    compile_time = time.perf_counter() - start
+    paths = workspace(catalog, args.files)
+
+    print("{} schemas, {} paths, compiled in {:.1f}ms".format(len(catalog), len(paths), compile_time * 1000))
+    for name, match in (("one by one", naive(catalog)), ("compiled", matcher.match)):
+        per_file, matched = timed(match, paths)
+        print("{:<12} {:>8.2f}us/file {:>8} matched".format(name, per_file * 1e6, matched))
+    for path in args.explain:
+        print(matcher.explain(path))
+
+
+if __name__ == '__main__':
+    main()
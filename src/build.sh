@@ -48,6 +48,28 @@ npm run build
 
 cp node_modules/typescript/lib/lib.*.ts dist/JavaScript-CodeIntel/server/lsp-tsserver/dist
 
+# V8 code caches (*.js.cache) for the server bundles (the entries in
+# webpack.config.js), used by lscache.js
+node plugins/CodeIntelCommon/server/lscache.js --build \
+	dist/JavaScript-CodeIntel/server/lsp-tsserver/dist/server.js \
+	dist/JavaScript-CodeIntel/server/node_modules/eslint.js \
+	dist/JavaScript-CodeIntel/server/node_modules/eslint-language-service.js \
+	dist/JavaScript-CodeIntel/server/node_modules/tslint.js \
+	dist/JavaScript-CodeIntel/server/node_modules/tslint-language-service.js \
+	dist/PHP-CodeIntel/server/intelephense-server.js \
+	dist/Markdown-CodeIntel/server/markdown-language-server.js \
+	dist/CSS-CodeIntel/server/css-languageserver.js \
+	dist/HTML-CodeIntel/server/html-languageserver.js \
+	dist/JSON-CodeIntel/server/vscode-json-languageserver.js \
+	dist/YAML-CodeIntel/server/yaml-language-server.js \
+	dist/OCaml-CodeIntel/server/ocaml-language-server.js \
+	dist/Vue-CodeIntel/server/vue-language-server.js
+
+# Offline copies of the JSON schemas in the catalog, which the JSON plugin
+# hands the server as file:// URLs (refreshed with "CodeIntel: Refresh JSON
+# Schemas"; check with `schemastore.py verify`)
+python3 plugins/CodeIntelCommon/server/schemastore.py fetch dist/JSON-CodeIntel/server/schemas plugins/JSON-CodeIntel/catalog.json
+
 
 ########################################################################
 # Python LS
@@ -85,6 +107,16 @@ rm -rf dist/Python-CodeIntel/server/pyls
 ln -fs ../../../python-language-server/pyls dist/Python-CodeIntel/server
 
 ln -fs ../../../pyls.py dist/Python-CodeIntel/server
+ln -fs ../../../pyls_dmypy.py dist/Python-CodeIntel/server
+
+# Precompiled zips of the pure Python packages, loaded by pyls.py through
+# zipimport (build with `PYLS_ZIP=1 ./build.sh`):
+if [ -n "$PYLS_ZIP" ]; then
+	python3 pyls_zip.py dist/Python-CodeIntel/server
+	if command -v python2 >/dev/null; then
+		python2 pyls_zip.py dist/Python-CodeIntel/server
+	fi
+fi
 
 ########################################################################
 # Java LS
@@ -102,6 +134,9 @@ cd plugins
 ln -fs org.eclipse.equinox.launcher_*.jar org.eclipse.equinox.launcher.jar
 cd ../../../..
 
+# Classes loaded while starting up, the plugin dumps AppCDS archives from it:
+python3 jdtls_classlist.py dist/Java-CodeIntel/server
+
 # Or build from sources:
 
 # cd eclipse.jdt.ls
@@ -140,6 +175,8 @@ mkdir -p dist/Rust-CodeIntel
 # Scala LS
 ./coursier fetch --cache dist/Scala-CodeIntel/server -p ch.epfl.lamp:dotty-language-server_0.8:0.8.0
 ln -fs ../../../coursier dist/Scala-CodeIntel/server/coursier
+# (the plugin stores the resolved classpath in server/classpath.json the first
+# time it starts the server, and runs the server's main class directly after)
 
 # java -jar dist/Scala-CodeIntel/server/coursier launch --cache dist/Scala-CodeIntel/server ch.epfl.lamp:dotty-language-server_0.8:0.8.0 -M dotty.tools.languageserver.Main -- -stdio  # <- starts server
 
@@ -166,6 +203,10 @@ go get -u github.com/nsf/gocode
 brew install r
 # R --quiet --slave -e languageserver::run()  # <- starts server
 
+########################################################################
+# Common helpers shared by all plugins (server pool, etc.)
+mkdir -p dist/CodeIntelCommon
+
 ########################################################################
 # Add plugins and rsync
 for plugin in dist/*; do
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Records the classes the Java language server loads while starting up and
+compiling a file (a training run over a throwaway project), for the AppCDS
+archives dumped from it (see plugins/CodeIntelCommon/cds.py).
+
+Usage: jdtls_classlist.py SERVER_DIR [--java JAVA] [--timeout SECONDS]
+
+Writes SERVER_DIR/jdtls.classlist. The list only names classes, so unlike the
+archives it doesn't depend on the JVM version or where the server is installed.
+Only the classes of the JVM's built-in loaders (the JDK's and the launcher's)
+are kept: the ones of the server's OSGi bundles, which newer JVMs record with
+the jar they came from, are loaded by Equinox's own class loaders, which
+AppCDS never serves from the archive.
+"""
+import os
+import sys
+import time
+import shutil
+import pathlib
+import argparse
+import tempfile
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plugins', 'CodeIntelCommon', 'server'))
+
+from jsonrpc import Reader, write_message  # noqa: E402
+
+SOURCE = """\
+package training;
+
+import java.util.ArrayList;
+import java.util.List;
+
+public class Main {
+    public static void main(String[] args) {
+        List<String> names = new ArrayList<>();
+        names.add("world");
+        for (String name : names) {
+            System.out.println("Hello, " + name);
+        }
+    }
+}
+"""
+
+
+class Session(object):
+    def __init__(self, process):
+        self.process = process
+        self.reader = Reader(process.stdout)
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.diagnostics = threading.Event()
+        self.responses = {}
+        self.responded = threading.Condition(self.lock)
+        thread = threading.Thread(target=self.read)
+        thread.daemon = True
+        thread.start()
+
+    def read(self):
+        while True:
+            message = self.reader.read_message()
+            if message is None:
+                break
+            if 'method' in message:
+                if message['method'] == 'textDocument/publishDiagnostics':
+                    self.diagnostics.set()
+                elif 'id' in message:
+                    self.send({'jsonrpc': "2.0", 'id': message['id'], 'result': None})
+                continue
+            with self.lock:
+                self.responses[message.get('id')] = message
+                self.responded.notify_all()
+        with self.lock:
+            self.responses[None] = None
+            self.responded.notify_all()
+
+    def send(self, message):
+        with self.write_lock:
+            write_message(self.process.stdin, message)
+
+    def notify(self, method, params=None):
+        self.send({'jsonrpc': "2.0", 'method': method, 'params': params or {}})
+
+    def request(self, method, params, timeout):
+        with self.lock:
+            self.next_id += 1
+            request_id = self.next_id
+        self.send({'jsonrpc': "2.0", 'id': request_id, 'method': method, 'params': params})
+        deadline = time.time() + timeout
+        with self.lock:
+            while request_id not in self.responses and None not in self.responses:
+                if not self.responded.wait(deadline - time.time()):
+                    raise RuntimeError("no response to {} in {} seconds".format(method, timeout))
+            if request_id not in self.responses:
+                raise RuntimeError("server exited while waiting for {}".format(method))
+            return self.responses[request_id]
+
+
+def train(java, server_dir, classlist, timeout):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        project = os.path.join(tmp_dir, 'project')
+        source_dir = os.path.join(project, 'training')
+        os.makedirs(source_dir)
+        source_path = os.path.join(source_dir, 'Main.java')
+        with open(source_path, 'w') as f:
+            f.write(SOURCE)
+        platform = {'darwin': 'osx', 'win32': 'windows'}.get(sys.platform, 'linux')
+        process = subprocess.Popen([
+            java,
+            "-XX:DumpLoadedClassList=" + classlist,
+            "-jar", os.path.join(server_dir, "plugins", "org.eclipse.equinox.launcher.jar"),
+            "-configuration", os.path.join(server_dir, "config_" + platform),
+            "-data", os.path.join(tmp_dir, 'data'),
+        ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        session = Session(process)
+        try:
+            session.request("initialize", {
+                'processId': os.getpid(),
+                'rootPath': project,
+                'rootUri': pathlib.Path(project).as_uri(),
+                'capabilities': {},
+            }, timeout)
+            session.notify("initialized")
+            session.notify("textDocument/didOpen", {'textDocument': {
+                'uri': pathlib.Path(source_path).as_uri(),
+                'languageId': "java",
+                'version': 1,
+                'text': SOURCE,
+            }})
+            if not session.diagnostics.wait(timeout):
+                sys.stderr.write("No diagnostics in {} seconds, the class list may be partial\n".format(timeout))
+            session.request("shutdown", None, timeout)
+            session.notify("exit")
+            process.wait(timeout)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def builtin_classes(classlist):
+    """Drops the classes of other loaders than the built-in ones (listed with a `source:`) from classlist."""
+    with open(classlist) as f:
+        lines = f.readlines()
+    kept = [line for line in lines if " source:" not in line]
+    with open(classlist, 'w') as f:
+        f.writelines(kept)
+    return len(lines) - len(kept)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("server_dir")
+    parser.add_argument("--java", default="java")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    classlist = os.path.join(os.path.realpath(args.server_dir), "jdtls.classlist")
+    train(args.java, os.path.realpath(args.server_dir), classlist, args.timeout)
+    if not os.path.exists(classlist):
+        sys.stderr.write("{} did not write a class list (needs Java 9 or newer)\n".format(args.java))
+        return 1
+    dropped = builtin_classes(classlist)
+    with open(classlist) as f:
+        print("{}: {} classes ({} of the bundles dropped)".format(
+            classlist, sum(1 for line in f if not line.startswith('#')), dropped))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
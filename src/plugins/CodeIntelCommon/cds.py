@@ -0,0 +1,79 @@
+"""
+AppCDS (class data sharing) archives for the Java based servers.
+
+The build records the classes a server loads while starting up in a class
+list. An archive only works for the exact JVM and class path it was dumped
+with, so it's dumped on the user's machine from that list (in the background,
+the first time it's asked for) and kept under ~/.codeintel/cds. Servers started
+with it map the classes already parsed and verified instead of loading them
+from the jars.
+
+Only the classes of the JVM's built-in class loaders (the JDK's and the class
+path's) are archived: for OSGi servers like jdt.ls, whose bundles are loaded
+by Equinox's own class loaders, that's the JDK and the launcher, not the
+server's bundles.
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+import subprocess
+
+CACHE_DIR = os.path.expanduser("~/.codeintel/cds")
+
+_dumping = set()
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def archive_path(java, jvm_args, classpath, classlist):
+    java = os.path.realpath(shutil.which(java) or java)
+    classpath = [os.path.realpath(p) for p in classpath]
+    key = [java, _mtime(java), jvm_args, classpath, [_mtime(p) for p in classpath], _mtime(classlist)]
+    data = json.dumps(key, sort_keys=True)
+    return os.path.join(CACHE_DIR, hashlib.sha1(data.encode('utf-8')).hexdigest()[:16] + ".jsa")
+
+
+def dump(java, jvm_args, classpath, classlist, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        returncode = subprocess.call([java] + jvm_args + [
+            "-Xshare:dump",
+            "-XX:SharedClassListFile=" + classlist,
+            "-XX:SharedArchiveFile=" + tmp_path,
+            "-cp", os.pathsep.join(classpath),
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if returncode == 0 and os.path.exists(tmp_path):
+            os.replace(tmp_path, path)
+    except OSError:
+        pass
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def archive_args(java, jvm_args, classpath, classlist):
+    """
+    Returns the JVM options which start a server with its archive, or no
+    options (and the archive starts being dumped for the next start) if
+    there's none yet. -Xshare:auto makes a JVM which can't map the archive
+    just load the classes as usual.
+    """
+    if not os.path.exists(classlist):
+        return []
+    path = archive_path(java, jvm_args, classpath, classlist)
+    if os.path.exists(path):
+        return ["-Xshare:auto", "-XX:SharedArchiveFile=" + path]
+    if path not in _dumping:
+        _dumping.add(path)
+        thread = threading.Thread(target=dump, args=(java, jvm_args, classpath, classlist, path))
+        thread.daemon = True
+        thread.start()
+    return []
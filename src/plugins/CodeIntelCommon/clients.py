@@ -0,0 +1,78 @@
+"""
+The clients of the servers running in every window, for what talks to all of
+them (see idle.py and symbols.py). Plugins call `starting` from on_start
+(after pool.binary_args) and `initialized` from on_initialized.
+
+on_initialized doesn't tell the window, so the starts of a config are paired
+with its clients in the order they were made: several windows may be
+starting the same server at once (when a session is restored).
+"""
+import sublime
+
+import threading
+from collections import deque
+
+from CodeIntelCommon import pool
+
+_lock = threading.Lock()
+_starting = {}  # config name -> deque of (window id, pooled), oldest first
+_clients = {}  # (window id, config name) -> Entry
+
+
+class Entry(object):
+    def __init__(self, config, client, pooled):
+        self.config = config
+        self.client = client
+        self.pooled = pooled
+
+
+def starting(window, config):
+    prune()
+    with _lock:
+        pending = _starting.setdefault(config.name, deque())
+        for started in list(pending):
+            if started[0] == window.id():
+                pending.remove(started)  # that start never got a client
+        pending.append((window.id(), pool.is_pooled(config)))
+
+
+def initialized(config, client):
+    with _lock:
+        pending = _starting.get(config.name)
+        if pending:
+            window_id, pooled = pending.popleft()
+            _clients[(window_id, config.name)] = Entry(config, client, pooled)
+
+
+def window_clients(window):
+    """Returns the entries of the window's clients."""
+    with _lock:
+        return [entry for (window_id, _), entry in _clients.items() if window_id == window.id()]
+
+
+def window_client(window_id, name):
+    """Returns the client of the named config in a window, or None."""
+    with _lock:
+        entry = _clients.get((window_id, name))
+    return entry and entry.client
+
+
+def forget(entry):
+    """Drops a client found to be gone."""
+    with _lock:
+        for key, other in list(_clients.items()):
+            if other is entry:
+                del _clients[key]
+
+
+def prune():
+    """Drops the clients and starts of the windows which were closed."""
+    open_windows = set(window.id() for window in sublime.windows())
+    with _lock:
+        for key in list(_clients):
+            if key[0] not in open_windows:
+                del _clients[key]
+        for pending in _starting.values():
+            for started in list(pending):
+                if started[0] not in open_windows:
+                    pending.remove(started)
@@ -0,0 +1,64 @@
+import sublime
+import sublime_plugin
+
+from CodeIntelCommon import jobs
+from CodeIntelCommon import status
+from CodeIntelCommon import symbols
+
+
+class CodeintelToggleNotificationRatesCommand(sublime_plugin.ApplicationCommand):
+    def run(self):
+        status.show_rates = not status.show_rates
+        if status.show_rates:
+            for s in status.statuses():
+                print("{}: {}".format(s.key, s.describe()))
+        sublime.status_message("Notification rates {}".format("shown" if status.show_rates else "hidden"))
+
+    def is_checked(self):
+        return status.show_rates
+
+
+class CodeintelCancelSetupCommand(sublime_plugin.ApplicationCommand):
+    """Cancels the servers' running setup tasks (toolchain installs and such)."""
+    def run(self):
+        tasks = jobs.running_tasks()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            sublime.status_message("Cancelled {}".format(", ".join(task.name for task in tasks)))
+        else:
+            sublime.status_message("No setup running")
+
+
+class CodeintelSearchSymbolsCommand(sublime_plugin.WindowCommand):
+    """Searches the symbols of all the window's servers, showing the results as they come in."""
+    def run(self):
+        self.search = None
+        self.window.show_input_panel("Search Symbols Everywhere:", "", self.start, None, None)
+
+    def start(self, query):
+        if query:
+            search = self.search = symbols.Search(self.window, query, lambda *args: self.show(search, *args))
+            search.start()
+
+    def show(self, search, results, answered, total, timed_out):
+        if search is not self.search:
+            return  # closed, or another search started
+        message = "{} symbols from {} of {} servers".format(len(results), answered, total)
+        if timed_out:
+            message += ", {} timed out".format(", ".join(timed_out))
+        sublime.status_message(message)
+        if not results and timed_out is None:
+            return
+        items = [[symbol.get('name', ""), search.describe(name, symbol)] for name, symbol in results]
+        # The panel shown replaces the last one, which gets -1.
+        self.replacing = True
+        self.window.show_quick_panel(items or [["No symbols found", message]], lambda index: self.open(results, index))
+        self.replacing = False
+
+    def open(self, results, index):
+        if self.replacing:
+            return
+        self.search = None
+        if 0 <= index < len(results):
+            symbols.open_symbol(self.window, results[index][1])
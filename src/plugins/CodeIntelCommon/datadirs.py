@@ -0,0 +1,90 @@
+"""
+Per-project data directories for servers which keep an index on disk (like
+JDT LS's workspace), so re-opening a project reuses it.
+
+Directories are named after a hash of the window folders and kept under a
+base directory, where the least recently used ones are evicted once they
+take more than a given total size.
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def data_dir(base, folders):
+    """Returns the data directory for a project (creating it), marking it as just used."""
+    folders = sorted(folders)
+    path = os.path.join(base, hashlib.sha1(json.dumps(folders).encode('utf-8')).hexdigest()[:16])
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "folders.json"), 'w') as f:
+        json.dump(folders, f, indent=1)
+    os.utime(path, None)
+    return path
+
+
+def size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for filename in files:
+            try:
+                total += os.lstat(os.path.join(root, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def is_locked(path):
+    """Tells if some process holds a lock on the file at path (always False where locks can't be checked)."""
+    if fcntl is None or not os.path.exists(path):
+        return False
+    try:
+        with open(path, 'a') as f:
+            try:
+                fcntl.lockf(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+            fcntl.lockf(f, fcntl.LOCK_UN)
+    except OSError:
+        pass
+    return False
+
+
+def evict(base, max_size, keep=(), lock_file=None):
+    """
+    Removes the least recently used directories in base until they all take
+    at most max_size bytes. Directories in keep, or whose lock_file is locked
+    by a running server, are never removed.
+    """
+    try:
+        names = os.listdir(base)
+    except OSError:
+        return
+    keep = set(os.path.realpath(p) for p in keep)
+    entries = []
+    for name in names:
+        path = os.path.join(base, name)
+        if os.path.isdir(path):
+            entries.append((os.path.getmtime(path), path, size(path)))
+    total = sum(e[2] for e in entries)
+    for _, path, path_size in sorted(entries):
+        if total <= max_size:
+            break
+        if os.path.realpath(path) in keep:
+            continue
+        if lock_file and is_locked(os.path.join(path, lock_file)):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= path_size
+
+
+def evict_in_background(base, max_size, keep=(), lock_file=None):
+    thread = threading.Thread(target=evict, args=(base, max_size, keep, lock_file))
+    thread.daemon = True
+    thread.start()
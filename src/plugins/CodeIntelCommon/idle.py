@@ -0,0 +1,38 @@
+"""
+Tells the pools of the servers with an idle_timeout (see pool.py) that they're
+in use while a window shows a document of their languages, so they aren't
+hibernated then, and are resumed as soon as such a view is focused again.
+"""
+import time
+
+from SublimeCodeIntel.plugin.core.protocol import Notification
+
+from CodeIntelCommon import clients
+
+# Seconds between the notifications for the same server while its views are used.
+ACTIVE_INTERVAL = 60
+
+_last = {}  # client -> time of the last notification
+
+
+def selector(config):
+    return ", ".join(scope for language in config.languages.values() for scope in language.get("scopes", ()))
+
+
+def view_used(view, focused=False):
+    window = view.window()
+    if not window:
+        return
+    now = time.time()
+    for entry in clients.window_clients(window):
+        if not getattr(entry.config, 'idle_timeout', None) or not entry.pooled:
+            continue
+        if not focused and now - _last.get(entry.client, 0) < ACTIVE_INTERVAL:
+            continue
+        if view.match_selector(0, selector(entry.config)):
+            _last[entry.client] = now
+            try:
+                entry.client.send_notification(Notification("$/codeintel/active", {}))
+            except Exception:
+                clients.forget(entry)  # the client is gone
+                _last.pop(entry.client, None)
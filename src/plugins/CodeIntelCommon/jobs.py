@@ -0,0 +1,222 @@
+"""
+Runs the slow commands plugins need while setting up their servers (probing
+and installing toolchains and such): their output is streamed line by line as
+it comes, several can run at once, and they can be cancelled or timed out.
+
+A Task is a background function running such commands; every command run
+from its thread (or from the threads of its `parallel` calls) belongs to it,
+so cancelling the task kills whatever it's running at the moment ("CodeIntel:
+Cancel Setup" cancels every running task).
+"""
+import os
+import re
+import threading
+import subprocess
+
+LINE_BREAK_RE = re.compile(br'\r\n|\r|\n')
+
+_local = threading.local()
+
+_tasks = []  # every Task, for running_tasks()
+
+
+class JobError(RuntimeError):
+    def __init__(self, message, returncode=None, stdout="", stderr=""):
+        super().__init__(message)
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class Cancelled(JobError):
+    pass
+
+
+class TimedOut(JobError):
+    pass
+
+
+def current_task():
+    return getattr(_local, 'task', None)
+
+
+class Job(object):
+    """
+    A running command. on_line(line, stream) is called from a reader thread
+    for every line (or carriage return terminated progress update) the
+    command writes, stream being 'stdout' or 'stderr'.
+    """
+    def __init__(self, cmd, cwd=None, env=None, timeout=None, on_line=None):
+        self.cmd = cmd
+        self.timeout = timeout
+        self.on_line = on_line
+        self.output = {'stdout': [], 'stderr': []}
+        self.cancelled = False
+        startupinfo = None
+        if os.name == "nt":
+            startupinfo = subprocess.STARTUPINFO()  # type: ignore
+            startupinfo.dwFlags |= subprocess.SW_HIDE | subprocess.STARTF_USESHOWWINDOW  # type: ignore
+        full_env = os.environ.copy()
+        full_env.update(env or {})
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            env=full_env,
+            startupinfo=startupinfo)
+        self.readers = [
+            threading.Thread(target=self.read, args=(self.process.stdout, 'stdout')),
+            threading.Thread(target=self.read, args=(self.process.stderr, 'stderr')),
+        ]
+        for reader in self.readers:
+            reader.daemon = True
+            reader.start()
+
+    def read(self, stream, name):
+        pending = b""
+        while True:
+            chunk = os.read(stream.fileno(), 4096)
+            if not chunk:
+                break
+            self.output[name].append(chunk)
+            lines = LINE_BREAK_RE.split(pending + chunk)
+            pending = lines.pop()
+            for line in lines:
+                self.line(line, name)
+        if pending:
+            self.line(pending, name)
+        stream.close()
+
+    def line(self, line, name):
+        line = line.decode('utf-8', 'replace').strip()
+        if line and self.on_line:
+            try:
+                self.on_line(line, name)
+            except Exception as err:
+                print("Error handling output of {}: {}".format(self.cmd[0], err))
+
+    def cancel(self):
+        self.cancelled = True
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+
+    def wait(self):
+        """Returns (stdout, stderr) once the command exits successfully, raises JobError otherwise."""
+        try:
+            self.process.wait(self.timeout)
+        except subprocess.TimeoutExpired:
+            self.cancel()
+            self.process.wait()
+            for reader in self.readers:
+                reader.join()
+            raise TimedOut("{} timed out after {} seconds".format(self.cmd[0], self.timeout), None, *self.decoded())
+        for reader in self.readers:
+            reader.join()
+        stdoutdata, stderrdata = self.decoded()
+        if self.cancelled:
+            raise Cancelled("{} was cancelled".format(self.cmd[0]), self.process.returncode, stdoutdata, stderrdata)
+        if self.process.returncode:
+            raise JobError("{}: {}".format(self.process.returncode, stderrdata), self.process.returncode, stdoutdata, stderrdata)
+        return stdoutdata, stderrdata
+
+    def decoded(self):
+        return tuple(b"".join(self.output[name]).decode('utf-8', 'replace') for name in ('stdout', 'stderr'))
+
+
+def run(cmd, cwd=None, env=None, timeout=None, on_line=None):
+    """
+    Runs cmd and returns its (stdout, stderr), raising JobError (a RuntimeError)
+    if it fails, times out or is cancelled.
+    """
+    task = current_task()
+    if task is not None and task.cancelled.is_set():
+        raise Cancelled("{} was cancelled".format(task.name))
+    job = Job(cmd, cwd=cwd, env=env, timeout=timeout, on_line=on_line)
+    if task is None:
+        return job.wait()
+    with task.lock:
+        task.jobs.add(job)
+    if task.cancelled.is_set():
+        job.cancel()
+    try:
+        return job.wait()
+    finally:
+        with task.lock:
+            task.jobs.discard(job)
+
+
+def parallel(*functions):
+    """
+    Calls every function at the same time (each in a thread of its own, in
+    the current task) and returns their results in order. If any raise, the
+    first exception is raised once all of them are done.
+    """
+    task = current_task()
+    results = [None] * len(functions)
+    errors = [None] * len(functions)
+
+    def call(index, function):
+        _local.task = task
+        try:
+            results[index] = function()
+        except BaseException as err:
+            errors[index] = err
+
+    threads = [threading.Thread(target=call, args=(i, f)) for i, f in enumerate(functions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for error in errors:
+        if error is not None:
+            raise error
+    return results
+
+
+class Task(object):
+    """A background function running commands, at most one run of it at a time."""
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.jobs = set()
+        self.cancelled = threading.Event()
+        self.thread = None
+        _tasks.append(self)
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, function, *args):
+        """Runs function(*args) in the background, unless a run is still going on."""
+        with self.lock:
+            if self.running():
+                return False
+            self.cancelled.clear()
+            self.thread = threading.Thread(target=self.run, args=(function,) + args)
+            self.thread.daemon = True
+            self.thread.start()
+            return True
+
+    def run(self, function, *args):
+        _local.task = self
+        try:
+            function(*args)
+        except Cancelled:
+            print("{}: cancelled".format(self.name))
+        finally:
+            _local.task = None
+
+    def cancel(self):
+        self.cancelled.set()
+        with self.lock:
+            jobs = list(self.jobs)
+        for job in jobs:
+            job.cancel()
+
+
+def running_tasks():
+    return [task for task in _tasks if task.running()]
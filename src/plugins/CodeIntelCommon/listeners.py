@@ -0,0 +1,21 @@
+import sublime_plugin
+
+import os
+
+from CodeIntelCommon import idle
+from CodeIntelCommon import markers
+
+
+class CodeIntelMarkersListener(sublime_plugin.EventListener):
+    def on_post_save_async(self, view):
+        file_name = view.file_name()
+        if file_name and os.path.basename(file_name) in markers.index.markers:
+            markers.index.invalidate(file_name)
+
+
+class CodeIntelIdleListener(sublime_plugin.EventListener):
+    def on_activated_async(self, view):
+        idle.view_used(view, focused=True)
+
+    def on_selection_modified_async(self, view):
+        idle.view_used(view)
@@ -0,0 +1,151 @@
+"""
+Finds project marker files (Cargo.toml, compile_commands.json, .flowconfig...)
+for the plugins' on_start without walking the file system every time.
+
+Directory listings are remembered along with the directory's mtime, which
+changes whenever an entry is added or removed, so a single stat tells if a
+listing is still good, whoever changed the directory. Workspaces are scanned
+in the background for the markers anywhere under them, kept per marker name;
+lookups are answered from the last scan right away (nothing until the first
+one is done), and refresh it once it's REFRESH_INTERVAL old. A lookup can ask
+to be called back when a scan finds other directories than it got, the first
+one included. Saving a marker file in Sublime (see listeners.py) refreshes the
+scans which include it; markers made or removed outside Sublime (a build
+generating compile_commands.json) are only seen by the first lookup
+REFRESH_INTERVAL seconds after the last scan.
+"""
+import os
+import time
+import threading
+
+# Directories which never have markers worth finding (and can be huge).
+SKIP_DIRS = frozenset(('.git', '.hg', '.svn', 'node_modules', 'bower_components', '__pycache__', '.tox', 'target'))
+MAX_DEPTH = 8
+# Seconds before a lookup refreshes a scan in the background (and so sees the
+# markers changed outside Sublime).
+REFRESH_INTERVAL = 60
+
+
+class MarkerIndex(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.markers = set()
+        self.listings = {}  # directory -> (mtime, names)
+        self.scans = {}  # root -> {marker: (time, [directories])}
+        self.scanning = set()
+        self.waiting = {}  # (root, marker) -> [(directories looked up, callback)]
+
+    def names(self, directory):
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            return frozenset()
+        with self.lock:
+            cached = self.listings.get(directory)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            names = frozenset(os.listdir(directory))
+        except OSError:
+            names = frozenset()
+        with self.lock:
+            self.listings[directory] = (mtime, names)
+        return names
+
+    def contains(self, directory, name):
+        return name in self.names(directory)
+
+    def nearest(self, path, name):
+        """Returns the closest directory containing name, starting at path and going up."""
+        directory = os.path.abspath(path)
+        while True:
+            if self.contains(directory, name):
+                return directory
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return None
+            directory = parent
+
+    def find_all(self, root, name, on_change=None):
+        """
+        Returns the directories under root containing name, shallowest first,
+        as of the last scan (None if root wasn't scanned for name yet).
+        on_change, if given, is called once (on the scanning thread) with the
+        directories a later scan finds if they aren't the ones returned.
+        """
+        root = os.path.abspath(root)
+        with self.lock:
+            self.markers.add(name)
+            scan = self.scans.get(root, {}).get(name)
+            found = list(scan[1]) if scan else None
+            if on_change is not None:
+                self.waiting.setdefault((root, name), []).append((found, on_change))
+        if scan is None or time.time() - scan[0] > REFRESH_INTERVAL:
+            self.refresh(root)
+        return found
+
+    def scan(self, root):
+        """Scans root for the markers, returns which."""
+        with self.lock:
+            markers = frozenset(self.markers)
+        found = {}
+        base_depth = root.rstrip(os.sep).count(os.sep)
+        for directory, dirs, files in os.walk(root):
+            if directory.count(os.sep) - base_depth >= MAX_DEPTH:
+                dirs[:] = []
+            else:
+                dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+            for name in markers.intersection(files).union(markers.intersection(dirs)):
+                found.setdefault(name, []).append(directory)
+        for directories in found.values():
+            directories.sort(key=lambda d: (d.count(os.sep), d))
+        now = time.time()
+        changed = []
+        with self.lock:
+            scans = self.scans.setdefault(root, {})
+            for name in markers:
+                directories = found.get(name, [])
+                scans[name] = (now, directories)
+                waiting = self.waiting.pop((root, name), [])
+                for seen, callback in waiting:
+                    if seen == directories:
+                        self.waiting.setdefault((root, name), []).append((seen, callback))
+                    else:
+                        changed.append((callback, list(directories)))
+        for callback, directories in changed:
+            callback(directories)
+        return markers
+
+    def refresh(self, root):
+        """Scans root in the background (again if markers were asked for in the meantime)."""
+        with self.lock:
+            if root in self.scanning:
+                return
+            self.scanning.add(root)
+
+        def _refresh():
+            try:
+                while True:
+                    markers = self.scan(root)
+                    with self.lock:
+                        if self.markers <= markers:
+                            break
+            finally:
+                with self.lock:
+                    self.scanning.discard(root)
+
+        thread = threading.Thread(target=_refresh)
+        thread.daemon = True
+        thread.start()
+
+    def invalidate(self, path):
+        """Called when path changed: forgets its directory's listing and refreshes the scans including it."""
+        path = os.path.abspath(path)
+        with self.lock:
+            self.listings.pop(os.path.dirname(path), None)
+            roots = [root for root in self.scans if path.startswith(root.rstrip(os.sep) + os.sep)]
+        for root in roots:
+            self.refresh(root)
+
+
+index = MarkerIndex()
@@ -0,0 +1,25 @@
+import os
+
+from CodeIntelCommon.pool import python_command, python_is_installed, server_path
+
+
+def binary_args(node_args):
+    """
+    Wraps a `node server.js ...` command line so the server runs as a worker
+    of the shared Node host instead of in a Node process of its own.
+    """
+    if not python_is_installed():
+        return cached_binary_args(node_args)
+    return [
+        python_command(),
+        os.path.join(server_path, "lsnode.py"),
+        "--",
+    ] + node_args
+
+
+def cached_binary_args(node_args):
+    """
+    Wraps a `node server.js ...` command line so the server is loaded using
+    the V8 code caches built next to it.
+    """
+    return node_args[:1] + [os.path.join(server_path, "lscache.js")] + node_args[1:]
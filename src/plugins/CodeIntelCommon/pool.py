@@ -0,0 +1,91 @@
+import os
+import json
+import shutil
+import hashlib
+
+package_path = os.path.dirname(__file__)
+server_path = os.path.join(package_path, 'server')
+
+
+def python_command():
+    return "python3"
+
+
+def python_is_installed():
+    return shutil.which(python_command()) is not None
+
+
+def workspace_root(window):
+    folders = window.folders()
+    if folders:
+        return folders[0]
+
+
+def settings_hash(config, window):
+    get_settings = getattr(config, 'get_settings', None)
+    settings = get_settings(window) if get_settings else config.settings
+    data = json.dumps([config.init_options, settings, config.env], sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def daemon_args(config):
+    """
+    The lspool.py options for the config's optional max_memory (MB),
+    max_cpu (percent of a core), idle_timeout and max_resume_time (seconds).
+    """
+    args = []
+    for attribute, option in (
+            ('max_memory', "--max-rss"),
+            ('max_cpu', "--max-cpu"),
+            ('idle_timeout', "--idle-timeout"),
+            ('max_resume_time', "--max-resume-time")):
+        if getattr(config, attribute, None):
+            args += [option, str(getattr(config, attribute))]
+    return args
+
+
+def pool_key(config, window, extra_args=()):
+    root = workspace_root(window)
+    data = json.dumps([config.name, root, settings_hash(config, window), list(extra_args), daemon_args(config)])
+    return "{}-{}".format(config.name, hashlib.sha1(data.encode('utf-8')).hexdigest()[:16])
+
+
+def binary_args(config, window, extra_args=()):
+    """
+    Returns the command line which starts (or joins) the shared server for
+    config in the given window, with extra_args added to the server's own.
+    Windows with the same workspace root, settings and extra_args end up
+    talking to the same server process. The pool restarts the server when
+    it goes over the config's max_memory or max_cpu, and stops it while it's
+    unused for idle_timeout seconds. Unless the config's `scheduled` is False,
+    the window's requests are prioritized on their way, and responses are
+    cached up to the config's cache_size MB (see lsproxy.py).
+    """
+    if getattr(config, 'pool_args', None) is not config.binary_args:
+        # Not what we returned last time, so the plugin set a new command line.
+        config.server_args = config.binary_args
+    server_args = config.server_args + list(extra_args)
+    root = workspace_root(window)
+    scheduled = getattr(config, 'scheduled', True) and not config.tcp_port and python_is_installed()
+    cache_args = []
+    if getattr(config, 'cache_size', None) is not None:
+        cache_args = ["--cache-size", str(config.cache_size)]
+    if not getattr(config, 'pooled', True) or not root or config.tcp_port or not python_is_installed():
+        config.pool_args = server_args
+        if scheduled:
+            config.pool_args = [python_command(), os.path.join(server_path, "lsproxy.py")] + cache_args + ["--"] + server_args
+    else:
+        config.pool_args = [
+            python_command(),
+            os.path.join(server_path, "lspool.py"),
+            "--key", pool_key(config, window, extra_args),
+            "--cwd", root,
+        ] + (["--schedule"] + cache_args if scheduled else []) + daemon_args(config) + [
+            "--",
+        ] + server_args
+    return config.pool_args
+
+
+def is_pooled(config):
+    """Tells if the last binary_args for config run the server in a pool."""
+    return os.path.join(server_path, "lspool.py") in getattr(config, 'pool_args', ())
@@ -0,0 +1,116 @@
+"""
+Matches file paths against the `fileMatch` globs of a schema catalog (the
+schemastore catalog.json format, used by the JSON settings and convertible
+from the YAML server's `yaml.schemas`), compiled once into lookup tables:
+
+* literal patterns ("package.json", ".circleci/config.yml") go in a table
+  keyed by the file name,
+* "*<literal>" patterns ("*.cryproj") go in tables of suffixes by length,
+* every other glob is part of one combined regular expression, used to tell
+  at once if any of them matches before finding out which.
+
+A pattern matches the end of a path at a "/" boundary; `*` and `?` don't
+cross "/", `**` does. When several schemas match, the winner is the one with
+an exact name over a suffix over a glob, then the longest literal part, then
+the first in the catalog.
+"""
+import re
+from collections import namedtuple
+
+WILDCARDS_RE = re.compile(r'[*?]')
+
+EXACT = 0
+SUFFIX = 1
+GLOB = 2
+KIND_NAMES = {EXACT: "name", SUFFIX: "suffix", GLOB: "glob"}
+
+
+def glob_to_regex(pattern):
+    parts = []
+    for token in re.split(r'(\*\*|\*|\?)', pattern):
+        if token == '**':
+            parts.append('.*')
+        elif token == '*':
+            parts.append('[^/]*')
+        elif token == '?':
+            parts.append('[^/]')
+        else:
+            parts.append(re.escape(token))
+    return ''.join(parts)
+
+
+class Match(namedtuple('Match', 'schema pattern kind order')):
+    def rank(self):
+        return (self.kind, -len(WILDCARDS_RE.sub('', self.pattern)), self.order)
+
+    def reason(self):
+        return "{} {!r}".format(KIND_NAMES[self.kind], self.pattern)
+
+
+class Matcher(object):
+    def __init__(self, schemas):
+        self.schemas = schemas
+        self.names = {}  # file name -> [(pattern, order)]
+        self.suffixes = {}  # length -> {suffix: [(pattern, order)]}
+        self.globs = []  # (compiled pattern, pattern, order)
+        for order, schema in enumerate(schemas):
+            for pattern in schema.get('fileMatch', ()):
+                self.add(pattern.lstrip('/'), order)
+        self.suffix_lengths = sorted(self.suffixes, reverse=True)
+        self.combined = None
+        if self.globs:
+            self.combined = re.compile('(?:^|/)(?:{})$'.format('|'.join(
+                '(?:{})'.format(glob_to_regex(pattern)) for _, pattern, _ in self.globs)))
+
+    @classmethod
+    def from_yaml_schemas(cls, yaml_schemas):
+        """From the YAML server's settings ({url: glob or [globs]})."""
+        return cls([
+            {'url': url, 'fileMatch': [globs] if isinstance(globs, str) else list(globs)}
+            for url, globs in yaml_schemas.items()
+        ])
+
+    def add(self, pattern, order):
+        if not WILDCARDS_RE.search(pattern):
+            self.names.setdefault(pattern.rsplit('/', 1)[-1], []).append((pattern, order))
+        elif pattern.startswith('*') and '/' not in pattern and not WILDCARDS_RE.search(pattern[1:]):
+            suffix = pattern[1:]
+            self.suffixes.setdefault(len(suffix), {}).setdefault(suffix, []).append((pattern, order))
+        else:
+            regex = re.compile('(?:^|/){}$'.format(glob_to_regex(pattern)))
+            self.globs.append((regex, pattern, order))
+
+    def matches(self, path):
+        """Returns every Match for path, the winner first."""
+        path = path.replace('\\', '/')
+        name = path.rsplit('/', 1)[-1]
+        found = []
+        for pattern, order in self.names.get(name, ()):
+            if '/' not in pattern or path == pattern or path.endswith('/' + pattern):
+                found.append(Match(self.schemas[order], pattern, EXACT, order))
+        for length in self.suffix_lengths:
+            if length <= len(name):
+                for pattern, order in self.suffixes[length].get(name[len(name) - length:], ()):
+                    found.append(Match(self.schemas[order], pattern, SUFFIX, order))
+        if self.combined is not None and self.combined.search(path):
+            for regex, pattern, order in self.globs:
+                if regex.search(path):
+                    found.append(Match(self.schemas[order], pattern, GLOB, order))
+        found.sort(key=Match.rank)
+        return found
+
+    def match(self, path):
+        found = self.matches(path)
+        return found[0] if found else None
+
+    def explain(self, path):
+        """Tells which schema path gets and why, in a line."""
+        found = self.matches(path)
+        if not found:
+            return "{}: no schema".format(path)
+        winner = found[0]
+        explanation = "{}: {} ({})".format(path, winner.schema.get('name', winner.schema.get('url')), winner.reason())
+        if len(found) > 1:
+            explanation += ", over " + ", ".join(
+                "{} ({})".format(m.schema.get('name', m.schema.get('url')), m.reason()) for m in found[1:])
+        return explanation
@@ -0,0 +1,341 @@
+"""
+JSON-RPC framing (``Content-Length`` headers) for the proxies between the
+editor and the servers.
+
+FrameReader reads into a growable bytearray and hands out frame bodies as
+memoryviews of it, without copying them; a buffer is never reused while
+bodies from it may still be around, a new one takes over when it's full.
+Message keeps a body as it came and only decodes it when a field which can't
+be read from its head is needed: the top-level scalars (id, method) usually
+come before params/result, so telling where a message goes costs a scan of
+its first bytes whatever its size, and it's written out unchanged (or with
+just its id spliced in). A field after a nested value is only taken as
+missing when that's certain (a response has no method, a key which appears
+nowhere in the body isn't there), anything else decodes the body.
+
+The JSON codec used for decoding and encoding is pluggable: the fastest
+available one (orjson, ujson, then the standard json) unless
+CODEINTEL_JSON_CODEC names one.
+"""
+import os
+import re
+import json
+from collections import namedtuple
+
+BUFFER_SIZE = 65536
+# Bytes of a body scanned for its top-level scalars.
+HEAD_SIZE = 512
+
+HEADER_END = b"\r\n\r\n"
+FIELD_RE = re.compile(
+    br'\s*"((?:[^"\\]|\\.)*)"\s*:\s*'
+    br'(?:("(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?|null|true|false)|([\[{]))'
+    br'\s*([,}])?')
+
+
+########################################################################
+# Codecs
+
+Codec = namedtuple('Codec', 'name loads dumps')
+
+
+def _json_codec():
+    def loads(data):
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        return json.loads(data.decode('utf-8'))
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    return Codec("json", loads, dumps)
+
+
+def _orjson_codec():
+    import orjson
+    return Codec("orjson", orjson.loads, orjson.dumps)
+
+
+def _ujson_codec():
+    import ujson
+
+    def loads(data):
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        return ujson.loads(data)
+
+    def dumps(obj):
+        return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    return Codec("ujson", loads, dumps)
+
+
+CODECS = {
+    "orjson": _orjson_codec,
+    "ujson": _ujson_codec,
+    "json": _json_codec,
+}
+
+
+def load_codec(name=None):
+    """Returns the named codec, or the fastest one available."""
+    names = [name] if name else ["orjson", "ujson", "json"]
+    for name in names:
+        try:
+            return CODECS[name]()
+        except ImportError:
+            pass
+    return _json_codec()
+
+
+codec = load_codec(os.environ.get("CODEINTEL_JSON_CODEC"))
+
+
+def use_codec(name):
+    global codec
+    codec = load_codec(name)
+    return codec
+
+
+########################################################################
+# Messages
+
+class Head(object):
+    """The top-level scalar fields at the start of a body."""
+    def __init__(self, body):
+        self.fields = {}
+        self.spans = {}  # field -> (start, end) of its value in the body
+        self.complete = False  # every top-level field was scanned
+        self.absent = set()  # fields known not to be in the body
+        head = bytes(body[:HEAD_SIZE])
+        pos = head.find(b"{") + 1
+        if not pos:
+            return
+        while True:
+            match = FIELD_RE.match(head, pos)
+            if match is None:
+                return  # cut short by HEAD_SIZE, or not a simple field
+            key = match.group(1).decode('utf-8')
+            if match.group(3):
+                # The fields after a nested value aren't scanned; whatever
+                # they are, a response (with a result or error) has no method.
+                if key in ('result', 'error'):
+                    self.absent.add('method')
+                return
+            if match.group(4) is None:
+                # Not followed by a delimiter in the head: a number cut short
+                # by HEAD_SIZE could go on, or not a simple field.
+                return
+            self.fields[key] = json.loads(match.group(2).decode('utf-8'))
+            self.spans[key] = match.span(2)
+            if match.group(4) == b"}":
+                self.complete = True
+                return
+            pos = match.end()
+
+
+class Message(object):
+    """A JSON-RPC message, as the body it came in and/or as decoded data."""
+    def __init__(self, body=None, data=None):
+        self.parts = [body] if body is not None else None
+        self._data = data
+        self._head = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            parts = self.parts
+            self._data = codec.loads(parts[0] if len(parts) == 1 else b"".join(parts))
+        return self._data
+
+    def head(self):
+        if self._head is None:
+            self._head = Head(self.parts[0])
+        return self._head
+
+    def get(self, field, default=None):
+        """Returns a top-level field, decoding the body only when the head doesn't tell."""
+        if self._data is not None or len(self.parts) > 1:
+            return self.data.get(field, default)
+        head = self.head()
+        if field in head.fields:
+            return head.fields[field]
+        if head.complete or field in head.absent or (field in ('id', 'method') and self.lacks(field)):
+            return default
+        return self.data.get(field, default)
+
+    def lacks(self, field):
+        """Tells if the body can't have field, its key not being anywhere in it (nor any escape)."""
+        body = bytes(self.parts[0])
+        return ('"' + field + '"').encode('utf-8') not in body and b"\\u" not in body
+
+    def has(self, field):
+        return self.get(field, self) is not self
+
+    def is_request(self):
+        return self.has('method') and self.has('id')
+
+    def is_notification(self):
+        return self.has('method') and not self.has('id')
+
+    def is_response(self):
+        return not self.has('method') and self.has('id')
+
+    def with_id(self, new_id):
+        """Returns the message with another id, keeping the body as is when it can."""
+        if self._data is None and len(self.parts) == 1 and 'id' in self.head().spans:
+            start, end = self.head().spans['id']
+            body = memoryview(self.parts[0])
+            message = Message()
+            message.parts = [body[:start], codec.dumps(new_id), body[end:]]
+            return message
+        return Message(data=dict(self.data, id=new_id))
+
+    def buffers(self):
+        """The frame as a list of bytes-like objects, headers included."""
+        if self.parts is None:
+            self.parts = [codec.dumps(self._data)]
+        length = sum(len(part) for part in self.parts)
+        return [b"Content-Length: " + str(length).encode('ascii') + HEADER_END] + self.parts
+
+
+def as_message(message):
+    return message if isinstance(message, Message) else Message(data=message)
+
+
+########################################################################
+# Reading and writing
+
+class FrameReader(object):
+    """Reads the bodies of the frames in a stream, as memoryviews."""
+    def __init__(self, stream, size=BUFFER_SIZE):
+        self.stream = stream
+        self.readinto = getattr(stream, 'readinto1', None)
+        self.size = size
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def fill(self, size):
+        """Reads until the buffer holds size bytes after start, returns False at the end of the stream."""
+        if self.start + size > len(self.buffer):
+            # Continue in a new buffer, the old one may still be in use by bodies.
+            buffer = bytearray(max(self.size, size + self.size))
+            pending = self.end - self.start
+            buffer[:pending] = self.view[self.start:self.end]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+            self.start, self.end = 0, pending
+        while self.end - self.start < size:
+            n = self.readinto(self.view[self.end:])
+            if not n:
+                return False
+            self.end += n
+        return True
+
+    def read_frame(self):
+        """Returns the next body, or None at the end of the stream."""
+        if self.readinto is None:
+            return self._read_frame_lines()
+        while True:
+            index = self.buffer.find(HEADER_END, self.start, self.end)
+            if index >= 0:
+                break
+            if not self.fill(self.end - self.start + 1):
+                return None
+        content_length = parse_headers(bytes(self.view[self.start:index]))
+        body_start = index + len(HEADER_END) - self.start
+        if not self.fill(body_start + content_length):
+            return None
+        start = self.start + body_start
+        self.start = start + content_length
+        return self.view[start:self.start]
+
+    def _read_frame_lines(self):
+        # For streams without readinto1 (Python 2 files)
+        headers = []
+        while True:
+            line = self.stream.readline()
+            if not line:
+                return None
+            if not line.strip():
+                break
+            headers.append(line.strip())
+        content_length = parse_headers(b"\r\n".join(headers))
+        body = self.stream.read(content_length)
+        if len(body) < content_length:
+            return None
+        return body
+
+    def read(self):
+        """Returns the next Message, or None at the end of the stream."""
+        body = self.read_frame()
+        return None if body is None else Message(body)
+
+
+def parse_headers(headers):
+    for line in headers.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            return int(value.strip())
+    raise ValueError("Missing Content-Length header")
+
+
+class Reader(object):
+    def __init__(self, stream):
+        self.frames = FrameReader(stream)
+
+    def read_message(self):
+        body = self.frames.read_frame()
+        if body is None:
+            return None
+        return codec.loads(body)
+
+
+def encode_message(message):
+    return b"".join(as_message(message).buffers())
+
+
+def write_message(stream, message):
+    stream.write(encode_message(message))
+    stream.flush()
+
+
+def stream_writer(stream):
+    """Returns a function writing a list of buffers to a (binary) stream."""
+    def write(buffers):
+        for buffer in buffers:
+            stream.write(buffer)
+        stream.flush()
+    return write
+
+
+def socket_writer(sock):
+    """Returns a function writing a list of buffers to a socket, in as few calls as it can."""
+    if not hasattr(sock, 'sendmsg'):
+        return lambda buffers: sock.sendall(b"".join(buffers))
+
+    def write(buffers):
+        buffers = [memoryview(buffer).cast('B') for buffer in buffers]
+        while buffers:
+            sent = sock.sendmsg(buffers)
+            while sent:
+                if sent >= len(buffers[0]):
+                    sent -= len(buffers.pop(0))
+                else:
+                    buffers[0] = buffers[0][sent:]
+                    sent = 0
+    return write
+
+
+def is_request(message):
+    return 'method' in message and 'id' in message
+
+
+def is_notification(message):
+    return 'method' in message and 'id' not in message
+
+
+def is_response(message):
+    return 'method' not in message and 'id' in message
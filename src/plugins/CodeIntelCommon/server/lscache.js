@@ -0,0 +1,118 @@
+// Loads Node modules through V8 code caches so the big server bundles don't
+// have to be parsed and compiled from scratch on every start.
+//
+//   node lscache.js --build file.js...   writes file.js.cache next to each file
+//   node lscache.js server.js args...    runs server.js using the caches
+//
+// A cache built with a different Node version is rejected by V8; such modules
+// get a per user cache (under ~/.codeintel/v8cache) written a few seconds
+// after start, so lazily compiled functions make it into the cache too.
+
+const fs = require('fs');
+const os = require('os');
+const vm = require('vm');
+const path = require('path');
+const crypto = require('crypto');
+const Module = require('module');
+
+const USER_CACHE_DIR = path.join(os.homedir(), '.codeintel', 'v8cache');
+
+// Milliseconds after start at which missing caches are written.
+const FLUSH_DELAY = 10000;
+
+const pending = [];
+
+function stripShebang(content) {
+  return content.startsWith('#!') ? content.replace(/^#!.*/, '') : content;
+}
+
+function userCacheFile(filename) {
+  const stat = fs.statSync(filename);
+  const key = [filename, stat.size, stat.mtime.getTime(), process.version, process.arch].join('\0');
+  return path.join(USER_CACHE_DIR, crypto.createHash('sha1').update(key).digest('hex') + '.cache');
+}
+
+function compile(content, filename) {
+  const wrapper = Module.wrap(stripShebang(content));
+  const userCache = userCacheFile(filename);
+  for (const cacheFile of [filename + '.cache', userCache]) {
+    let cachedData;
+    try {
+      cachedData = fs.readFileSync(cacheFile);
+    } catch (e) {
+      continue;
+    }
+    const script = new vm.Script(wrapper, { filename, cachedData });
+    if (!script.cachedDataRejected) {
+      return script;
+    }
+  }
+  const script = new vm.Script(wrapper, { filename });
+  if (!pending.length) {
+    setTimeout(flush, FLUSH_DELAY).unref();
+  }
+  pending.push([script, userCache]);
+  return script;
+}
+
+function flush() {
+  try {
+    fs.mkdirSync(USER_CACHE_DIR, { recursive: true });
+  } catch (e) {
+    // it's fine, writes below will fail silently
+  }
+  for (const [script, cacheFile] of pending.splice(0)) {
+    try {
+      fs.writeFileSync(cacheFile, script.createCachedData());
+    } catch (e) {
+      // read-only or full disk, the cache is just an optimization
+    }
+  }
+}
+
+function makeRequire(mod) {
+  function require(id) {
+    return mod.require(id);
+  }
+  require.resolve = (request, options) => Module._resolveFilename(request, mod, false, options);
+  require.main = process.mainModule;
+  require.extensions = Module._extensions;
+  require.cache = Module._cache;
+  return require;
+}
+
+let installed = false;
+
+function install() {
+  if (installed) {
+    return;
+  }
+  installed = true;
+  Module.prototype._compile = function (content, filename) {
+    const fn = compile(content, filename).runInThisContext({ displayErrors: true });
+    return fn.call(this.exports, this.exports, makeRequire(this), this, filename, path.dirname(filename));
+  };
+}
+
+function build(files) {
+  for (const filename of files) {
+    const content = fs.readFileSync(filename, 'utf8');
+    const script = new vm.Script(Module.wrap(stripShebang(content)), { filename: path.resolve(filename) });
+    fs.writeFileSync(filename + '.cache', script.createCachedData());
+    console.log(`${filename}.cache`);
+  }
+}
+
+module.exports = { install };
+
+if (require.main === module) {
+  const args = process.argv.slice(2);
+  if (args[0] === '--build') {
+    build(args.slice(1));
+  } else {
+    install();
+    process.argv.splice(1, 1);
+    process.argv[1] = path.resolve(process.argv[1]);
+    Module.runMain();
+  }
+}
@@ -0,0 +1,187 @@
+// Hosts several Node based language servers in a single Node process.
+//
+// Every server runs in its own worker thread (so module state is isolated) and
+// talks LSP over a socket bridged by lsnode.py. A connection starts with the
+// host token and, once acknowledged, a JSON line describing the channel:
+//   {"module": "/path/to/server.js", "args": ["--stdio"], "cwd": "/path/to/workspace"}
+// The rest of the connection is the server's stdin/stdout.
+//
+// Workers can't change the host's directory, so a worker's process.cwd() is
+// its channel's cwd and the fs functions resolve relative paths against it.
+
+const fs = require('fs');
+const os = require('os');
+const net = require('net');
+const path = require('path');
+const crypto = require('crypto');
+const { Worker, isMainThread, workerData } = require('worker_threads');
+
+// Milliseconds the host stays up without any channel.
+const LINGER = 60000;
+
+// fs functions taking paths, by how many of their first arguments are paths
+// (and their Sync variants).
+const FS_PATH_ARGUMENTS = {
+  access: 1, appendFile: 1, chmod: 1, chown: 1, copyFile: 2, createReadStream: 1,
+  createWriteStream: 1, exists: 1, link: 2, lstat: 1, mkdir: 1, mkdtemp: 1, open: 1,
+  opendir: 1, readdir: 1, readFile: 1, readlink: 1, realpath: 1, rename: 2, rm: 1,
+  rmdir: 1, stat: 1, symlink: 2, truncate: 1, unlink: 1, unwatchFile: 1, utimes: 1,
+  watch: 1, watchFile: 1, writeFile: 1,
+};
+
+function setWorkerCwd(cwd) {
+  process.cwd = () => cwd;
+  process.chdir = (directory) => {
+    cwd = path.resolve(cwd, directory);
+  };
+  const resolving = (fn, count) => function (...args) {
+    for (let i = 0; i < count && i < args.length; ++i) {
+      if (typeof args[i] === 'string' && !path.isAbsolute(args[i])) {
+        args[i] = path.resolve(cwd, args[i]);
+      }
+    }
+    return fn.apply(this, args);
+  };
+  for (const name of Object.keys(FS_PATH_ARGUMENTS)) {
+    for (const [target, key] of [[fs, name], [fs, `${name}Sync`], [fs.promises, name]]) {
+      if (target && typeof target[key] === 'function') {
+        target[key] = resolving(target[key], FS_PATH_ARGUMENTS[name]);
+      }
+    }
+  }
+}
+
+if (!isMainThread) {
+  if (workerData.cwd) {
+    setWorkerCwd(workerData.cwd);
+  }
+  require('./lscache').install();
+  // Make the server believe it was launched as `node module args...`
+  process.argv = [process.argv[0], workerData.module].concat(workerData.args);
+  require(workerData.module);
+  return;
+}
+
+function log(...args) {
+  process.stderr.write(`${new Date().toISOString()} ${args.join(' ')}\n`);
+}
+
+function parseArgs(argv) {
+  const args = { stateDir: path.join(os.homedir(), '.codeintel', 'pool'), key: 'lsnode' };
+  for (let i = 0; i < argv.length; ++i) {
+    if (argv[i] === '--state-dir') {
+      args.stateDir = argv[++i];
+    } else if (argv[i] === '--key') {
+      args.key = argv[++i];
+    }
+  }
+  return args;
+}
+
+function writeState(stateFile, state) {
+  const tmp = `${stateFile}.${process.pid}`;
+  fs.writeFileSync(tmp, JSON.stringify(state), { mode: 0o600 });
+  fs.renameSync(tmp, stateFile);
+}
+
+function removeState(stateFile, token) {
+  try {
+    if (JSON.parse(fs.readFileSync(stateFile, 'utf8')).token === token) {
+      fs.unlinkSync(stateFile);
+    }
+  } catch (e) {
+    // already gone
+  }
+}
+
+function readLine(socket, buffer, callback) {
+  const newline = buffer.indexOf('\n');
+  if (newline !== -1) {
+    callback(buffer.slice(0, newline).toString('utf8').trim(), buffer.slice(newline + 1));
+    return;
+  }
+  socket.once('data', (data) => readLine(socket, Buffer.concat([buffer, data]), callback));
+}
+
+function main() {
+  const args = parseArgs(process.argv.slice(2));
+  const stateFile = path.join(args.stateDir, `${args.key}.json`);
+  const token = crypto.randomBytes(16).toString('hex');
+  const channels = new Set();
+  let closing = false;
+  let lingerTimer = null;
+
+  function scheduleStop() {
+    clearTimeout(lingerTimer);
+    lingerTimer = setTimeout(() => {
+      if (channels.size === 0) {
+        closing = true;
+        log('Stopping host, no channels left');
+        removeState(stateFile, token);
+        process.exit(0);
+      }
+    }, LINGER);
+  }
+
+  function openChannel(socket, channel, rest) {
+    const name = path.basename(channel.module);
+    const worker = new Worker(__filename, {
+      workerData: channel,
+      stdin: true,
+      stdout: true,
+      stderr: true,
+    });
+    channels.add(worker);
+    clearTimeout(lingerTimer);
+    log('Started', name, `(${channels.size} channels)`);
+
+    if (rest.length) {
+      worker.stdin.write(rest);
+    }
+    socket.pipe(worker.stdin);
+    worker.stdout.pipe(socket);
+    worker.stderr.on('data', (data) => process.stderr.write(`[${name}] ${data}`));
+
+    worker.on('error', (err) => log('Error in', name, err && err.stack || err));
+    worker.on('exit', (code) => {
+      channels.delete(worker);
+      log('Exited', name, code, `(${channels.size} channels)`);
+      socket.end();
+      if (channels.size === 0) {
+        scheduleStop();
+      }
+    });
+    socket.on('error', () => worker.terminate());
+    socket.on('close', () => worker.terminate());
+  }
+
+  const server = net.createServer((socket) => {
+    readLine(socket, Buffer.alloc(0), (line, rest) => {
+      if (line !== token || closing) {
+        socket.destroy();
+        return;
+      }
+      socket.write('ok\n');
+      readLine(socket, rest, (line, rest) => {
+        let channel;
+        try {
+          channel = JSON.parse(line);
+        } catch (e) {
+          socket.destroy();
+          return;
+        }
+        socket.pause();
+        openChannel(socket, channel, rest);
+      });
+    });
+  });
+
+  server.listen(0, '127.0.0.1', () => {
+    writeState(stateFile, { port: server.address().port, token: token, pid: process.pid });
+    log('Listening on', server.address().port);
+    scheduleStop();
+  });
+  process.on('exit', () => removeState(stateFile, token));
+}
+
+main();
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Runs a Node based language server inside the shared Node host (lsnode.js)
+instead of in a Node process of its own.
+
+Usage: ``lsnode.py [--state-dir DIR] -- node server.js args...``
+
+If the host can't be reached (or Node is too old for worker threads), the
+server is started as a regular process (through the lscache.js code cache
+loader). The server gets the directory lsnode.py runs in as its cwd.
+"""
+import os
+import sys
+import json
+import re
+import argparse
+import subprocess
+
+from lspool import STATE_DIR, acquire, bridge, spawn_detached
+
+# Node versions with worker threads, and behind --experimental-worker.
+WORKER_VERSION = (10, 5)
+UNFLAGGED_WORKER_VERSION = (11, 7)
+
+
+def host_key(node):
+    return "lsnode-" + os.path.basename(node).replace(".", "_")
+
+
+def node_version(node):
+    """Returns the (major, minor) version of node, or None if it can't be told."""
+    try:
+        output = subprocess.check_output([node, "--version"], stdin=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    match = re.match(r'v(\d+)\.(\d+)', output.decode('ascii', 'replace').strip())
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def spawn_host(state_dir, key, node):
+    version = node_version(node)
+    if version is None or version < WORKER_VERSION:
+        raise OSError("{} {} has no worker threads".format(node, version))
+    args = [node]
+    if version < UNFLAGGED_WORKER_VERSION:
+        args.append("--experimental-worker")
+    args += [
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "lsnode.js"),
+        "--state-dir", state_dir,
+        "--key", key,
+    ]
+    # The host serves every workspace, its workers get their cwd (see open_channel).
+    spawn_detached(args, os.path.join(state_dir, key + ".log"), state_dir)
+
+
+def open_channel(state_dir, command):
+    """
+    Returns a socket connected to a new channel of the shared Node host
+    running command (`node server.js args...`), or None if there's no host.
+    """
+    node, module, server_args = command[0], os.path.abspath(command[1]), command[2:]
+    key = host_key(node)
+    try:
+        sock = acquire(state_dir, key, lambda: spawn_host(state_dir, key, node))
+    except OSError as e:
+        sys.stderr.write("Not using the Node host: {}\n".format(e))
+        return None
+    if sock is not None:
+        channel = {'module': module, 'args': server_args, 'cwd': os.getcwd()}
+        sock.sendall((json.dumps(channel) + "\n").encode('utf-8'))
+    return sock
+
+
+def main():
+    argv = sys.argv[1:]
+    if "--" not in argv:
+        sys.stderr.write("usage: lsnode.py [--state-dir DIR] -- node server.js args...\n")
+        return 2
+    split = argv.index("--")
+    parser = argparse.ArgumentParser(prog="lsnode.py")
+    parser.add_argument("--state-dir", default=STATE_DIR)
+    args = parser.parse_args(argv[:split])
+    command = argv[split + 1:]
+
+    try:
+        os.makedirs(args.state_dir)
+    except OSError:
+        pass
+
+    sock = open_channel(args.state_dir, command)
+    if sock is None:
+        return subprocess.call(command[:1] + [os.path.join(os.path.dirname(os.path.abspath(__file__)), "lscache.js")] + command[1:])
+    bridge(sock)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,907 @@
+#!/usr/bin/env python
+"""
+Shares a single language server between all the editor windows which open the
+same workspace with the same settings.
+
+Every window runs ``lspool.py --key KEY [--cwd DIR] -- command...`` as its
+server. The first one starts a detached pool daemon which runs ``command`` and
+multiplexes the windows over it; the server is shut down after the last window
+goes away.
+
+A document open in several windows is opened once at the server, with the
+versions numbered by the pool: each window's didOpen or didChange bumps it,
+and the versions in publishDiagnostics are changed back to each window's.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import binascii
+import argparse
+import threading
+import subprocess
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import lsproxy
+from jsonrpc import FrameReader, as_message, socket_writer, stream_writer, is_request, is_notification, is_response
+
+STATE_DIR = os.path.expanduser("~/.codeintel/pool")
+
+# Seconds the daemon keeps an unused server around (e.g. while a window reloads).
+LINGER = 10
+
+# Seconds a window waits for the daemon to come up.
+CONNECT_TIMEOUT = 30
+
+# Seconds between samples of the server's memory and CPU use (see --max-rss
+# and --max-cpu), and the seconds its CPU use is averaged over.
+SAMPLE_INTERVAL = 10
+CPU_WINDOW = 600
+
+# A server which exits (or is restarted for going over its limits) is started
+# again after BACKOFF_BASE * 2 ** (restarts - 1) seconds (at most BACKOFF_MAX),
+# unless it already was MAX_RESTARTS times in the last RESTART_WINDOW seconds.
+BACKOFF_BASE = 1
+BACKOFF_MAX = 60
+MAX_RESTARTS = 5
+RESTART_WINDOW = 600
+
+# Sent by the plugins while a window shows a document of the server's
+# languages, so the server isn't hibernated (and resumes if it was).
+ACTIVE_NOTIFICATION = "$/codeintel/active"
+
+
+def log(*args):
+    sys.stderr.write("{} {}\n".format(time.strftime("%Y-%m-%d %H:%M:%S"), " ".join(str(a) for a in args)))
+    sys.stderr.flush()
+
+
+def state_file(state_dir, key):
+    return os.path.join(state_dir, key + ".json")
+
+
+def read_state(state_dir, key):
+    try:
+        with open(state_file(state_dir, key)) as f:
+            state = json.load(f)
+        return state['port'], state['token']
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+
+
+def write_state(state_dir, key, port, token):
+    path = state_file(state_dir, key)
+    tmp = "{}.{}".format(path, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'port': port, 'token': token, 'pid': os.getpid()}, f)
+    os.replace(tmp, path)
+
+
+def remove_state(state_dir, key, token):
+    state = read_state(state_dir, key)
+    if state is not None and state[1] == token:
+        try:
+            os.remove(state_file(state_dir, key))
+        except OSError:
+            pass
+
+
+def read_stat(pid):
+    """Returns (parent pid, CPU seconds, RSS bytes) of a process, from /proc."""
+    with open("/proc/{}/stat".format(pid)) as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (
+        int(fields[1]),
+        (int(fields[11]) + int(fields[12])) / float(os.sysconf('SC_CLK_TCK')),
+        int(fields[21]) * os.sysconf('SC_PAGE_SIZE'),
+    )
+
+
+def process_tree_usage(pid):
+    """Returns the (CPU seconds, RSS bytes) of a process and all its descendants."""
+    stats = {}
+    for name in os.listdir("/proc"):
+        if name.isdigit():
+            try:
+                stats[int(name)] = read_stat(name)
+            except (IOError, OSError, IndexError, ValueError):
+                pass
+    children = {}
+    for child, stat in stats.items():
+        children.setdefault(stat[0], []).append(child)
+    cpu = rss = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        if current in stats:
+            cpu += stats[current][1]
+            rss += stats[current][2]
+        pending.extend(children.get(current, ()))
+    return cpu, rss
+
+
+########################################################################
+# Window side
+
+def connect(state_dir, key):
+    state = read_state(state_dir, key)
+    if state is None:
+        return None
+    port, token = state
+    try:
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall((token + "\n").encode('ascii'))
+        answer = b""
+        while not answer.endswith(b"\n"):
+            data = sock.recv(1)
+            if not data:
+                break
+            answer += data
+    except (IOError, OSError):
+        return None
+    if answer != b"ok\n":
+        # The daemon is going away, a new one must be started.
+        sock.close()
+        return None
+    return sock
+
+
+def spawn_detached(args, log_path, cwd=None):
+    kwargs = {}
+    if os.name == "nt":
+        kwargs['creationflags'] = 0x00000008 | 0x00000200  # DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    with open(log_path, 'ab') as log_file:
+        subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=log_file,
+            cwd=cwd,
+            **kwargs)
+
+
+def spawn_daemon(state_dir, key, cwd, command, options=()):
+    args = [sys.executable, os.path.abspath(__file__), "--serve", "--state-dir", state_dir, "--key", key]
+    if cwd:
+        args += ["--cwd", cwd]
+    args += list(options) + ["--"] + command
+    spawn_detached(args, os.path.join(state_dir, key + ".log"), cwd)
+
+
+def acquire(state_dir, key, spawn):
+    """
+    Connects to the daemon registered under key, calling spawn() to start it
+    if it isn't running yet.
+    """
+    lock = os.path.join(state_dir, key + ".lock")
+    deadline = time.time() + CONNECT_TIMEOUT
+    while time.time() < deadline:
+        sock = connect(state_dir, key)
+        if sock is not None:
+            return sock
+        try:
+            fd = os.open(lock, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except OSError:
+            # Someone else is starting the daemon, wait for it (or for the lock to go stale).
+            try:
+                if time.time() - os.path.getmtime(lock) > CONNECT_TIMEOUT:
+                    os.remove(lock)
+            except OSError:
+                pass
+            time.sleep(0.05)
+            continue
+        os.close(fd)
+        try:
+            spawn()
+            while time.time() < deadline:
+                sock = connect(state_dir, key)
+                if sock is not None:
+                    return sock
+                time.sleep(0.05)
+        finally:
+            os.remove(lock)
+    return None
+
+
+def bridge(sock, schedule=False, name="server", cache_size=lsproxy.CACHE_SIZE):
+    if schedule:
+        # Prioritize the window's requests on their way (see lsproxy.py).
+        def close_server():
+            try:
+                sock.shutdown(socket.SHUT_WR)
+            except (IOError, OSError):
+                pass
+
+        stdin, write_editor = lsproxy.stdio()
+        lsproxy.run(stdin, sock.makefile('rb'), socket_writer(sock), write_editor, close_server, name, cache_size)
+        return
+
+    stdin = sys.stdin.fileno()
+    stdout = sys.stdout.fileno()
+
+    def pump():
+        try:
+            while True:
+                data = os.read(stdin, 65536)
+                if not data:
+                    break
+                sock.sendall(data)
+            sock.shutdown(socket.SHUT_WR)
+        except (IOError, OSError):
+            pass
+
+    thread = threading.Thread(target=pump)
+    thread.daemon = True
+    thread.start()
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            break
+        while data:
+            data = data[os.write(stdout, data):]
+
+
+########################################################################
+# Daemon side
+
+class Endpoint(object):
+    """
+    Reads messages from rfile and writes them with write (which gets lists of
+    buffers); the server's are passed through without decoding them.
+    """
+    def __init__(self, name, rfile, write):
+        self.name = name
+        self.reader = FrameReader(rfile)
+        self._write = write
+        self._queue = queue.Queue()
+        thread = threading.Thread(target=self._writer)
+        thread.daemon = True
+        thread.start()
+
+    def send(self, message):
+        self._queue.put(as_message(message))
+
+    def close(self):
+        self._queue.put(None)
+
+    def closed(self):
+        pass
+
+    def _writer(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                break
+            try:
+                self._write(message.buffers())
+            except (IOError, OSError):
+                break
+        self.closed()
+
+
+class Client(Endpoint):
+    def __init__(self, name, sock, rfile):
+        super(Client, self).__init__(name, rfile, socket_writer(sock))
+        self.sock = sock
+        self.ready = False
+        self.requests = {}  # client request id -> pool request id
+        self.documents = {}  # uri -> version of the documents the window has open
+        self.diagnostics = {}  # uri -> (version, digest) of the last diagnostics sent
+
+    def diagnostics_changed(self, params):
+        """Tells if the publishDiagnostics params differ from the last ones sent for their document."""
+        key = lsproxy.diagnostics_digest(params)
+        uri = params.get('uri')
+        if self.diagnostics.get(uri) == key:
+            return False
+        self.diagnostics[uri] = key
+        return True
+
+    def closed(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except (IOError, OSError):
+            pass
+
+
+class Pool(object):
+    def __init__(self, state_dir, key, cwd, command, max_rss=None, max_cpu=None, idle_timeout=None, max_resume_time=None):
+        self.state_dir = state_dir
+        self.key = key
+        self.cwd = cwd
+        self.command = command
+        self.max_rss = max_rss  # MB
+        self.max_cpu = max_cpu  # percent of a core, averaged over CPU_WINDOW
+        self.idle_timeout = idle_timeout  # seconds without messages from the windows before hibernating
+        self.max_resume_time = max_resume_time  # servers slower to start than this aren't hibernated
+        self.token = binascii.hexlify(os.urandom(16)).decode('ascii')
+        self.lock = threading.RLock()
+        self.done = threading.Event()
+        self.clients = []
+        self.closing = False
+        self.linger_timer = None
+        self.next_id = 0
+        self.requests = {}  # pool request id -> (client, client request id)
+        self.server_requests = {}  # server request id -> client
+        self.documents = {}  # uri -> number of windows with the document open
+        self.texts = {}  # uri -> textDocument item (with the current text), to reopen it after a restart
+        self.diagnostics_hits = 0  # unchanged diagnostics not sent again
+        self.diagnostics_misses = 0
+        self.init_id = None
+        self.init_request = None
+        self.init_response = None
+        self.configuration = None  # the last workspace/didChangeConfiguration
+        self.init_waiting = []
+        self.initialized = False
+        self.shutdown_id = None
+        self.shutdown_done = threading.Event()
+        self.restarting = False
+        self.hibernating = False
+        self.last_activity = time.time()
+        self.started = None  # time the current server was started
+        self.startup_time = 0  # seconds it took to initialize
+        self.replaced = None  # the server being replaced by a restart
+        self.restarts = []  # times of the recent restarts
+        self.held = []  # (client, message) arriving during a restart
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def start_server(self):
+        self.process = None
+        self.channel = None
+        self.started = time.time()
+        if len(self.command) > 1 and os.path.basename(self.command[1]) == "lsnode.py" and "--" in self.command:
+            # Talk to the shared Node host directly instead of through yet another bridge process.
+            import lsnode
+            self.channel = lsnode.open_channel(self.state_dir, self.command[self.command.index("--") + 1:])
+            if self.channel is not None:
+                log("Started", self.command, "in the shared Node host")
+                server = Endpoint("server", self.channel.makefile('rb'), socket_writer(self.channel))
+                self.start_reader(server)
+                return server
+
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=self.cwd)
+        log("Started", self.command, "pid", self.process.pid)
+        server = Endpoint("server", self.process.stdout, stream_writer(self.process.stdin))
+        self.start_reader(server)
+        return server
+
+    def start_reader(self, server):
+        thread = threading.Thread(target=self.read_server, args=(server,))
+        thread.daemon = True
+        thread.start()
+
+    def serve(self):
+        with self.lock:
+            self.server = self.start_server()
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(16)
+        write_state(self.state_dir, self.key, self.listener.getsockname()[1], self.token)
+
+        targets = [self.accept]
+        if (self.max_rss or self.max_cpu) and os.path.isdir("/proc/self"):
+            targets.append(self.watch)
+        if self.idle_timeout:
+            targets.append(self.watch_idle)
+        for target in targets:
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+        with self.lock:
+            self.schedule_stop(CONNECT_TIMEOUT)
+        self.done.wait()
+        remove_state(self.state_dir, self.key, self.token)
+
+    def schedule_stop(self, delay):
+        if self.linger_timer is not None:
+            self.linger_timer.cancel()
+        self.linger_timer = threading.Timer(delay, self.stop)
+        self.linger_timer.daemon = True
+        self.linger_timer.start()
+
+    def stop(self):
+        with self.lock:
+            if self.clients or self.closing:
+                return
+            self.closing = True
+            remove_state(self.state_dir, self.key, self.token)
+            if self.init_response is not None and not self.hibernating:
+                self.shutdown_id = self.new_id()
+                self.server.send({'jsonrpc': "2.0", 'id': self.shutdown_id, 'method': "shutdown"})
+        log("Stopping server, no windows left")
+        log("Diagnostics: {} repeats dropped, {} sent".format(self.diagnostics_hits, self.diagnostics_misses))
+        if self.shutdown_id is not None:
+            self.shutdown_done.wait(5)
+            self.server.send({'jsonrpc': "2.0", 'method': "exit"})
+        if self.process is not None:
+            deadline = time.time() + 5
+            while self.process.poll() is None and time.time() < deadline:
+                time.sleep(0.1)
+            if self.process.poll() is None:
+                self.process.kill()
+        else:
+            self.done.wait(5)
+            self.channel.close()
+        self.done.set()
+
+    def read_server(self, server):
+        while True:
+            try:
+                message = server.reader.read()
+            except ValueError as e:
+                log("Invalid message from server:", e)
+                continue
+            if message is None:
+                break
+            with self.lock:
+                if server is self.server:
+                    self.on_server_message(message)
+        with self.lock:
+            if server is not self.server or server is self.replaced:
+                return  # replaced by a restart
+            if not self.closing and self.restart("it exited"):
+                return
+            log("Server exited")
+            self.closing = True
+            remove_state(self.state_dir, self.key, self.token)
+            for client in self.clients:
+                client.close()
+            self.clients = []
+        self.done.set()
+
+    def watch(self):
+        """Restarts the server when it goes over --max-rss or --max-cpu."""
+        samples = []  # (time, CPU seconds) of the current server process
+        process = None
+        while not self.done.wait(SAMPLE_INTERVAL):
+            if self.process is not process:
+                process = self.process
+                samples = []
+            if process is None or self.restarting or self.hibernating:
+                continue
+            try:
+                cpu, rss = process_tree_usage(process.pid)
+            except (IOError, OSError):
+                continue
+            now = time.time()
+            samples.append((now, cpu))
+            while now - samples[0][0] > CPU_WINDOW:
+                samples.pop(0)
+            reason = None
+            if self.max_rss and rss > self.max_rss * 1024 * 1024:
+                reason = "it uses {} MB of memory, over the limit of {} MB".format(rss // (1024 * 1024), self.max_rss)
+            elif self.max_cpu and now - samples[0][0] >= CPU_WINDOW - SAMPLE_INTERVAL:
+                usage = 100 * (cpu - samples[0][1]) / (now - samples[0][0])
+                if usage > self.max_cpu:
+                    reason = "it used {:.0f}% CPU for {:.0f} seconds, over the limit of {}%".format(
+                        usage, now - samples[0][0], self.max_cpu)
+            if reason:
+                with self.lock:
+                    if process is self.process:
+                        self.restart(reason)
+
+    def restart(self, reason):
+        """
+        Replaces the server by a new one (after the crash-loop backoff) which
+        gets the same initialize request, settings and open documents. Returns
+        False if the server can't be restarted.
+        """
+        if self.closing or self.restarting or self.init_response is None or not self.clients:
+            return False
+        now = time.time()
+        self.restarts = [t for t in self.restarts if now - t < RESTART_WINDOW]
+        if len(self.restarts) >= MAX_RESTARTS:
+            log("Not restarting the server, restarted {} times in {} seconds; {}".format(
+                len(self.restarts), RESTART_WINDOW, reason))
+            return False
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (len(self.restarts) - 1)) if self.restarts else 0
+        self.restarts.append(now)
+        self.restarting = True
+        log("Restarting server in {} seconds, {}".format(delay, reason))
+        for client in self.clients:
+            if client.ready:
+                client.send({
+                    'jsonrpc': "2.0",
+                    'method': "window/logMessage",
+                    'params': {'type': 3, 'message': "Restarting the language server, {}".format(reason)},
+                })
+
+        self.fail_requests("Server restarted")
+        self.replaced = self.server
+        thread = threading.Thread(target=self._restart, args=(self.server, self.process, self.channel, self.new_id(), delay))
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def fail_requests(self, reason):
+        """Answers the requests the server won't, as it's going away."""
+        for pool_id, (client, client_id) in self.requests.items():
+            client.requests.pop(client_id, None)
+            client.send({'jsonrpc': "2.0", 'id': client_id, 'error': {'code': -32603, 'message': reason}})
+        self.requests = {}
+        self.server_requests = {}
+
+    def _restart(self, server, process, channel, shutdown_id, delay):
+        self.stop_server(server, process, channel, shutdown_id)
+        time.sleep(delay)
+        with self.lock:
+            if not self.closing:
+                self.start_again()
+
+    def stop_server(self, server, process, channel, shutdown_id):
+        if process is None or process.poll() is None:
+            server.send({'jsonrpc': "2.0", 'id': shutdown_id, 'method': "shutdown"})
+            server.send({'jsonrpc': "2.0", 'method': "exit"})
+        if process is not None:
+            deadline = time.time() + 5
+            while process.poll() is None and time.time() < deadline:
+                time.sleep(0.1)
+            if process.poll() is None:
+                process.kill()
+        else:
+            time.sleep(1)
+            channel.close()
+        server.close()
+
+    def start_again(self):
+        """Starts a new server and initializes it like the first one, see restarted()."""
+        try:
+            self.server = self.start_server()
+        except (IOError, OSError) as e:
+            log("Could not restart server:", e)
+            self.restarting = False
+            self.closing = True
+            remove_state(self.state_dir, self.key, self.token)
+            for client in self.clients:
+                client.close()
+            self.clients = []
+            self.done.set()
+            return
+        self.init_id = self.new_id()
+        self.server.send(dict(self.init_request, id=self.init_id))
+
+    def watch_idle(self):
+        """Hibernates the server when the windows haven't used it for --idle-timeout seconds."""
+        while not self.done.wait(min(SAMPLE_INTERVAL, self.idle_timeout)):
+            with self.lock:
+                if (self.closing or self.restarting or self.hibernating or self.init_response is None or
+                        not self.clients or time.time() - self.last_activity < self.idle_timeout):
+                    continue
+                if self.max_resume_time and self.startup_time > self.max_resume_time:
+                    continue
+                self.hibernate()
+
+    def hibernate(self):
+        """Stops the server, keeping what's needed to start it again (see wake)."""
+        log("Hibernating server after {} idle seconds, {} documents open".format(
+            int(time.time() - self.last_activity), len(self.texts)))
+        self.hibernating = True
+        self.fail_requests("Server hibernated")
+        self.replaced = self.server
+        thread = threading.Thread(target=self.stop_server, args=(self.server, self.process, self.channel, self.new_id()))
+        thread.daemon = True
+        thread.start()
+
+    def wake(self):
+        log("Resuming server")
+        self.hibernating = False
+        self.restarting = True
+        self.start_again()
+
+    def restarted(self):
+        """Brings the new server to where the old one was, once it's initialized."""
+        if self.initialized:
+            self.server.send({'jsonrpc': "2.0", 'method': "initialized", 'params': {}})
+        if self.configuration is not None:
+            self.server.send(self.configuration)
+        for document in self.texts.values():
+            self.server.send({'jsonrpc': "2.0", 'method': "textDocument/didOpen", 'params': {'textDocument': document}})
+        for client in self.clients:
+            client.diagnostics.clear()
+        self.restarting = False
+        log("Server back after {:.1f} seconds, {} documents reopened".format(self.startup_time, len(self.texts)))
+        held, self.held = self.held, []
+        for client, message in held:
+            if client in self.clients:
+                self.on_client_message(client, message)
+
+    def accept(self):
+        n = 0
+        while True:
+            sock, _ = self.listener.accept()
+            n += 1
+            thread = threading.Thread(target=self.read_client, args=("window-{}".format(n), sock))
+            thread.daemon = True
+            thread.start()
+
+    def read_client(self, name, sock):
+        rfile = sock.makefile('rb')
+        if rfile.readline().strip().decode('ascii', 'replace') != self.token:
+            sock.close()
+            return
+        with self.lock:
+            if self.closing:
+                sock.close()
+                return
+            sock.sendall(b"ok\n")
+            client = Client(name, sock, rfile)
+            self.clients.append(client)
+            if self.linger_timer is not None:
+                self.linger_timer.cancel()
+                self.linger_timer = None
+        log("Connected", name, "({} windows)".format(len(self.clients)))
+        while True:
+            try:
+                message = client.reader.read()
+                if message is None:
+                    break
+                message = message.data
+            except (IOError, OSError):
+                break
+            except ValueError as e:
+                log("Invalid message from", name, e)
+                continue
+            with self.lock:
+                if client not in self.clients:
+                    break
+                self.on_client_message(client, message)
+        with self.lock:
+            self.disconnect(client)
+
+    def disconnect(self, client):
+        if client not in self.clients:
+            return
+        self.clients.remove(client)
+        client.close()
+        for uri in client.documents:
+            self.release_document(uri)
+        for pool_id in client.requests.values():
+            self.requests.pop(pool_id, None)
+            self.server.send({'jsonrpc': "2.0", 'method': "$/cancelRequest", 'params': {'id': pool_id}})
+        for server_id, owner in list(self.server_requests.items()):
+            if owner is client:
+                del self.server_requests[server_id]
+                self.server.send({'jsonrpc': "2.0", 'id': server_id, 'error': {'code': -32603, 'message': "Window closed"}})
+        self.init_waiting = [(c, i) for c, i in self.init_waiting if c is not client]
+        log("Disconnected", client.name, "({} windows)".format(len(self.clients)))
+        log("Diagnostics: {} repeats dropped, {} sent".format(self.diagnostics_hits, self.diagnostics_misses))
+        if not self.clients and not self.closing:
+            self.schedule_stop(LINGER)
+
+    def reply_initialize(self, client, client_id):
+        response = self.init_response.with_id(client_id)
+        client.send(response)
+        client.ready = True
+
+    def on_client_message(self, client, message):
+        method = message.get('method')
+        self.last_activity = time.time()
+        if self.hibernating:
+            self.wake()
+        if method == ACTIVE_NOTIFICATION:
+            return
+        if self.restarting:
+            self.held.append((client, message))
+            return
+        if is_request(message):
+            if method == "initialize":
+                if self.init_response is not None:
+                    self.reply_initialize(client, message['id'])
+                else:
+                    self.init_waiting.append((client, message['id']))
+                    if self.init_id is None:
+                        self.init_id = self.new_id()
+                        self.init_request = message
+                        self.server.send(dict(message, id=self.init_id))
+            elif method == "shutdown":
+                # The server is only shut down when the last window goes away.
+                client.send({'jsonrpc': "2.0", 'id': message['id'], 'result': None})
+            else:
+                pool_id = self.new_id()
+                self.requests[pool_id] = (client, message['id'])
+                client.requests[message['id']] = pool_id
+                self.server.send(dict(message, id=pool_id))
+        elif is_notification(message):
+            if method == "initialized":
+                if not self.initialized:
+                    self.initialized = True
+                    self.server.send(message)
+            elif method == "exit":
+                self.disconnect(client)
+            elif method == "$/cancelRequest":
+                pool_id = client.requests.get(message.get('params', {}).get('id'))
+                if pool_id is not None:
+                    self.server.send(dict(message, params={'id': pool_id}))
+            elif method == "textDocument/didOpen":
+                client.diagnostics.pop(message['params']['textDocument']['uri'], None)
+                self.open_document(client, message)
+            elif method == "textDocument/didClose":
+                uri = message['params']['textDocument']['uri']
+                client.diagnostics.pop(uri, None)
+                if uri in client.documents:
+                    del client.documents[uri]
+                    self.release_document(uri)
+            elif method == "textDocument/didChange":
+                self.change_document(client, message)
+            else:
+                if method == "workspace/didChangeConfiguration":
+                    self.configuration = message
+                self.server.send(message)
+        elif is_response(message):
+            if self.server_requests.pop(message['id'], None) is not None:
+                self.server.send(message)
+
+    def on_server_message(self, message):
+        if message.is_response():
+            message_id = message.get('id')
+            if message_id == self.init_id:
+                self.startup_time = time.time() - self.started
+                if self.restarting:
+                    self.restarted()
+                    return
+                self.init_response = message
+                for client, client_id in self.init_waiting:
+                    self.reply_initialize(client, client_id)
+                self.init_waiting = []
+            elif message_id == self.shutdown_id:
+                self.shutdown_done.set()
+            else:
+                entry = self.requests.pop(message_id, None)
+                if entry is not None:
+                    client, client_id = entry
+                    client.requests.pop(client_id, None)
+                    client.send(message.with_id(client_id))
+        elif message.is_request():
+            # Requests from the server are answered by the oldest window.
+            for client in self.clients:
+                if client.ready:
+                    self.server_requests[message.get('id')] = client
+                    client.send(message)
+                    break
+            else:
+                self.server.send({'jsonrpc': "2.0", 'id': message.get('id'), 'error': {'code': -32603, 'message': "No windows connected"}})
+        elif message.get('method') == "textDocument/publishDiagnostics":
+            # Servers republish the same diagnostics over and over (cquery on
+            # every parse, pyls on every lint), don't make the windows redraw them.
+            params = message.get('params', {})
+            for client in self.clients:
+                if client.ready:
+                    client_params = self.window_diagnostics(client, params)
+                    if client.diagnostics_changed(client_params):
+                        self.diagnostics_misses += 1
+                        client.send(message if client_params is params else dict(message.data, params=client_params))
+                    else:
+                        self.diagnostics_hits += 1
+        else:
+            for client in self.clients:
+                if client.ready:
+                    client.send(message)
+
+    def open_document(self, client, message):
+        document = message['params']['textDocument']
+        uri = document['uri']
+        if uri not in client.documents:
+            self.documents[uri] = self.documents.get(uri, 0) + 1
+        client.documents[uri] = document.get('version')
+        current = self.texts.get(uri)
+        if current is None:
+            self.texts[uri] = dict(document)
+            self.server.send(message)
+        elif current.get('text') != document.get('text'):
+            # Already open (in another window, or this one again), just bring
+            # the server up to date.
+            current['text'] = document.get('text', "")
+            current['version'] = (current.get('version') or 0) + 1
+            self.server.send({
+                'jsonrpc': "2.0",
+                'method': "textDocument/didChange",
+                'params': {
+                    'textDocument': {'uri': uri, 'version': current['version']},
+                    'contentChanges': [{'text': current['text']}],
+                },
+            })
+
+    def release_document(self, uri):
+        count = self.documents.get(uri, 0) - 1
+        if count > 0:
+            self.documents[uri] = count
+            return
+        self.documents.pop(uri, None)
+        self.texts.pop(uri, None)
+        self.server.send({
+            'jsonrpc': "2.0",
+            'method': "textDocument/didClose",
+            'params': {'textDocument': {'uri': uri}},
+        })
+
+    def change_document(self, client, message):
+        params = message['params']
+        uri = params['textDocument']['uri']
+        document = self.texts.get(uri)
+        if document is None:
+            self.server.send(message)
+            return
+        if uri in client.documents:
+            client.documents[uri] = params['textDocument'].get('version')
+        for change in params.get('contentChanges', ()):
+            document['text'] = lsproxy.apply_change(document.get('text', ""), change)
+        document['version'] = (document.get('version') or 0) + 1
+        self.server.send(dict(message, params=dict(params, textDocument=dict(params['textDocument'], version=document['version']))))
+
+    def window_diagnostics(self, client, params):
+        """The publishDiagnostics params with the window's version of the document (if they have one)."""
+        if params.get('version') is None:
+            return params
+        uri = params.get('uri')
+        document = self.texts.get(uri)
+        if uri in client.documents and document is not None and params['version'] == document.get('version'):
+            return dict(params, version=client.documents[uri])
+        # Diagnostics of an older version, which the window can't tell.
+        return dict((key, value) for key, value in params.items() if key != 'version')
+
+
+def main():
+    argv = sys.argv[1:]
+    if "--" not in argv:
+        sys.stderr.write("usage: lspool.py [--serve] [--state-dir DIR] --key KEY [--cwd DIR] [--schedule] [--cache-size MB] "
+                         "[--max-rss MB] [--max-cpu PERCENT] [--idle-timeout SECONDS] "
+                         "[--max-resume-time SECONDS] -- command...\n")
+        return 2
+    split = argv.index("--")
+    parser = argparse.ArgumentParser(prog="lspool.py")
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--state-dir", default=STATE_DIR)
+    parser.add_argument("--key", required=True)
+    parser.add_argument("--cwd")
+    parser.add_argument("--schedule", action="store_true", help="prioritize this window's requests")
+    parser.add_argument("--cache-size", type=int, default=lsproxy.CACHE_SIZE,
+                        help="megabytes of this window's responses cached when scheduling, 0 for none")
+    parser.add_argument("--max-rss", type=int, help="restart the server when it uses more memory (MB)")
+    parser.add_argument("--max-cpu", type=int, help="restart the server when it uses more CPU (percent)")
+    parser.add_argument("--idle-timeout", type=int, help="stop the server when unused for this long (seconds)")
+    parser.add_argument("--max-resume-time", type=int,
+                        help="keep the server when it takes longer than this to start again (seconds)")
+    args = parser.parse_args(argv[:split])
+    command = argv[split + 1:]
+
+    try:
+        os.makedirs(args.state_dir)
+    except OSError:
+        pass
+
+    if args.serve:
+        Pool(args.state_dir, args.key, args.cwd, command,
+             args.max_rss, args.max_cpu, args.idle_timeout, args.max_resume_time).serve()
+        return 0
+
+    options = []
+    for option in ("max_rss", "max_cpu", "idle_timeout", "max_resume_time"):
+        if getattr(args, option):
+            options += ["--" + option.replace("_", "-"), str(getattr(args, option))]
+    sock = acquire(args.state_dir, args.key, lambda: spawn_daemon(args.state_dir, args.key, args.cwd, command, options))
+    if sock is None:
+        sys.stderr.write("Could not connect to the language server pool\n")
+        return 1
+    bridge(sock, args.schedule, args.key, args.cache_size)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
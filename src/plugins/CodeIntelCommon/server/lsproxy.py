@@ -0,0 +1,666 @@
+#!/usr/bin/env python
+"""
+Sits between the editor and a language server and schedules the editor's
+requests by priority, so the interactive ones (completion, hover,
+signatureHelp) don't wait behind background work (codeLens, documentSymbol...)
+the server was handed first.
+
+Usage: ``lsproxy.py -- command...``
+
+Interactive and regular requests, and notifications, are sent right away.
+Background requests are held while an interactive one is being answered
+(for at most MAX_HOLD seconds) and only MAX_BACKGROUND of them are at the
+server at a time; a newer background request for the same method and
+document replaces the one held. Like cquery's dropOldRequests, for every
+server: a completion, hover or signatureHelp request cancels the one still
+running for the same document.
+
+Responses to hover, definition and documentSymbol requests are cached, keyed
+by (document, version, method, position), so moving the cursor back and forth
+doesn't ask the server again. An entry is dropped when a document it depends
+on changes, is saved or closed, or changes on disk (didChangeWatchedFiles):
+its own document, or the ones its result points to (definitions). Hovers,
+whose text may come from any document, are dropped when their own document
+is edited and when any document is saved, closed or changed on disk; edits
+not yet saved in other documents don't drop them. The least recently used
+entries go when the cache grows over --cache-size MB (0 disables it).
+
+A completion result which isn't incomplete (isIncomplete false) holds every
+candidate for the word being typed: while the word grows, later completion
+requests at the same word start are answered from it, fuzzy matched against
+the word and ranked here, without asking the server again. A new word start
+(or a word which shrinks) goes back to the server, and so does any completion
+after the document changed anywhere but in the word.
+
+Servers republish the same diagnostics over and over (cquery on every parse,
+pyls on every lint): a publishDiagnostics notification which repeats the last
+one its document got (same version and diagnostics) isn't passed on, so the
+editor doesn't redraw them.
+
+Pooled servers get the same scheduling in their window's bridge (see
+lspool.py --schedule) instead of through another process. Only requests'
+params (and diagnostics) are ever decoded, the rest is passed through as read (see jsonrpc.py).
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import subprocess
+from collections import deque, OrderedDict
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from jsonrpc import FrameReader, Message, as_message, stream_writer
+
+INTERACTIVE = frozenset([
+    "textDocument/completion",
+    "completionItem/resolve",
+    "textDocument/hover",
+    "textDocument/signatureHelp",
+])
+BACKGROUND = frozenset([
+    "textDocument/codeLens",
+    "codeLens/resolve",
+    "textDocument/documentSymbol",
+    "textDocument/documentLink",
+    "documentLink/resolve",
+    "textDocument/documentColor",
+    "textDocument/foldingRange",
+])
+# Requests only the newest of which (per document) is worth answering.
+SUPERSEDED = frozenset([
+    "textDocument/completion",
+    "textDocument/hover",
+    "textDocument/signatureHelp",
+])
+
+# Responses cached per method, with the documents they depend on: their own
+# and the ones of the locations in their result, just their own, or their own
+# while edited and any once saved.
+CACHED = {
+    "textDocument/hover": "saved",
+    "textDocument/definition": "result",
+    "textDocument/documentSymbol": "document",
+}
+# Megabytes of responses kept in the cache.
+CACHE_SIZE = 16
+# Lookups between two logs of the cache's hit rate.
+CACHE_REPORT_INTERVAL = 1000
+
+# Characters a completion's word ends with, before the cursor.
+WORD_RE = re.compile(r'[\w$]*$')
+
+MAX_BACKGROUND = 1
+# Seconds background requests wait for an interactive request at most.
+MAX_HOLD = 1.0
+
+REQUEST_CANCELLED = -32800
+# Seconds (and how many) the ids of cancelled requests are remembered, for
+# dropping their responses; servers which never answer them don't leak ids.
+CANCELLED_TIMEOUT = 60
+MAX_CANCELLED = 1000
+
+# Directory to record the traffic to, as NAME-PID.editor and NAME-PID.server
+# files of frames (what benchmarks/lsp_framing.py reads).
+RECORD_DIR = os.environ.get("CODEINTEL_LSP_RECORD")
+
+LINE_BREAK_RE = re.compile(r'\r\n|\r|\n')
+
+
+def log(*args):
+    sys.stderr.write("{} {}\n".format(time.strftime("%Y-%m-%d %H:%M:%S"), " ".join(str(a) for a in args)))
+    sys.stderr.flush()
+
+
+def document_uri(message):
+    return (message.get('params') or {}).get('textDocument', {}).get('uri')
+
+
+def diagnostics_digest(params):
+    """What tells publishDiagnostics params apart from the last ones of their document."""
+    data = json.dumps(params.get('diagnostics'), sort_keys=True, separators=(',', ':'))
+    return (params.get('version'), hashlib.sha1(data.encode('utf-8')).digest())
+
+
+def line_starts(text):
+    return [0] + [m.end() for m in LINE_BREAK_RE.finditer(text)]
+
+
+def position_offset(text, starts, position):
+    """Returns the offset in text of an LSP position (with UTF-16 characters), given its line_starts."""
+    line = position['line']
+    if line >= len(starts):
+        return len(text)
+    offset = starts[line]
+    match = LINE_BREAK_RE.search(text, offset)
+    end = match.start() if match else len(text)
+    units = position['character']
+    while units > 0 and offset < end:
+        units -= 2 if ord(text[offset]) > 0xFFFF else 1
+        offset += 1
+    return offset
+
+
+def apply_change(text, change):
+    """Returns text with a didChange content change applied."""
+    if 'range' not in change:
+        return change['text']
+    starts = line_starts(text)
+    start = position_offset(text, starts, change['range']['start'])
+    end = position_offset(text, starts, change['range']['end'])
+    return text[:start] + change['text'] + text[end:]
+
+
+def utf16_length(text):
+    return len(text) + sum(1 for char in text if ord(char) > 0xFFFF)
+
+
+def fuzzy_score(pattern, text):
+    """
+    Returns how well pattern matches text as a (case insensitive) subsequence,
+    the higher the better, or None if it doesn't: prefixes first, then
+    matches at word starts (after _ or in camelCase) and runs of characters.
+    """
+    if not pattern:
+        return 0
+    lower = text.lower()
+    if lower.startswith(pattern.lower()):
+        return 1000 + (100 if text.startswith(pattern) else 0) - len(text)
+    score = 0
+    index = 0
+    previous = -2
+    for char in pattern:
+        found = lower.find(char.lower(), index)
+        if found < 0:
+            return None
+        if found == previous + 1:
+            score += 5
+        elif found == 0 or not text[found - 1].isalnum() or (text[found].isupper() and text[found - 1].islower()):
+            score += 10
+        else:
+            score -= min(found - index, 5)
+        if text[found] == char:
+            score += 1
+        previous = found
+        index = found + 1
+    return score
+
+
+class CompletionSession(object):
+    """The items of a complete completion result, for the word started at key (uri, line, character)."""
+    def __init__(self, key, prefix, character, items):
+        self.key = key
+        self.prefix = prefix
+        self.character = character
+        self.items = sorted(items, key=lambda item: item.get('sortText') or item.get('label', ""))
+
+    def covers(self, key, prefix):
+        return key == self.key and prefix.startswith(self.prefix)
+
+    def in_word(self, change):
+        """Tells if a didChange content change only touches the word (its line from the word start on)."""
+        if 'range' not in change:
+            return False
+        start, end = change['range']['start'], change['range']['end']
+        line = self.key[1]
+        return start['line'] == end['line'] == line and start['character'] >= self.key[2] and '\n' not in change['text']
+
+    def filter(self, prefix, character):
+        """Returns the items matching prefix, best first, with their edits ending at character."""
+        ranked = []
+        for index, item in enumerate(self.items):
+            score = fuzzy_score(prefix, item.get('filterText') or item.get('label', ""))
+            if score is not None:
+                ranked.append((-score, index))
+        ranked.sort()
+        return [self.moved(self.items[index], rank, character) for rank, (_, index) in enumerate(ranked)]
+
+    def moved(self, item, rank, character):
+        item = dict(item, sortText="{:05d}".format(rank))
+        edit = item.get('textEdit')
+        if edit:
+            edit = dict(edit)
+            line = self.key[1]
+            for name in ('range', 'insert', 'replace'):
+                if name in edit and edit[name]['end'] == {'line': line, 'character': self.character}:
+                    edit[name] = {'start': edit[name]['start'], 'end': {'line': line, 'character': character}}
+            item['textEdit'] = edit
+        return item
+
+
+class QueuedWriter(object):
+    """
+    Writes messages (or dicts) from a thread of its own, so senders never
+    block on a full pipe. write gets the list of buffers of each frame.
+    """
+    def __init__(self, write):
+        self._write = write
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._writer)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def send(self, message):
+        self._queue.put(as_message(message))
+
+    def close(self):
+        self._queue.put(None)
+
+    def join(self):
+        self._thread.join()
+
+    def _writer(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                break
+            try:
+                self._write(message.buffers())
+            except (IOError, OSError):
+                break
+
+
+def result_uris(result):
+    """The documents the locations in a definition result are in."""
+    if isinstance(result, dict):
+        result = [result]
+    uris = set()
+    for location in result or ():
+        if isinstance(location, dict):
+            uri = location.get('uri') or location.get('targetUri')
+            if uri:
+                uris.add(uri)
+    return uris
+
+
+class ResponseCache(object):
+    """Bodies of responses by request key, least recently used first."""
+    def __init__(self, size):
+        self.size = size
+        self.used = 0
+        self.entries = OrderedDict()  # key -> (body, uris it depends on, if any saved document too)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.pop(key)
+        self.entries[key] = entry
+        return entry[0]
+
+    def put(self, key, body, uris, saved=False):
+        if len(body) > self.size:
+            return
+        self.discard(key)
+        self.entries[key] = (body, uris, saved)
+        self.used += len(body)
+        while self.used > self.size:
+            _, (old, _, _) = self.entries.popitem(last=False)
+            self.used -= len(old)
+            self.evictions += 1
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.used -= len(entry[0])
+
+    def invalidate(self, uri, saved=False):
+        """Drops the entries which depend on the document, edited or (if saved) saved."""
+        for key, (_, uris, any_saved) in list(self.entries.items()):
+            if uri in uris or (saved and any_saved):
+                self.discard(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.used = 0
+
+    def describe(self):
+        lookups = self.hits + self.misses
+        return "Cache: {} hits, {} misses ({:.0f}% hit rate), {} evictions, {} entries, {:.1f} MB".format(
+            self.hits, self.misses, 100.0 * self.hits / lookups if lookups else 0,
+            self.evictions, len(self.entries), self.used / 1e6)
+
+
+class Proxy(object):
+    def __init__(self, send_server, send_editor, cache_size=CACHE_SIZE):
+        self.send_server = send_server
+        self.send_editor = send_editor
+        self.lock = threading.Lock()
+        self.pending = {}  # request id -> (method, uri, time sent), at the server
+        self.held = deque()  # background requests waiting
+        self.cancelled = OrderedDict()  # id -> time, of the ones answered here whose server responses are dropped
+        self.interactive = 0
+        self.background = 0
+        self.timer = None
+        self.latencies = {}  # method -> [seconds]
+        self.cache = ResponseCache(cache_size * 1000000) if cache_size else None
+        self.versions = {}  # uri -> version of the open documents
+        self.texts = {}  # uri -> text of the open documents
+        self.lookups = {}  # request id -> cache key of its response
+        self.completions = {}  # uri -> CompletionSession
+        self.completing = {}  # request id -> (session key, prefix, character, document version)
+        self.completed_here = 0
+        self.completed_by_server = 0
+        self.diagnostics = {}  # uri -> digest of the last diagnostics sent to the editor
+        self.diagnostics_hits = 0  # repeats dropped
+        self.diagnostics_misses = 0
+
+    def from_editor(self, message):
+        with self.lock:
+            method = message.get('method')
+            if message.is_request():
+                uri = document_uri(message) if method in SUPERSEDED or method in BACKGROUND else None
+                if method in SUPERSEDED:
+                    for request_id, (pending_method, pending_uri, _) in list(self.pending.items()):
+                        if pending_method == method and pending_uri == uri:
+                            self.cancel(request_id)
+                if self.cache is not None and method in CACHED and self.lookup(message):
+                    return
+                if method == "textDocument/completion" and self.complete(message):
+                    return
+                if method in BACKGROUND:
+                    for held in list(self.held):
+                        if held.get('method') == method and document_uri(held) == uri:
+                            self.held.remove(held)
+                            self.answer_cancelled(held.get('id'))
+                    self.held.append(message)
+                    self.dispatch()
+                    return
+                self.send(message)
+            elif method == "$/cancelRequest":
+                request_id = message.get('params', {}).get('id')
+                for held in self.held:
+                    if held.get('id') == request_id:
+                        self.held.remove(held)
+                        self.answer_cancelled(request_id)
+                        return
+                self.send_server(message)
+            else:
+                if method and method.startswith(("textDocument/did", "workspace/didChangeWatched")):
+                    self.document_changed(method, message.get('params') or {})
+                self.send_server(message)
+
+    def from_server(self, message):
+        with self.lock:
+            if message.is_response():
+                request_id = message.get('id')
+                if self.cancelled.pop(request_id, None) is not None:
+                    return
+                key = self.lookups.pop(request_id, None)
+                if key is not None and not message.has('error'):
+                    self.store(key, message)
+                completing = self.completing.pop(request_id, None)
+                if completing is not None:
+                    self.completed(completing, message)
+                if request_id in self.pending:
+                    method, _, sent = self.forget(request_id)
+                    self.latencies.setdefault(method, []).append(time.time() - sent)
+                    self.dispatch()
+            elif message.get('method') == "textDocument/publishDiagnostics":
+                params = message.get('params') or {}
+                digest = diagnostics_digest(params)
+                if self.diagnostics.get(params.get('uri')) == digest:
+                    self.diagnostics_hits += 1
+                    return
+                self.diagnostics[params.get('uri')] = digest
+                self.diagnostics_misses += 1
+            self.send_editor(message)
+
+    def send(self, message):
+        method = message.get('method')
+        uri = document_uri(message) if method in SUPERSEDED else None
+        self.pending[message.get('id')] = (method, uri, time.time())
+        if method in INTERACTIVE:
+            self.interactive += 1
+        elif method in BACKGROUND:
+            self.background += 1
+        self.send_server(message)
+
+    def lookup(self, message):
+        """Answers a request from the cache, or notes where its response goes, returns True if answered."""
+        params = message.get('params') or {}
+        uri = params.get('textDocument', {}).get('uri')
+        if uri not in self.versions:
+            return False
+        position = params.get('position') or {}
+        key = (uri, self.versions[uri], message.get('method'), position.get('line'), position.get('character'))
+        body = self.cache.get(key)
+        if body is None:
+            self.lookups[message.get('id')] = key
+            if self.cache.misses % CACHE_REPORT_INTERVAL == 0:
+                log(self.cache.describe())
+            return False
+        self.send_editor(Message(body).with_id(message.get('id')))
+        return True
+
+    def store(self, key, message):
+        uri, version, method = key[:3]
+        if self.versions.get(uri) != version:
+            return  # the document changed while the server was at it
+        uris = set([uri])
+        if CACHED[method] == "result":
+            uris |= result_uris(message.get('result'))
+        self.cache.put(key, b"".join(bytes(part) for part in message.buffers()[1:]), uris, CACHED[method] == "saved")
+
+    def complete(self, message):
+        """Answers a completion request from the session of its word, or notes its word, returns True if answered."""
+        params = message.get('params') or {}
+        uri = params.get('textDocument', {}).get('uri')
+        position = params.get('position') or {}
+        text = self.texts.get(uri)
+        if text is None or 'line' not in position:
+            return False
+        starts = line_starts(text)
+        if position['line'] >= len(starts):
+            return False
+        cursor = position_offset(text, starts, position)
+        prefix = WORD_RE.search(text, starts[position['line']], cursor).group()
+        key = (uri, position['line'], position['character'] - utf16_length(prefix))
+        session = self.completions.get(uri)
+        if session is None or not session.covers(key, prefix):
+            self.completing[message.get('id')] = (key, prefix, position['character'], self.versions.get(uri))
+            return False
+        self.completed_here += 1
+        self.send_editor({'jsonrpc': "2.0", 'id': message.get('id'), 'result': {
+            'isIncomplete': False,
+            'items': session.filter(prefix, position['character']),
+        }})
+        return True
+
+    def completed(self, completing, message):
+        key, prefix, character, version = completing
+        self.completed_by_server += 1
+        result = message.get('result')
+        if isinstance(result, dict) and not result.get('isIncomplete'):
+            result = result.get('items')
+        if isinstance(result, list) and self.versions.get(key[0]) == version:
+            self.completions[key[0]] = CompletionSession(key, prefix, character, result)
+        else:
+            self.completions.pop(key[0], None)
+
+    def document_changed(self, method, params):
+        if method == "workspace/didChangeWatchedFiles":
+            if self.cache is not None:
+                for change in params.get('changes', ()):
+                    self.cache.invalidate(change.get('uri'), saved=True)
+            return
+        document = params.get('textDocument', {})
+        uri = document.get('uri')
+        if method == "textDocument/didOpen":
+            self.versions[uri] = document.get('version')
+            self.texts[uri] = document.get('text', "")
+        elif method == "textDocument/didChange":
+            self.versions[uri] = document.get('version')
+            session = self.completions.get(uri)
+            if session is not None and not all(session.in_word(c) for c in params.get('contentChanges', ())):
+                # What's before the word changed, its completions may have too.
+                del self.completions[uri]
+            if uri in self.texts:
+                for change in params.get('contentChanges', ()):
+                    self.texts[uri] = apply_change(self.texts[uri], change)
+        elif method == "textDocument/didClose":
+            self.versions.pop(uri, None)
+            self.texts.pop(uri, None)
+            self.completions.pop(uri, None)
+            self.diagnostics.pop(uri, None)
+        elif method != "textDocument/didSave":
+            return
+        if self.cache is not None:
+            self.cache.invalidate(uri, saved=method != "textDocument/didChange")
+
+    def forget(self, request_id):
+        self.lookups.pop(request_id, None)
+        self.completing.pop(request_id, None)
+        method, uri, sent = self.pending.pop(request_id)
+        if method in INTERACTIVE:
+            self.interactive -= 1
+        elif method in BACKGROUND:
+            self.background -= 1
+        return method, uri, sent
+
+    def cancel(self, request_id):
+        """Cancels a request at the server, answering the editor right away."""
+        self.forget(request_id)
+        now = time.time()
+        while self.cancelled and (
+                len(self.cancelled) >= MAX_CANCELLED or now - next(iter(self.cancelled.values())) > CANCELLED_TIMEOUT):
+            self.cancelled.popitem(last=False)
+        self.cancelled[request_id] = now
+        self.send_server({'jsonrpc': "2.0", 'method': "$/cancelRequest", 'params': {'id': request_id}})
+        self.answer_cancelled(request_id)
+
+    def answer_cancelled(self, request_id):
+        self.send_editor({'jsonrpc': "2.0", 'id': request_id, 'error': {'code': REQUEST_CANCELLED, 'message': "Superseded"}})
+
+    def dispatch(self):
+        now = time.time()
+        while self.held and self.background < MAX_BACKGROUND:
+            if self.interactive:
+                oldest = min(sent for method, _, sent in self.pending.values() if method in INTERACTIVE)
+                if now - oldest < MAX_HOLD:
+                    self.wait(MAX_HOLD - (now - oldest))
+                    return
+            self.send(self.held.popleft())
+
+    def wait(self, delay):
+        if self.timer is not None:
+            self.timer.cancel()
+
+        def _dispatch():
+            with self.lock:
+                self.timer = None
+                self.dispatch()
+
+        self.timer = threading.Timer(delay, _dispatch)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def report(self):
+        for method, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            log("{}: {} requests, p50 {:.0f} ms, p99 {:.0f} ms".format(
+                method, len(latencies),
+                1000 * latencies[len(latencies) // 2],
+                1000 * latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]))
+        if self.cache is not None:
+            log(self.cache.describe())
+        log("Completions: {} filtered here, {} from the server".format(self.completed_here, self.completed_by_server))
+        log("Diagnostics: {} repeats dropped, {} sent".format(self.diagnostics_hits, self.diagnostics_misses))
+
+
+def recorder(name, side):
+    """Returns a function recording the frames from side ("editor" or "server"), if recording."""
+    if not RECORD_DIR:
+        return lambda message: None
+    try:
+        os.makedirs(RECORD_DIR)
+    except OSError:
+        pass
+    record = open(os.path.join(RECORD_DIR, "{}-{}.{}".format(name, os.getpid(), side)), 'wb')
+    return stream_writer(record)
+
+
+def run(editor_rfile, server_rfile, write_server, write_editor, close_server, name="server", cache_size=CACHE_SIZE):
+    """
+    Proxies between the editor and the server until the server's output ends,
+    write_server and write_editor get lists of buffers to write.
+    """
+    server = QueuedWriter(write_server)
+    editor = QueuedWriter(write_editor)
+    proxy = Proxy(server.send, editor.send, cache_size)
+    record_editor = recorder(name, "editor")
+    record_server = recorder(name, "server")
+
+    def pump():
+        reader = FrameReader(editor_rfile)
+        while True:
+            try:
+                message = reader.read()
+            except ValueError as e:
+                log("Invalid message from editor:", e)
+                continue
+            if message is None:
+                break
+            record_editor(message.buffers())
+            proxy.from_editor(message)
+        server.close()
+        server.join()
+        close_server()
+
+    thread = threading.Thread(target=pump)
+    thread.daemon = True
+    thread.start()
+    reader = FrameReader(server_rfile)
+    while True:
+        try:
+            message = reader.read()
+        except ValueError as e:
+            log("Invalid message from server:", e)
+            continue
+        if message is None:
+            break
+        record_server(message.buffers())
+        proxy.from_server(message)
+    editor.close()
+    editor.join()
+    proxy.report()
+
+
+def stdio():
+    """The editor's (input, write function) of this process."""
+    stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+    stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+    return stdin, stream_writer(stdout)
+
+
+def main():
+    argv = sys.argv[1:]
+    if "--" not in argv:
+        sys.stderr.write("usage: lsproxy.py [--cache-size MB] -- command...\n")
+        return 2
+    split = argv.index("--")
+    parser = argparse.ArgumentParser(prog="lsproxy.py")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="megabytes of responses cached, 0 for none")
+    args = parser.parse_args(argv[:split])
+    command = argv[split + 1:]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    stdin, write_editor = stdio()
+    name = os.path.splitext(os.path.basename(command[1] if len(command) > 1 else command[0]))[0]
+    run(stdin, process.stdout, stream_writer(process.stdin), write_editor, process.stdin.close, name, args.cache_size)
+    return process.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
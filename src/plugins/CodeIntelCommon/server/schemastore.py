@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Offline store for JSON schemas: every schema in a catalog (including the
+`versions` variants), and every schema they reference with a $ref (followed
+recursively), is downloaded into STORE_DIR/store/ and STORE_DIR/manifest.json
+maps each URL to its file, so the plugins can hand the servers file:// URLs
+instead. The $refs of the stored schemas to other stored ones are rewritten
+to the files' names, relative to the store, so the servers never go online
+for them whichever directory the store ends up in ($id changing the base URL
+of a nested schema isn't taken into account).
+
+Usage: schemastore.py fetch STORE_DIR CATALOG
+       schemastore.py verify STORE_DIR
+
+CATALOG is a schemastore catalog.json (or a plugin.py with one as a literal).
+Schemas which can't be downloaded keep their previous copy, if any. verify
+checks every stored file against the manifest's hashes, and that the $refs
+rewritten to files point to stored ones.
+"""
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import argparse
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_VERSION = 2
+FETCH_TIMEOUT = 30
+FETCH_WORKERS = 8
+# Schemas stored at most, referenced ones included.
+MAX_SCHEMAS = 5000
+
+
+def load_catalog(path):
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    if not path.endswith('.py'):
+        return json.loads(source)['schemas']
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Dict):
+            keys = [getattr(k, 'value', getattr(k, 's', None)) for k in node.keys if k is not None]
+            if 'schemas' in keys:
+                return ast.literal_eval(node)['schemas']
+    raise ValueError("no schemas catalog in {}".format(path))
+
+
+def catalog_urls(schemas):
+    urls = []
+    for schema in schemas:
+        for url in [schema.get('url')] + list(schema.get('versions', {}).values()):
+            if url and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def read_manifest(store_dir):
+    try:
+        with open(os.path.join(store_dir, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {'version': MANIFEST_VERSION, 'schemas': {}}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {'version': MANIFEST_VERSION, 'schemas': {}}
+    return manifest
+
+
+def write_manifest(store_dir, manifest):
+    path = os.path.join(store_dir, 'manifest.json')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def download(url):
+    """Returns the schema at url, raising ValueError if it isn't JSON (but some error page)."""
+    request = urllib.request.Request(url, headers={'User-Agent': 'SublimeCodeIntel'})
+    with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+        data = response.read()
+    return json.loads(data.decode('utf-8-sig'))
+
+
+def store_file(url):
+    """The name in the store of the schema at url."""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json'
+
+
+def refs(node):
+    """Yields the $ref values in a schema."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == '$ref' and isinstance(value, str):
+                yield value
+            else:
+                for ref in refs(value):
+                    yield ref
+    elif isinstance(node, list):
+        for value in node:
+            for ref in refs(value):
+                yield ref
+
+
+def ref_url(base, ref):
+    """The URL (without fragment) of the schema a $ref in the schema at base points to, if it's online."""
+    url = urllib.parse.urldefrag(urllib.parse.urljoin(base, ref))[0]
+    if url != base and url.startswith(('http://', 'https://')):
+        return url
+
+
+def rewrite_refs(node, base, stored):
+    """
+    Returns the schema with its $refs to stored URLs changed to their files,
+    and the other ones made absolute (they can't be relative to the store).
+    """
+    if isinstance(node, dict):
+        result = {}
+        for key, value in node.items():
+            if key == '$ref' and isinstance(value, str):
+                url, fragment = urllib.parse.urldefrag(urllib.parse.urljoin(base, value))
+                suffix = '#' + fragment if fragment else ''
+                if url == base:
+                    value = suffix or '#'
+                elif url in stored:
+                    value = store_file(url) + suffix
+                elif url.startswith(('http://', 'https://')):
+                    value = url + suffix
+            else:
+                value = rewrite_refs(value, base, stored)
+            result[key] = value
+        return result
+    if isinstance(node, list):
+        return [rewrite_refs(value, base, stored) for value in node]
+    return node
+
+
+def store(store_dir, url, data):
+    path = os.path.join(store_dir, 'store', store_file(url))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return hashlib.sha256(data).hexdigest()
+
+
+def fetch(store_dir, schemas):
+    os.makedirs(os.path.join(store_dir, 'store'), exist_ok=True)
+    manifest = read_manifest(store_dir)
+
+    def _fetch(url):
+        try:
+            return url, download(url), None
+        except Exception as err:
+            return url, None, err
+
+    # Download the catalog's schemas, then the ones they reference, and so on.
+    downloaded = {}
+    failed = []
+    seen = set()
+    urls = catalog_urls(schemas)
+    with ThreadPoolExecutor(FETCH_WORKERS) as executor:
+        while urls:
+            seen.update(urls)
+            found = []
+            for url, schema, err in executor.map(_fetch, urls):
+                if schema is None:
+                    failed.append(url)
+                    print("[{}] {}: {}".format(len(seen), url, err))
+                    continue
+                downloaded[url] = schema
+                print("[{}] {}".format(len(seen), url))
+                for ref in refs(schema):
+                    ref = ref_url(url, ref)
+                    if ref and ref not in seen and ref not in found:
+                        found.append(ref)
+            urls = found[:max(0, MAX_SCHEMAS - len(seen))]
+
+    entries = {}
+    for url in failed:
+        if url in manifest['schemas']:
+            entries[url] = manifest['schemas'][url]
+    stored = set(downloaded) | set(entries)
+    for url, schema in downloaded.items():
+        data = json.dumps(rewrite_refs(schema, url, stored), ensure_ascii=False, indent=1).encode('utf-8')
+        entries[url] = {
+            'file': store_file(url),
+            'sha256': store(store_dir, url, data),
+            'size': len(data),
+            'fetched': int(time.time()),
+        }
+    manifest['schemas'] = entries
+    write_manifest(store_dir, manifest)
+
+    # Forget files no URL points to anymore.
+    used = set(entry['file'] for entry in entries.values())
+    for filename in os.listdir(os.path.join(store_dir, 'store')):
+        if filename not in used:
+            os.remove(os.path.join(store_dir, 'store', filename))
+    print("{} schemas stored, {} failed".format(len(entries), len(failed)))
+    return len(failed)
+
+
+def verify(store_dir):
+    bad = 0
+    manifest = read_manifest(store_dir)
+    files = set(entry['file'] for entry in manifest['schemas'].values())
+    for url, entry in sorted(manifest['schemas'].items()):
+        path = os.path.join(store_dir, 'store', entry['file'])
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            ok = hashlib.sha256(data).hexdigest() == entry['sha256']
+        except (IOError, OSError):
+            ok = False
+        if not ok:
+            bad += 1
+            print("{}: {} is missing or corrupt".format(url, path))
+            continue
+        for ref in refs(json.loads(data.decode('utf-8'))):
+            target = urllib.parse.urldefrag(ref)[0]
+            if target.endswith('.json') and '/' not in target and ':' not in target and target not in files:
+                bad += 1
+                print("{}: $ref {} is not in the store".format(url, ref))
+    print("{} schemas checked, {} bad".format(len(manifest['schemas']), bad))
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command')
+    fetch_parser = subparsers.add_parser('fetch')
+    fetch_parser.add_argument('store_dir')
+    fetch_parser.add_argument('catalog')
+    verify_parser = subparsers.add_parser('verify')
+    verify_parser.add_argument('store_dir')
+    args = parser.parse_args()
+    if args.command == 'fetch':
+        fetch(args.store_dir, load_catalog(args.catalog))
+        return 0
+    if args.command == 'verify':
+        return 1 if verify(args.store_dir) else 0
+    parser.print_usage()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
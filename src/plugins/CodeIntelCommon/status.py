@@ -0,0 +1,113 @@
+"""
+Coalesces the spinner updates plugins make for server notifications.
+
+Servers busy indexing (cquery, RLS) send thousands of publishDiagnostics and
+progress notifications, and updating the spinner for every one of them keeps
+the UI thread busy for nothing. `start` takes the same arguments as
+`spinner.start` but updates the spinner at most UPDATES_PER_SECOND times per
+key: calls in between replace the pending update, which is shown when the
+interval is over.
+
+Every key counts the notifications it got, how many are waiting to be shown
+and the rate they're coming at; "CodeIntel: Toggle Notification Rates" shows
+them in the status bar along with the spinner.
+"""
+import sublime
+
+import time
+import threading
+from collections import deque
+
+from SublimeCodeIntel.plugin.core.spinner import spinner
+
+UPDATES_PER_SECOND = 4
+# Seconds the rate of notifications is averaged over.
+RATE_WINDOW = 5
+
+show_rates = False
+
+
+class Status(object):
+    def __init__(self, key, updates_per_second=UPDATES_PER_SECOND):
+        self.key = key
+        self.interval = 1.0 / updates_per_second
+        self.lock = threading.Lock()
+        self.pending = None  # (message, kwargs) of the last call not shown yet
+        self.pending_count = 0
+        self.received = 0
+        self.updates = 0
+        self.last_update = 0
+        self.counts = deque()  # [second, notifications in it], for the last RATE_WINDOW seconds
+
+    def start(self, message=None, **kwargs):
+        now = time.time()
+        with self.lock:
+            self.received += 1
+            self.pending_count += 1
+            self.count(now)
+            scheduled = self.pending is not None
+            self.pending = (message, kwargs)
+            if scheduled:
+                return
+            delay = self.last_update + self.interval - now
+        sublime.set_timeout(self.update, max(0, int(delay * 1000)))
+
+    def count(self, now):
+        second = int(now)
+        if self.counts and self.counts[-1][0] == second:
+            self.counts[-1][1] += 1
+        else:
+            self.counts.append([second, 1])
+        while self.counts[0][0] <= second - RATE_WINDOW:
+            self.counts.popleft()
+
+    def rate(self):
+        """Notifications per second, over the last RATE_WINDOW seconds."""
+        now = time.time()
+        with self.lock:
+            counts = [(second, n) for second, n in self.counts if second > int(now) - RATE_WINDOW]
+        if not counts:
+            return 0.0
+        return sum(n for second, n in counts) / min(float(RATE_WINDOW), max(1.0, now - counts[0][0]))
+
+    def update(self):
+        with self.lock:
+            if self.pending is None:
+                return
+            message, kwargs = self.pending
+            self.pending = None
+            self.pending_count = 0
+            self.last_update = time.time()
+            self.updates += 1
+        if show_rates:
+            message = "{} {}".format(message, self.describe()) if message else self.describe()
+        spinner.start(self.key, message, **kwargs)
+
+    def describe(self):
+        with self.lock:
+            pending = self.pending_count
+            received = self.received
+            updates = self.updates
+        return "{:.0f} msg/s, {} pending ({} received, {} shown)".format(self.rate(), pending, received, updates)
+
+
+_statuses = {}
+_lock = threading.Lock()
+
+
+def get(key):
+    with _lock:
+        status = _statuses.get(key)
+        if status is None:
+            status = _statuses[key] = Status(key)
+        return status
+
+
+def start(key, message=None, **kwargs):
+    """Like spinner.start(key, message, **kwargs), coalesced."""
+    get(key).start(message, **kwargs)
+
+
+def statuses():
+    with _lock:
+        return sorted(_statuses.values(), key=lambda status: status.key)
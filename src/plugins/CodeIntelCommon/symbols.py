@@ -0,0 +1,196 @@
+"""
+Searches the symbols of every server running in a window at once ("CodeIntel:
+Search Symbols Everywhere"), for projects mixing languages.
+
+workspace/symbol is sent to all the window's servers which support it at the
+same time, and their results are merged as they come in: every symbol gets
+the same `score` whatever its server, each server's results are cut to its
+config's workspace_symbol_limit (if any), and the best TOP_K of them all are
+kept in a heap. Servers which haven't answered after DEADLINE seconds are
+left out: their requests are cancelled ($/cancelRequest), so they stop
+working on them, and their results dropped if they come anyway.
+"""
+import sublime
+
+import heapq
+import threading
+from urllib.parse import urlparse, unquote
+
+from SublimeCodeIntel.plugin.core.protocol import Notification, Request
+
+from CodeIntelCommon import clients
+
+TOP_K = 200
+# Seconds the search waits for the servers.
+DEADLINE = 3.0
+# Seconds between updates of the results while they come in.
+UPDATE_INTERVAL = 0.25
+
+SYMBOL_KINDS = [
+    "file", "module", "namespace", "package", "class", "method", "property",
+    "field", "constructor", "enum", "interface", "function", "variable",
+    "constant", "string", "number", "boolean", "array", "object", "key",
+    "null", "enum member", "struct", "event", "operator", "type parameter",
+]
+
+
+def uri_path(uri):
+    return unquote(urlparse(uri).path)
+
+
+def score(query, symbol, folders=()):
+    """
+    Returns how well a symbol matches query, the higher the better, or None
+    if it doesn't: exact names first, then prefixes, substrings and
+    subsequences, shorter names and symbols in the window's folders first.
+    """
+    name = symbol.get('name', "")
+    lower = name.lower()
+    lower_query = query.lower()
+    if name == query:
+        value = 4000
+    elif lower == lower_query:
+        value = 3000
+    elif lower.startswith(lower_query):
+        value = 2000
+    elif lower_query in lower:
+        value = 1000
+    else:
+        index = 0
+        for char in lower_query:
+            index = lower.find(char, index) + 1
+            if not index:
+                return None
+        value = 0
+    path = uri_path(symbol.get('location', {}).get('uri', ""))
+    if any(path.startswith(folder) for folder in folders):
+        value += 500
+    return value - min(len(name), 100)
+
+
+class Search(object):
+    """
+    A search of the window's servers' symbols; on_update gets (results,
+    answered, total, timed_out) on the UI thread while they come in and once
+    more when the search is done, results being (server name, symbol) pairs,
+    best first, and timed_out the servers left out (None until done).
+    """
+    def __init__(self, window, query, on_update):
+        self.window = window
+        self.query = query
+        self.on_update = on_update
+        self.folders = window.folders()
+        self.lock = threading.Lock()
+        self.heap = []  # (score, -sequence, server name, symbol) of the best TOP_K
+        self.sequence = 0
+        self.pending = set()  # names of the servers not answered yet
+        self.requests = {}  # server name: (client, id of its workspace/symbol request)
+        self.total = 0
+        self.timed_out = []
+        self.done = False
+        self.update_scheduled = False
+
+    def start(self):
+        entries = [
+            entry for entry in clients.window_clients(self.window)
+            if entry.client.has_capability('workspaceSymbolProvider')]
+        self.total = len(entries)
+        self.pending = set(entry.config.name for entry in entries)
+        for entry in entries:
+            name = entry.config.name
+            limit = getattr(entry.config, 'workspace_symbol_limit', None) or TOP_K
+            try:
+                entry.client.send_request(
+                    Request("workspace/symbol", {'query': self.query}),
+                    lambda result, name=name, limit=limit: self.add(name, limit, result),
+                    lambda error, name=name: self.add(name, 0, None))
+                # send_request doesn't return the id, the client's last one is it.
+                self.requests[name] = (entry.client, getattr(entry.client, 'request_id', None))
+            except Exception:
+                clients.forget(entry)  # the client is gone
+                self.add(name, 0, None)
+        if self.pending:
+            sublime.set_timeout(self.expire, int(DEADLINE * 1000))
+        else:
+            self.add(None, 0, None)
+
+    def add(self, name, limit, symbols):
+        with self.lock:
+            if self.done or (name is not None and name not in self.pending):
+                return
+            self.pending.discard(name)
+            scored = []
+            for symbol in symbols or ():
+                value = score(self.query, symbol, self.folders)
+                if value is not None:
+                    scored.append((value, symbol))
+            for value, symbol in heapq.nlargest(limit, scored, key=lambda entry: entry[0]):
+                self.sequence += 1
+                item = (value, -self.sequence, name, symbol)
+                if len(self.heap) < TOP_K:
+                    heapq.heappush(self.heap, item)
+                else:
+                    heapq.heappushpop(self.heap, item)
+            self.done = not self.pending
+        self.schedule_update()
+
+    def expire(self):
+        with self.lock:
+            if self.done:
+                return
+            self.timed_out = sorted(self.pending)
+            self.done = True
+        for name in self.timed_out:
+            client, request_id = self.requests.get(name, (None, None))
+            if request_id is None:
+                continue
+            try:
+                client.send_notification(Notification("$/cancelRequest", {'id': request_id}))
+            except Exception:
+                pass  # the client is gone
+        self.schedule_update()
+
+    def schedule_update(self):
+        with self.lock:
+            if self.done:
+                delay = 0
+            elif self.update_scheduled:
+                return
+            else:
+                delay = int(UPDATE_INTERVAL * 1000)
+            self.update_scheduled = True
+        sublime.set_timeout(self.update, delay)
+
+    def update(self):
+        with self.lock:
+            if not self.update_scheduled:
+                return
+            self.update_scheduled = False
+            results = [(name, symbol) for _, _, name, symbol in sorted(self.heap, reverse=True)]
+            answered = self.total - len(self.pending)
+            timed_out = self.timed_out if self.done else None
+        self.on_update(results, answered, self.total, timed_out)
+
+    def describe(self, name, symbol):
+        """The second line of a symbol's entry in the results."""
+        location = symbol.get('location', {})
+        path = uri_path(location.get('uri', ""))
+        for folder in self.folders:
+            if path.startswith(folder):
+                path = path[len(folder):].lstrip("/")
+                break
+        kind = symbol.get('kind', 0)
+        return "{}{}  {}:{}  ({})".format(
+            SYMBOL_KINDS[kind - 1] if 0 < kind <= len(SYMBOL_KINDS) else "symbol",
+            " in " + symbol['containerName'] if symbol.get('containerName') else "",
+            path,
+            location.get('range', {}).get('start', {}).get('line', 0) + 1,
+            name)
+
+
+def open_symbol(window, symbol):
+    location = symbol.get('location', {})
+    start = location.get('range', {}).get('start', {})
+    window.open_file(
+        "{}:{}:{}".format(uri_path(location.get('uri', "")), start.get('line', 0) + 1, start.get('character', 0) + 1),
+        sublime.ENCODED_POSITION)
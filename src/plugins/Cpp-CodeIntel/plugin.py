@@ -5,11 +5,19 @@ import shutil
 
 from SublimeCodeIntel.plugin.core.settings import ClientConfig
 from SublimeCodeIntel.plugin.core.handlers import LanguageHandler
-from SublimeCodeIntel.plugin.core.spinner import spinner
+
+from CodeIntelCommon import pool
+from CodeIntelCommon import clients
+from CodeIntelCommon import markers
+from CodeIntelCommon import status
 
 package_path = os.path.dirname(__file__)
 server_path = os.path.join(package_path, 'server')
 
+# The core's command restarting the view's servers, cquery only reads
+# compilationDatabaseDirectory when initialized.
+RESTART_COMMAND = "lsp_restart_client"
+
 
 def cquery_command():
     # brew install --HEAD cquery
@@ -271,12 +279,18 @@ class CodeIntelCppClientConfig(ClientConfig):
         }
         self.settings = {}
         self.env = {}
+        # The pool restarts the server when it uses more memory (MB).
+        self.max_memory = 4096
+        # cquery answers workspace/symbol with at most workspaceSymbol.maxNum symbols.
+        self.workspace_symbol_limit = self.init_options["workspaceSymbol"].get("maxNum", 1000)
 
 
 class CodeIntelCppPlugin(LanguageHandler):
     def __init__(self):
         self._server_name = "C/C++/Objective-C Language Server"
         self._config = CodeIntelCppClientConfig()
+        self._database_directory = None
+        self._watching = set()  # ids of the windows whose scan is watched
 
     @property
     def name(self) -> str:
@@ -291,20 +305,68 @@ class CodeIntelCppPlugin(LanguageHandler):
             window.status_message(
                 "{} must be installed to run {}".format(cquery_command()), self._server_name)
             return False
+        init_options = self._config.init_options
+        if init_options.get("compilationDatabaseDirectory") == self._database_directory:
+            # Not set by the user, so point cquery to the build directory
+            # with the database when there's none at the root (once the
+            # workspace was scanned for it, see plugin_loaded; cquery is
+            # restarted when a scan finds another one).
+            self._database_directory = self.find_database_directory(window)
+            if self._database_directory:
+                init_options["compilationDatabaseDirectory"] = self._database_directory
+            else:
+                init_options.pop("compilationDatabaseDirectory", None)
+        self._config.binary_args = pool.binary_args(self._config, window)
+        clients.starting(window, self._config)
         return True
 
+    def find_database_directory(self, window):
+        root = pool.workspace_root(window)
+        if not root or markers.index.contains(root, "compile_commands.json"):
+            return None
+        on_change = None
+        if window.id() not in self._watching:
+            self._watching.add(window.id())
+            on_change = lambda found: sublime.set_timeout(lambda: self.databases_changed(window, found), 0)
+        found = markers.index.find_all(root, "compile_commands.json", on_change)
+        if found:
+            return found[0]
+
+    def databases_changed(self, window, found):
+        self._watching.discard(window.id())
+        if window.id() not in [w.id() for w in sublime.windows()]:
+            return
+        if self._config.init_options.get("compilationDatabaseDirectory") != self._database_directory:
+            return  # set by the user
+        if markers.index.contains(pool.workspace_root(window), "compile_commands.json"):
+            return  # cquery finds it on its own
+        directory = found[0] if found else None
+        if directory == self._database_directory:
+            return
+        window.status_message("{}, restarting cquery".format(
+            "compile_commands.json found in " + directory if directory else "compile_commands.json gone"))
+        view = window.active_view()
+        if view:
+            view.run_command(RESTART_COMMAND)
+
     def on_initialized(self, client) -> None:
+        clients.initialized(self._config, client)
         client.on_notification("textDocument/publishDiagnostics", self.on_diagnostics)
         client.on_notification("$cquery/progress", self.on_progress)
 
     def on_diagnostics(self, params):
-        spinner.start("Cpp-CodeIntel", spinner='monkey')
+        status.start("Cpp-CodeIntel", spinner='monkey')
 
     def on_progress(self, params):
-        spinner.start("Cpp-CodeIntel", spinner='fire')
+        status.start("Cpp-CodeIntel", spinner='fire')
 
 
 def plugin_loaded():
     if not cquery_is_installed():
         sublime.message_dialog(
             "Please install cquery")
+    # Have the windows' workspaces scanned before their servers start.
+    for window in sublime.windows():
+        root = pool.workspace_root(window)
+        if root:
+            markers.index.find_all(root, "compile_commands.json")
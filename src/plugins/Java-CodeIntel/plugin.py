@@ -1,14 +1,39 @@
 import sublime
 
 import os
+import shlex
 import shutil
 
 from SublimeCodeIntel.plugin.core.settings import ClientConfig
 from SublimeCodeIntel.plugin.core.handlers import LanguageHandler
-from SublimeCodeIntel.plugin.core.spinner import spinner
+
+from CodeIntelCommon import cds
+from CodeIntelCommon import pool
+from CodeIntelCommon import clients
+from CodeIntelCommon import datadirs
+from CodeIntelCommon import status
 
 package_path = os.path.dirname(__file__)
 server_path = os.path.join(package_path, 'server')
+launcher_path = os.path.join(server_path, "plugins", "org.eclipse.equinox.launcher.jar")
+classlist_path = os.path.join(server_path, "jdtls.classlist")
+
+# Workspace data (-data) for every project, the least recently used ones are
+# removed once they all take more than DATA_MAX_SIZE.
+data_path = os.path.expanduser("~/.codeintel/jdtls")
+DATA_MAX_SIZE = 4 * 1024 ** 3
+
+# JVM options tuned for starting up: an initial heap big enough for importing
+# a project without resizing, and the throughput collector. Tiered compilation
+# stays on since the server runs for hours. CODEINTEL_JAVA_OPTS replaces them.
+JVM_ARGS = [
+    "-Xms256m",
+    "-Xmx2G",
+    "-XX:+UseParallelGC",
+    "-XX:GCTimeRatio=4",
+    "-XX:AdaptiveSizePolicyWeight=90",
+    "-XX:+TieredCompilation",
+]
 
 
 def java_command():
@@ -19,16 +44,34 @@ def java_is_installed():
     return shutil.which(java_command()) is not None
 
 
+def jvm_args():
+    options = os.environ.get("CODEINTEL_JAVA_OPTS")
+    if options is not None:
+        return shlex.split(options)
+    return list(JVM_ARGS)
+
+
+def server_args(jvm_args):
+    """
+    The server's command line, started with its AppCDS archive once there's
+    one (which only covers the JDK's and the launcher's classes, see cds.py).
+    """
+    return [
+        java_command(),
+    ] + jvm_args + cds.archive_args(java_command(), jvm_args, [launcher_path], classlist_path) + [
+        "-jar",
+        launcher_path,
+        "-configuration",
+        os.path.join(server_path, "config_%s" % sublime.platform()),
+    ]
+
+
 class CodeIntelJavaClientConfig(ClientConfig):
     def __init__(self):
         self.name = "java"
-        self.binary_args = [
-            java_command(),
-            "-jar",
-            os.path.join(server_path, "plugins", "org.eclipse.equinox.launcher.jar"),
-            "-configuration",
-            os.path.join(server_path, "config_%s" % sublime.platform()),
-        ]
+        self.jvm_args = jvm_args()
+        # Set in on_start, with the archive dumped since the last start.
+        self.binary_args = []
         self.tcp_port = None
         self.languages = {
             "java": {
@@ -40,6 +83,12 @@ class CodeIntelJavaClientConfig(ClientConfig):
         self.init_options = {}
         self.settings = {}
         self.env = {}
+        # The pool restarts the server when it uses more memory (MB)
+        # or more CPU (percent of a core, averaged over ten minutes).
+        # Importing and building a workspace keeps several cores busy for
+        # minutes, so only a server spinning on all of them is restarted.
+        self.max_memory = 4096
+        self.max_cpu = 400
 
 
 class CodeIntelJavaPlugin(LanguageHandler):
@@ -60,13 +109,19 @@ class CodeIntelJavaPlugin(LanguageHandler):
             window.status_message(
                 "{} must be installed to run {}".format(java_command()), self._server_name)
             return False
+        data = datadirs.data_dir(data_path, window.folders())
+        datadirs.evict_in_background(data_path, DATA_MAX_SIZE, keep=[data], lock_file=os.path.join(".metadata", ".lock"))
+        self._config.binary_args = server_args(self._config.jvm_args)
+        self._config.binary_args = pool.binary_args(self._config, window, ["-data", data])
+        clients.starting(window, self._config)
         return True
 
     def on_initialized(self, client) -> None:
+        clients.initialized(self._config, client)
         client.on_notification("textDocument/publishDiagnostics", self.on_diagnostics)
 
     def on_diagnostics(self, params):
-        spinner.start("Java-CodeIntel", spinner='monkey')
+        status.start("Java-CodeIntel", spinner='monkey')
 
 
 def plugin_loaded():
@@ -5,7 +5,11 @@ import shutil
 
 from SublimeCodeIntel.plugin.core.settings import ClientConfig
 from SublimeCodeIntel.plugin.core.handlers import LanguageHandler
-from SublimeCodeIntel.plugin.core.spinner import spinner
+
+from CodeIntelCommon import pool
+from CodeIntelCommon import clients
+from CodeIntelCommon import nodehost
+from CodeIntelCommon import status
 
 package_path = os.path.dirname(__file__)
 server_path = os.path.join(package_path, 'server')
@@ -22,14 +26,14 @@ def node_is_installed():
 class CodeIntelTypeScriptClientConfig(ClientConfig):
     def __init__(self):
         self.name = "typescript"
-        self.binary_args = [
+        self.binary_args = nodehost.cached_binary_args([
             node_command(),
             os.path.join(server_path, "lsp-tsserver", "dist", "server.js"),
             "--globalPlugins", "tslint-language-service,eslint-language-service,",
             "--logfile", "~/.codeintel/typescript.log",
             "--logVerbosity", "terse",
             "--traceToConsole", "true",
-        ]
+        ])
         self.tcp_port = None
         self.languages = {
             "typescript": {
@@ -45,6 +49,8 @@ class CodeIntelTypeScriptClientConfig(ClientConfig):
         self.init_options = {}
         self.settings = {}
         self.env = {}
+        # The pool restarts the server when it uses more memory (MB).
+        self.max_memory = 3072
 
 
 class CodeIntelTypeScriptPlugin(LanguageHandler):
@@ -65,13 +71,16 @@ class CodeIntelTypeScriptPlugin(LanguageHandler):
             window.status_message(
                 "{} must be installed to run {}".format(node_command()), self._server_name)
             return False
+        self._config.binary_args = pool.binary_args(self._config, window)
+        clients.starting(window, self._config)
         return True
 
     def on_initialized(self, client) -> None:
+        clients.initialized(self._config, client)
         client.on_notification("textDocument/publishDiagnostics", self.on_diagnostics)
 
     def on_diagnostics(self, params):
-        spinner.start("JavaScript-CodeIntel", spinner='monkey')
+        status.start("JavaScript-CodeIntel", spinner='monkey')
 
 
 def plugin_loaded():
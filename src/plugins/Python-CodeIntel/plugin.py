@@ -2,10 +2,14 @@ import sublime
 
 import os
 import shutil
+import socket
 
 from SublimeCodeIntel.plugin.core.settings import ClientConfig
 from SublimeCodeIntel.plugin.core.handlers import LanguageHandler
-from SublimeCodeIntel.plugin.core.spinner import spinner
+
+from CodeIntelCommon import pool
+from CodeIntelCommon import clients
+from CodeIntelCommon import status
 
 package_path = os.path.dirname(__file__)
 server_path = os.path.join(package_path, 'server')
@@ -19,6 +23,10 @@ def python_is_installed():
     return shutil.which(python_command()) is not None
 
 
+def zygote_is_supported():
+    return hasattr(os, 'fork') and hasattr(socket, 'AF_UNIX')
+
+
 class CodeIntelPythonClientConfig(ClientConfig):
     def __init__(self):
         self.name = "python"
@@ -30,6 +38,12 @@ class CodeIntelPythonClientConfig(ClientConfig):
             "~/.codeintel/pyls.log",
         ]
         self.tcp_port = None
+        # Set to have a single preloaded pyls per user fork the servers (see
+        # pyls.py --zygote). They're still run through the pool, but its
+        # max_memory and max_cpu don't cover them, as they're the zygote's.
+        self.zygote = False
+        if self.zygote and zygote_is_supported():
+            self.binary_args += ["--zygote"]
         self.languages = {
             "python": {
                 "scopes": ["source.python"],
@@ -44,6 +58,13 @@ class CodeIntelPythonClientConfig(ClientConfig):
                     "flake8"
                 ],
                 "extraSysPath": [],
+                "plugins": {
+                    "pyls_mypy": {
+                        # Check through a long-lived mypy daemon per project
+                        # (checks files when saved, live_mode is turned off)
+                        "daemon": False,
+                    },
+                },
             },
         }
         self.env = {}
@@ -81,13 +102,16 @@ class CodeIntelPythonPlugin(LanguageHandler):
             window.status_message(
                 "{} must be installed to run {}".format(python_command()), self._server_name)
             return False
+        self._config.binary_args = pool.binary_args(self._config, window)
+        clients.starting(window, self._config)
         return True
 
     def on_initialized(self, client) -> None:
+        clients.initialized(self._config, client)
         client.on_notification("textDocument/publishDiagnostics", self.on_diagnostics)
 
     def on_diagnostics(self, params):
-        spinner.start("Python-CodeIntel", spinner='monkey')
+        status.start("Python-CodeIntel", spinner='monkey')
 
 
 def plugin_loaded():
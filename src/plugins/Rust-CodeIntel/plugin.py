@@ -2,23 +2,27 @@ import sublime
 
 import os
 import re
+import json
+import time
 import shutil
 import threading
-import subprocess
 
 from SublimeCodeIntel.plugin.core.settings import ClientConfig
 from SublimeCodeIntel.plugin.core.handlers import LanguageHandler
 from SublimeCodeIntel.plugin.core.spinner import spinner
 
+from CodeIntelCommon import jobs
+from CodeIntelCommon import pool
+from CodeIntelCommon import clients
+from CodeIntelCommon import markers
+from CodeIntelCommon import status
+
 package_path = os.path.dirname(__file__)
 server_path = os.path.join(package_path, 'server')
+probes_path = os.path.expanduser("~/.codeintel/rustup.json")
 
-STATUS_INIT = 0
-STATUS_UPDATE = 1
-STATUS_TOOLCHAIN = 2
-STATUS_ENV = 3
-STATUS_RLS = 4
-STATUS_DONE = 5
+# Seconds rustup gets to answer a query about the toolchain.
+PROBE_TIMEOUT = 60
 
 
 def rustup_command():
@@ -29,41 +33,91 @@ def rustup_is_installed():
     return shutil.which(rustup_command()) is not None
 
 
-def exec_child_process(cmd, cwd=None, env=None):
-    startupinfo = None
-    if os.name == "nt":
-        startupinfo = subprocess.STARTUPINFO()  # type: ignore
-        startupinfo.dwFlags |= subprocess.SW_HIDE | subprocess.STARTF_USESHOWWINDOW  # type: ignore
-    full_env = os.environ.copy()
-    full_env.update(env)
-    proc = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        cwd=cwd,
-        env=full_env,
-        startupinfo=startupinfo)
-    stdoutdata, stderrdata = map(lambda s: s.decode('utf-8') if isinstance(s, bytes) else s, proc.communicate())
-    # print("% " + " ".join(cmd))
-    # print('\n'.join(filter(None, [stdoutdata, stderrdata])))
-    if proc.returncode:
-        raise RuntimeError("{}: {}".format(proc.returncode, stderrdata))
-    return stdoutdata, stderrdata
-
-
-def find_file(folder, filename):
-    if os.path.exists(os.path.join(folder, filename)):
-        return True
-    parent_folder = os.path.dirname(folder)
-    if not parent_folder or folder != parent_folder:
-        return False
-    return find_file(parent_folder, filename)
+def rustup_home():
+    return os.environ.get('RUSTUP_HOME') or os.path.expanduser("~/.rustup")
+
+
+def mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class RustupProbes(object):
+    """
+    What rustup said about the toolchain and its components (running rustup is
+    slow), kept on disk and valid while nothing changes in the rustup
+    directories of the channel.
+    """
+    def __init__(self, channel, component_name):
+        self.channel = channel
+        self.component_name = component_name
+        self.lock = threading.Lock()
+        try:
+            with open(probes_path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+    def key(self):
+        home = rustup_home()
+        paths = [
+            home,
+            os.path.join(home, "settings.toml"),
+            os.path.join(home, "toolchains"),
+            os.path.join(home, "update-hashes"),
+        ]
+        try:
+            toolchains = sorted(os.listdir(os.path.join(home, "toolchains")))
+        except OSError:
+            toolchains = []
+        for toolchain in toolchains:
+            if toolchain == self.channel or toolchain.startswith(self.channel + "-"):
+                paths += [
+                    os.path.join(home, "toolchains", toolchain),
+                    os.path.join(home, "toolchains", toolchain, "lib", "rustlib", "components"),
+                    os.path.join(home, "update-hashes", toolchain),
+                ]
+        return [self.channel, self.component_name, [[path, mtime(path)] for path in paths]]
+
+    def save(self):
+        os.makedirs(os.path.dirname(probes_path), exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(probes_path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, probes_path)
+
+    def get(self, name, probe):
+        """Returns the cached result of probe(), running it if there's none (exceptions aren't cached)."""
+        key = self.key()
+        with self.lock:
+            if self.data.get('key') != key:
+                self.data = {'key': key, 'probes': {}, 'updated': self.data.get('updated', 0)}
+            if name in self.data['probes']:
+                return self.data['probes'][name]
+        value = probe()
+        with self.lock:
+            if self.data.get('key') == key:
+                self.data['probes'][name] = value
+                self.save()
+        return value
+
+    def update_due(self, interval):
+        return interval is not None and time.time() - self.data.get('updated', 0) >= interval
+
+    def updated(self):
+        with self.lock:
+            self.data['updated'] = time.time()
+            self.save()
 
 
 class CodeIntelRustClientConfig(ClientConfig):
     def __init__(self):
         self.channel = "nightly"
         self.component_name = "rls-preview"
+        # Seconds between `rustup update` runs (None to never update).
+        self.update_interval = 7 * 24 * 60 * 60
 
         self.name = "rust"
         self.binary_args = [
@@ -87,13 +141,22 @@ class CodeIntelRustClientConfig(ClientConfig):
         }
 
 
+def progress(message):
+    """Returns an on_line callback showing the command's output after message in the spinner."""
+    def on_line(line, stream):
+        spinner.start("Rust-CodeIntel", "{} {}".format(message, line), timeout=-1)
+    return on_line
+
+
 class CodeIntelRustPlugin(LanguageHandler):
     dialogs = True
-    status = None
+    setup = jobs.Task("Rust-CodeIntel")
+    setup_done = False
 
     def __init__(self):
         self._server_name = "Rust Language Server"
         self._config = CodeIntelRustClientConfig()
+        self._probes = RustupProbes(self._config.channel, self._config.component_name)
 
     @property
     def name(self) -> str:
@@ -107,10 +170,13 @@ class CodeIntelRustPlugin(LanguageHandler):
         self.warn_on_missing_cargo_toml(window)
         self.warn_on_rls_toml(window)
         if self.setup_rls_via_rustup(update_rustup=True):
+            self._config.binary_args = pool.binary_args(self._config, window)
+            clients.starting(window, self._config)
             return True
         return False
 
     def on_initialized(self, client) -> None:
+        clients.initialized(self._config, client)
         client.on_notification("textDocument/publishDiagnostics", self.on_diagnostics)
         client.on_notification("window/progress", self.on_progress)
 
@@ -120,21 +186,21 @@ class CodeIntelRustPlugin(LanguageHandler):
         client.on_notification("rustDocument/diagnosticsEnd", self.on_progress)
 
     def on_diagnostics(self, params):
-        spinner.start("Rust-CodeIntel", spinner='monkey')
+        status.start("Rust-CodeIntel", spinner='monkey')
 
     def on_progress(self, params):
-        spinner.start("Rust-CodeIntel", spinner='fire')
+        status.start("Rust-CodeIntel", spinner='fire')
 
     def warn_on_missing_cargo_toml(self, window):
         for folder in window.folders():
-            if find_file(folder, "Cargo.toml"):
+            if markers.index.nearest(folder, "Cargo.toml"):
                 break
         else:
             sublime.status_message("'A Cargo.toml file must be at the root of the workspace in order to support all features")
 
     def warn_on_rls_toml(self, window):
         for folder in window.folders():
-            if find_file(folder, "rls.toml"):
+            if markers.index.nearest(folder, "rls.toml"):
                 sublime.status_message("Found deprecated rls.toml. Use user settings instead (Preferences: LSP Settings)")
                 break
 
@@ -144,19 +210,18 @@ class CodeIntelRustPlugin(LanguageHandler):
         Tries to synthesise RUST_SRC_PATH for Racer, if one is not already set.
         """
         try:
-            stdoutdata, stderrdata = exec_child_process([
+            sysroot = self._probes.get("sysroot", lambda: jobs.run([
                 rustup_command(),
                 "run",
                 self._config.channel,
                 "rustc",
                 "--print",
                 "sysroot",
-            ], env=self._config.env)
+            ], env=self._config.env, timeout=PROBE_TIMEOUT)[0].strip())
         except RuntimeError:
             print("Rust-CodeIntel could not set RUST_SRC_PATH for Racer because it could not read the Rust sysroot for {}.".format(self._config.channel))
             return False
 
-        sysroot = stdoutdata.strip()
         print("Setting sysroot to '{}'".format(sysroot))
         RUST_SRC_PATH = os.environ.get('RUST_SRC_PATH')
         if RUST_SRC_PATH:
@@ -183,26 +248,32 @@ class CodeIntelRustPlugin(LanguageHandler):
 
     def has_toolchain(self):
         try:
-            stdoutdata, stderrdata = exec_child_process([
-                rustup_command(),
-                "toolchain",
-                "list",
-            ], env=self._config.env)
+            return self._probes.get("toolchain", self.probe_toolchain)
         except RuntimeError:
             print("Unexpected error initializing Rust Language Server: error running rustup")
             return False
 
+    def probe_toolchain(self):
+        stdoutdata, stderrdata = jobs.run([
+            rustup_command(),
+            "toolchain",
+            "list",
+        ], env=self._config.env, timeout=PROBE_TIMEOUT)
         return self._config.channel in stdoutdata
 
     def try_to_install_toolchain(self):
-        spinner.start("Rust-CodeIntel", "Installing Rust {} toolchain…".format(self._config.channel), timeout=-1)
+        message = "Installing Rust {} toolchain…".format(self._config.channel)
+        spinner.start("Rust-CodeIntel", message, timeout=-1)
         try:
-            stdoutdata, stderrdata = exec_child_process([
+            stdoutdata, stderrdata = jobs.run([
                 rustup_command(),
                 "toolchain",
                 "install",
                 self._config.channel,
-            ], env=self._config.env)
+            ], env=self._config.env, on_line=progress(message))
+        except jobs.Cancelled:
+            spinner.stop("Installing Rust {} toolchain cancelled".format(self._config.channel))
+            raise
         except RuntimeError:
             spinner.stop("Could not install Rust {} toolchain".format(self._config.channel))
             return False
@@ -224,53 +295,59 @@ class CodeIntelRustPlugin(LanguageHandler):
 
     def has_rls_components(self):
         try:
-            stdoutdata, stderrdata = exec_child_process([
-                rustup_command(),
-                "component",
-                "list",
-                "--toolchain",
-                self._config.channel,
-            ], env=self._config.env)
+            return self._probes.get("components", self.probe_rls_components)
         except RuntimeError:
             print("Unexpected error initializing Rust Language Server - error running rustup")
             return False
 
-        return (
+    def probe_rls_components(self):
+        stdoutdata, stderrdata = jobs.run([
+            rustup_command(),
+            "component",
+            "list",
+            "--toolchain",
+            self._config.channel,
+        ], env=self._config.env, timeout=PROBE_TIMEOUT)
+        return bool(
             re.search(r'^rust-analysis.* \((?:default|installed)\)$', stdoutdata, re.MULTILINE) and
             re.search(r'^rust-src.* \((?:default|installed)\)$', stdoutdata, re.MULTILINE) and
             re.search(r'^' + self._config.component_name + r'.* \((?:default|installed)\)$', stdoutdata, re.MULTILINE)
         )
 
-    def install_component(self, component):
+    def install_rls(self):
+        # A single rustup run for all of them, as concurrent rustup runs on
+        # the same toolchain aren't safe.
+        component_names = ('rust-analysis', 'rust-src', self._config.component_name)
+        message = "Installing {} Rust components…".format(", ".join(component_names))
+        spinner.start("Rust-CodeIntel", message, timeout=-1)
         try:
-            stdoutdata, stderrdata = exec_child_process([
+            jobs.run([
                 rustup_command(),
                 "component",
                 "add",
-                component,
+            ] + list(component_names) + [
                 "--toolchain",
                 self._config.channel,
-            ], env=self._config.env)
+            ], env=self._config.env, on_line=progress(message))
+        except jobs.Cancelled:
+            spinner.stop("Installing Rust components cancelled")
+            raise
         except RuntimeError:
+            spinner.stop("Could not install Rust components {}".format(", ".join(component_names)))
             return False
-        return True
-
-    def install_rls(self):
-        for component_name in ('rust-analysis', 'rust-src', self._config.component_name):
-            spinner.start("Rust-CodeIntel", "Installing {} Rust component…".format(component_name), timeout=-1)
-            if not self.install_component(component_name):
-                spinner.stop("Could not install Rust component {}".format(component_name))
-                return False
         spinner.stop("Rust components installed successfully")
         return True
 
     def rustup_update(self):
         spinner.start("Rust-CodeIntel", "Updating Rustup…", timeout=-1)
         try:
-            stdoutdata, stderrdata = exec_child_process([
+            stdoutdata, stderrdata = jobs.run([
                 rustup_command(),
                 "update",
-            ], env=self._config.env)
+            ], env=self._config.env, on_line=progress("Updating Rustup…"))
+        except jobs.Cancelled:
+            spinner.stop("Updating Rustup cancelled")
+            raise
         except RuntimeError:
             spinner.stop("An error occurred whilst trying to update.")
             return False
@@ -287,36 +364,32 @@ class CodeIntelRustPlugin(LanguageHandler):
     def setup_rls_via_rustup(self, update_rustup=False):
         def _setup_rls_via_rustup():
             try:
-                CodeIntelRustPlugin.status = STATUS_UPDATE
-                if update_rustup:
-                    if not self.rustup_update():
+                if update_rustup and self._probes.update_due(self._config.update_interval):
+                    if self.rustup_update():
+                        self._probes.updated()
+                    else:
                         print("Could not update Rustup")
-                CodeIntelRustPlugin.status = STATUS_TOOLCHAIN
                 if not self.ensure_toolchain():
                     print("Could not start Rust Language Server: toolchain")
-                    CodeIntelRustPlugin.status = None
-                    return False
-                CodeIntelRustPlugin.status = STATUS_ENV
-                if not self.make_rls_env():
+                    return
+                # Both only need the toolchain, so they can go at the same time.
+                has_env, has_rls = jobs.parallel(self.make_rls_env, self.check_for_rls)
+                if not has_env:
                     print("Could not start Rust Language Server: environment")
-                    CodeIntelRustPlugin.status = None
-                    return False
-                CodeIntelRustPlugin.status = STATUS_RLS
-                if not self.check_for_rls():
+                    return
+                if not has_rls:
                     print("Could not start Rust Language Server: rls")
-                    CodeIntelRustPlugin.status = None
-                    return False
-                CodeIntelRustPlugin.status = STATUS_DONE
-                return True
+                    return
+                CodeIntelRustPlugin.setup_done = True
+            except jobs.Cancelled:
+                raise
             except IOError:
                 print("Rustup not available. Install from https://www.rustup.rs/")
             except Exception as err:
                 print("Failed to run command:", err)
-            CodeIntelRustPlugin.status = None
 
-        if CodeIntelRustPlugin.status is None:
-            CodeIntelRustPlugin.status = STATUS_INIT
-            threading.Thread(target=_setup_rls_via_rustup).start()
+        if not CodeIntelRustPlugin.setup_done:
+            CodeIntelRustPlugin.setup.start(_setup_rls_via_rustup)
         return self.has_toolchain() and self.has_rls_components()
 
 
@@ -324,3 +397,7 @@ def plugin_loaded():
     if not rustup_is_installed():
         sublime.message_dialog(
             "Rustup not available. Install from https://www.rustup.rs/")
+
+
+def plugin_unloaded():
+    CodeIntelRustPlugin.setup.cancel()
@@ -1,14 +1,23 @@
 import sublime
 
 import os
+import json
 import shutil
 
 from SublimeCodeIntel.plugin.core.settings import ClientConfig
 from SublimeCodeIntel.plugin.core.handlers import LanguageHandler
-from SublimeCodeIntel.plugin.core.spinner import spinner
+
+from CodeIntelCommon import jobs
+from CodeIntelCommon import pool
+from CodeIntelCommon import clients
+from CodeIntelCommon import status
 
 package_path = os.path.dirname(__file__)
 server_path = os.path.join(package_path, 'server')
+manifest_path = os.path.join(server_path, 'classpath.json')
+
+ARTIFACT = "ch.epfl.lamp:dotty-language-server_0.8:0.8.0"
+MAIN_CLASS = "dotty.tools.languageserver.Main"
 
 
 def java_command():
@@ -19,22 +28,70 @@ def java_is_installed():
     return shutil.which(java_command()) is not None
 
 
+def coursier_args(*args):
+    return [
+        java_command(),
+        "-jar",
+        os.path.join(server_path, "coursier"),
+    ] + list(args)
+
+
+def read_classpath():
+    """Returns the server's classpath from the manifest, if it's there and for ARTIFACT."""
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['artifact'] != ARTIFACT:
+            return None
+        classpath = [os.path.join(server_path, path) for path in manifest['classpath']]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if all(os.path.exists(path) for path in classpath):
+        return classpath
+
+
+def resolve_classpath():
+    """
+    Has coursier resolve the server's classpath and stores it in the
+    manifest, returns it (or None if it can't be resolved).
+    """
+    try:
+        stdoutdata, stderrdata = jobs.run(coursier_args("fetch", "--cache", server_path, "-p", ARTIFACT))
+    except jobs.Cancelled:
+        raise
+    except (OSError, RuntimeError) as err:
+        print("Could not resolve the Scala Language Server's classpath:", err)
+        return None
+    classpath = stdoutdata.strip().split(os.pathsep)
+    relative = []
+    for path in classpath:
+        path = os.path.realpath(path)
+        if path.startswith(os.path.realpath(server_path) + os.sep):
+            path = os.path.relpath(path, os.path.realpath(server_path))
+        relative.append(path)
+    tmp_path = manifest_path + ".tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({'artifact': ARTIFACT, 'classpath': relative}, f, indent=1)
+        os.replace(tmp_path, manifest_path)
+    except OSError as err:
+        print("Could not store the Scala Language Server's classpath:", err)
+    return classpath
+
+
 class CodeIntelScalaClientConfig(ClientConfig):
     def __init__(self):
         self.name = "scala"
-        self.binary_args = [
-            java_command(),
-            "-jar",
-            os.path.join(server_path, "coursier"),
+        self.binary_args = coursier_args(
             "launch",
             "--cache",
             server_path,
-            "ch.epfl.lamp:dotty-language-server_0.8:0.8.0",
+            ARTIFACT,
             "-M",
-            "dotty.tools.languageserver.Main",
+            MAIN_CLASS,
             "--",
             "-stdio"
-        ]
+        )
         self.tcp_port = None
         self.languages = {
             "scala": {
@@ -46,12 +103,22 @@ class CodeIntelScalaClientConfig(ClientConfig):
         self.init_options = {}
         self.settings = {}
         self.env = {}
+        # Seldom used, so the pool stops the server after 15 idle minutes
+        # (unless it takes more than 30 seconds, the JVM is slow, to start again).
+        self.idle_timeout = 15 * 60
+        self.max_resume_time = 30
 
 
 class CodeIntelScalaPlugin(LanguageHandler):
+    resolve = jobs.Task("Scala-CodeIntel")
+    # Set when coursier couldn't resolve the classpath, not to try again
+    # on every start.
+    resolve_failed = False
+
     def __init__(self):
         self._server_name = "Scala Language Server"
         self._config = CodeIntelScalaClientConfig()
+        self._classpath = None
 
     @property
     def name(self) -> str:
@@ -66,16 +133,49 @@ class CodeIntelScalaPlugin(LanguageHandler):
             window.status_message(
                 "{} must be installed to run {}".format(java_command()), self._server_name)
             return False
+        if self._classpath is None:
+            # Resolving only happens the first time (or for a new ARTIFACT),
+            # in the background while that server starts through `coursier
+            # launch`; later starts run the server's main class straight away.
+            classpath = read_classpath()
+            if classpath:
+                self.use_classpath(classpath)
+            elif not CodeIntelScalaPlugin.resolve_failed:
+                CodeIntelScalaPlugin.resolve.start(self.resolve_classpath)
+        self._config.binary_args = pool.binary_args(self._config, window)
+        clients.starting(window, self._config)
         return True
 
+    def resolve_classpath(self):
+        classpath = resolve_classpath()
+        if classpath is None:
+            CodeIntelScalaPlugin.resolve_failed = True
+        else:
+            sublime.set_timeout(lambda: self.use_classpath(classpath), 0)
+
+    def use_classpath(self, classpath):
+        self._classpath = classpath
+        self._config.binary_args = [
+            java_command(),
+            "-cp",
+            os.pathsep.join(classpath),
+            MAIN_CLASS,
+            "-stdio",
+        ]
+
     def on_initialized(self, client) -> None:
+        clients.initialized(self._config, client)
         client.on_notification("textDocument/publishDiagnostics", self.on_diagnostics)
 
     def on_diagnostics(self, params):
-        spinner.start("Scala-CodeIntel", spinner='monkey')
+        status.start("Scala-CodeIntel", spinner='monkey')
 
 
 def plugin_loaded():
     if not java_is_installed():
         sublime.message_dialog(
             "Please install Java")
+
+
+def plugin_unloaded():
+    CodeIntelScalaPlugin.resolve.cancel()
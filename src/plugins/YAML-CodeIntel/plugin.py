@@ -5,7 +5,11 @@ import shutil
 
 from SublimeCodeIntel.plugin.core.settings import ClientConfig
 from SublimeCodeIntel.plugin.core.handlers import LanguageHandler
-from SublimeCodeIntel.plugin.core.spinner import spinner
+
+from CodeIntelCommon import pool
+from CodeIntelCommon import clients
+from CodeIntelCommon import nodehost
+from CodeIntelCommon import status
 
 package_path = os.path.dirname(__file__)
 server_path = os.path.join(package_path, 'server')
@@ -22,11 +26,11 @@ def node_is_installed():
 class CodeIntelYamlClientConfig(ClientConfig):
     def __init__(self):
         self.name = "yaml"
-        self.binary_args = [
+        self.binary_args = nodehost.binary_args([
             node_command(),
             os.path.join(server_path, "yaml-language-server.js"),
             "--stdio"
-        ]
+        ])
         self.tcp_port = None
         self.languages = {
             "yaml": {
@@ -38,6 +42,10 @@ class CodeIntelYamlClientConfig(ClientConfig):
         self.init_options = {}
         self.settings = {}
         self.env = {}
+        # Seldom used, so the pool stops the server after 15 idle minutes
+        # (unless it takes more than 10 seconds to start again).
+        self.idle_timeout = 15 * 60
+        self.max_resume_time = 10
 
 
 class CodeIntelYamlPlugin(LanguageHandler):
@@ -58,13 +66,16 @@ class CodeIntelYamlPlugin(LanguageHandler):
             window.status_message(
                 "{} must be installed to run {}".format(node_command()), self._server_name)
             return False
+        self._config.binary_args = pool.binary_args(self._config, window)
+        clients.starting(window, self._config)
         return True
 
     def on_initialized(self, client) -> None:
+        clients.initialized(self._config, client)
         client.on_notification("textDocument/publishDiagnostics", self.on_diagnostics)
 
     def on_diagnostics(self, params):
-        spinner.start("YAML-CodeIntel", spinner='monkey')
+        status.start("YAML-CodeIntel", spinner='monkey')
 
 
 def plugin_loaded():
@@ -1,12 +1,469 @@
 #!/usr/bin/env python
 import os
 import sys
+import json
+import time
+import socket
+import hashlib
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+server_path = os.path.realpath(os.path.dirname(__file__))
+archive_path = os.path.join(server_path, 'pyls-py%s.zip' % sys.version_info[0])
 
 sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), 'py%s' % sys.version_info[0])))
-sys.path.insert(0, os.path.realpath(os.path.dirname(__file__)))
+sys.path.insert(0, server_path)
+
+clock = getattr(time, 'perf_counter', time.time)
+
+ZYGOTE_DIR = os.path.expanduser('~/.codeintel/zygote')
+ZYGOTE_HELLO = b'pyls-zygote 1\n'
+# Seconds a window waits for the zygote to come up, and an unused zygote stays around.
+ZYGOTE_CONNECT_TIMEOUT = 30
+ZYGOTE_IDLE_TIMEOUT = 30 * 60
+
+zygote_socket = None
+
+
+def process_start_time():
+    """Returns when this process started (from /proc when available)."""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - float(start_ticks) / os.sysconf('SC_CLK_TCK'))
+    except (IOError, OSError, ValueError, IndexError):
+        return time.time()
+
+
+class ImportProfiler(object):
+    """
+    Records how long every module takes to import (by itself and including
+    the modules it imports) and writes it as a tab separated report.
+    """
+    def __init__(self, report_path):
+        self.report_path = report_path
+        self.started = process_start_time()
+        self.marks = [('launcher', time.time())]
+        self.modules = {}  # module -> [self seconds, cumulative seconds]
+        self.stack = []
+        self.written = False
+
+    def install(self):
+        import importlib
+        self.original_import = builtins.__import__
+        self.original_import_module = importlib.import_module
+        builtins.__import__ = self.profiled_import
+        importlib.import_module = self.profiled_import_module
+
+    def uninstall(self):
+        import importlib
+        builtins.__import__ = self.original_import
+        importlib.import_module = self.original_import_module
+
+    def mark(self, label):
+        self.marks.append((label, time.time()))
+
+    def resolve(self, name, globals, level):
+        if level > 0 and globals:
+            package = globals.get('__package__')
+            if not package:
+                package = globals.get('__name__', '')
+                if '__path__' not in globals:
+                    package = package.rpartition('.')[0]
+            base = package.rsplit('.', level - 1)[0]
+            return base + '.' + name if name else base
+        return name
+
+    def timed(self, name, function, *args):
+        if name in sys.modules:
+            return function(*args)
+        start = clock()
+        self.stack.append(0.0)
+        try:
+            return function(*args)
+        finally:
+            elapsed = clock() - start
+            children = self.stack.pop()
+            if self.stack:
+                self.stack[-1] += elapsed
+            entry = self.modules.setdefault(name, [0.0, 0.0])
+            entry[0] += elapsed - children
+            entry[1] += elapsed
+
+    def profiled_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        return self.timed(self.resolve(name, globals, level), self.original_import, name, globals, locals, fromlist, level)
+
+    def profiled_import_module(self, name, package=None):
+        fullname = name
+        if name.startswith('.') and package:
+            level = len(name) - len(name.lstrip('.'))
+            fullname = self.resolve(name[level:], {'__package__': package}, level)
+        return self.timed(fullname, self.original_import_module, name, package)
+
+    def write_report(self):
+        self.written = True
+        packages = {}
+        for name, (own, cumulative) in self.modules.items():
+            packages[name.split('.', 1)[0]] = packages.get(name.split('.', 1)[0], 0.0) + own
+        lines = ["# pyls import profile (pid {}, Python {})".format(os.getpid(), sys.version.split()[0])]
+        for label, when in self.marks:
+            lines.append("# process start -> {}: {:.0f} ms".format(label, (when - self.started) * 1000))
+        lines.append("# slowest packages (self ms): " + ", ".join(
+            "{} {:.0f}".format(name, own * 1000) for name, own in sorted(packages.items(), key=lambda p: -p[1])[:10]))
+        lines.append("self_ms\tcumulative_ms\tpackage\tmodule")
+        for name, (own, cumulative) in sorted(self.modules.items(), key=lambda m: -m[1][1]):
+            lines.append("{:.3f}\t{:.3f}\t{}\t{}".format(own * 1000, cumulative * 1000, name.split('.', 1)[0], name))
+        try:
+            with open(self.report_path, 'w') as f:
+                f.write("\n".join(lines) + "\n")
+        except (IOError, OSError) as e:
+            sys.stderr.write("Could not write import profile to {}: {}\n".format(self.report_path, e))
+
+
+def make_profiler():
+    """
+    Profiling is turned on with --profile-imports (or CODEINTEL_PYLS_PROFILE=1),
+    the report goes next to the --log-file as <name>.imports.tsv
+    """
+    enabled = os.environ.get('CODEINTEL_PYLS_PROFILE', '0') != '0'
+    if '--profile-imports' in sys.argv:
+        sys.argv.remove('--profile-imports')
+        enabled = True
+    if not enabled:
+        return None
+    log_file = '~/.codeintel/pyls.log'
+    if '--log-file' in sys.argv[:-1]:
+        log_file = sys.argv[sys.argv.index('--log-file') + 1]
+    report_path = os.path.splitext(os.path.expanduser(log_file))[0] + '.imports.tsv'
+    return ImportProfiler(report_path)
+
+
+def profile_initialize(profiler):
+    from pyls.python_ls import PythonLanguageServer
+    m_initialize = PythonLanguageServer.m_initialize
+
+    def profiled_initialize(self, *args, **kwargs):
+        try:
+            return m_initialize(self, *args, **kwargs)
+        finally:
+            profiler.mark('initialize reply')
+            profiler.uninstall()
+            profiler.write_report()
+
+    PythonLanguageServer.m_initialize = profiled_initialize
+
+
+# Modules a zygote imports once so its forks start with them loaded.
+PRELOAD = (
+    'pyls.python_ls',
+    'jedi',
+    'parso',
+    'rope.base.project',
+    'pyflakes.api',
+    'pycodestyle',
+    'autopep8',
+    'mccabe',
+    'pydocstyle',
+    'yapf',
+    'pyls_mypy.plugin',
+    'mypy.api',
+)
+
+
+def preload():
+    for name in PRELOAD:
+        try:
+            __import__(name)
+        except Exception:
+            pass
+    try:
+        import pkg_resources
+        for entry_point in pkg_resources.iter_entry_points('pyls'):
+            try:
+                entry_point.load()
+            except Exception:
+                pass
+    except ImportError:
+        pass
+    try:
+        # Have jedi parse and cache the builtins and a common module.
+        import jedi
+        script = jedi.Script("import os\nos.", path='zygote.py')
+        if hasattr(script, 'complete'):
+            script.complete()
+        else:
+            script.completions()
+    except Exception:
+        pass
+
+
+def private_directory(path):
+    """Creates path for this user only, returns False if it's someone else's (or open to others)."""
+    try:
+        os.makedirs(path, 0o700)
+    except OSError:
+        pass
+    try:
+        st = os.stat(path)
+        if st.st_uid != os.getuid():
+            return False
+        if st.st_mode & 0o077:
+            os.chmod(path, 0o700)
+    except OSError:
+        return False
+    return True
+
+
+def zygote_path():
+    """The zygote's socket, per user, Python version and server install."""
+    digest = hashlib.sha1(server_path.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(ZYGOTE_DIR, 'pyls-py{}-{}.sock'.format(sys.version_info[0], digest))
 
 
+def peer_uid(sock):
+    """Returns the user at the other end of a Unix socket, or None if it can't be told."""
+    import struct
+    try:
+        if hasattr(socket, 'SO_PEERCRED'):
+            # Linux: struct ucred (pid, uid, gid)
+            return struct.unpack('3i', sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))[1]
+        if sys.platform == 'darwin' or 'bsd' in sys.platform:
+            # LOCAL_PEERCRED (1) at level SOL_LOCAL (0): struct xucred (version, uid, ...)
+            return struct.unpack('2I', sock.getsockopt(0, getattr(socket, 'LOCAL_PEERCRED', 1), 76)[:8])[1]
+    except (socket.error, struct.error):
+        pass
+    return None
+
+
+def connect_zygote(path):
+    """Returns a socket connected to a zygote at path (which answered the handshake), or None."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(ZYGOTE_CONNECT_TIMEOUT)
+        sock.connect(path)
+        sock.sendall(ZYGOTE_HELLO)
+        reply = b''
+        while not reply.endswith(b'\n') and len(reply) < 64:
+            data = sock.recv(64 - len(reply))
+            if not data:
+                break
+            reply += data
+        if reply == ZYGOTE_HELLO:
+            sock.settimeout(None)
+            return sock
+    except (socket.error, OSError):
+        pass
+    sock.close()
+    return None
+
+
+def bridge(sock):
+    """Copies stdin to sock and sock to stdout until sock's end."""
+    import threading
+    stdin = sys.stdin.fileno()
+    stdout = sys.stdout.fileno()
+
+    def pump():
+        try:
+            while True:
+                data = os.read(stdin, 65536)
+                if not data:
+                    break
+                sock.sendall(data)
+            sock.shutdown(socket.SHUT_WR)
+        except (IOError, OSError):
+            pass
+
+    thread = threading.Thread(target=pump)
+    thread.daemon = True
+    thread.start()
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            break
+        while data:
+            data = data[os.write(stdout, data):]
+
+
+def run_zygote_client(args):
+    """
+    Serves stdio through a server forked by this user's zygote, starting the
+    zygote (detached, with args) if there's none. Returns False if it can't,
+    so a plain server is run instead.
+    """
+    import subprocess
+    if not private_directory(ZYGOTE_DIR):
+        return False
+    path = zygote_path()
+    sock = connect_zygote(path)
+    if sock is None:
+        with open(os.devnull, 'r+b') as devnull:
+            subprocess.Popen(
+                [sys.executable, os.path.realpath(__file__), '--zygote-serve', path] + args,
+                stdin=devnull, stdout=devnull, stderr=devnull,
+                close_fds=True, preexec_fn=os.setsid)
+        deadline = time.time() + ZYGOTE_CONNECT_TIMEOUT
+        while sock is None and time.time() < deadline:
+            time.sleep(0.05)
+            sock = connect_zygote(path)
+    if sock is None:
+        return False
+    bridge(sock)
+    return True
+
+
+def start_zygote_server(bind_addr, port, *args):
+    """
+    Replaces pyls' start_tcp_lang_server: listens on the zygote's socket,
+    preloads the heavy modules and then forks a ready language server for
+    every connection (one per window or pool). Connections from other users,
+    or from users which can't be told, are refused. Only one zygote serves a
+    socket (the one holding its lock), it exits when unused for
+    ZYGOTE_IDLE_TIMEOUT seconds.
+    """
+    import fcntl
+    import inspect
+    try:
+        import socketserver
+    except ImportError:
+        import SocketServer as socketserver
+    from pyls.python_ls import start_io_lang_server
+
+    path = zygote_socket
+    handler_class = args[-1]
+    getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+    with_check_parent = len(getargspec(start_io_lang_server).args) > 3
+
+    lock = open(path + '.lock', 'w')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except (IOError, OSError):
+        return  # another zygote is serving
+
+    class ZygoteHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            # In the forked server: the zygote's lock and socket aren't its own.
+            lock.close()
+            self.server.socket.close()
+            if self.rfile.readline() != ZYGOTE_HELLO:
+                return
+            self.wfile.write(ZYGOTE_HELLO)
+            self.wfile.flush()
+            if with_check_parent:
+                start_io_lang_server(self.rfile, self.wfile, False, handler_class)
+            else:
+                start_io_lang_server(self.rfile, self.wfile, handler_class)
+
+    class ZygoteServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+        timeout = 60
+
+        def verify_request(self, request, client_address):
+            return peer_uid(request) == os.getuid()
+
+    if os.path.exists(path):
+        os.remove(path)
+    server = ZygoteServer(path, ZygoteHandler)
+    os.chmod(path, 0o600)
+    preload()
+    last_used = time.time()
+    try:
+        while True:
+            server.handle_request()
+            server.collect_children()
+            if server.active_children:
+                last_used = time.time()
+            elif time.time() - last_used > ZYGOTE_IDLE_TIMEOUT:
+                break
+    finally:
+        server.server_close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        lock.close()
+
+
+def use_zygote():
+    """
+    `--zygote` serves stdio through a server forked by this user's zygote
+    (where os.fork and Unix sockets are available, elsewhere it's ignored);
+    the zygote itself runs with `--zygote-serve SOCKET`, which is turned into
+    pyls' `--tcp`, served by start_zygote_server. Returns True for the latter.
+    """
+    global zygote_socket
+    if '--zygote' in sys.argv:
+        sys.argv.remove('--zygote')
+        if hasattr(os, 'fork') and hasattr(socket, 'AF_UNIX') and run_zygote_client(sys.argv[1:]):
+            sys.exit(0)
+    if '--zygote-serve' in sys.argv[:-1]:
+        index = sys.argv.index('--zygote-serve')
+        zygote_socket = sys.argv[index + 1]
+        sys.argv[index:index + 2] = ['--tcp']
+        return True
+    return False
+
+
+class IndexFinder(object):
+    """
+    Finds top level modules straight in the sys.path entry which has them,
+    as listed in the index of the precompiled archive (see pyls_zip.py).
+    """
+    def __init__(self, entries):
+        from importlib.machinery import PathFinder
+        self.path_finder = PathFinder
+        self.entries = entries
+
+    def find_spec(self, fullname, path=None, target=None):
+        if path is None:
+            entry = self.entries.get(fullname)
+            if entry is not None:
+                return self.path_finder.find_spec(fullname, [entry])
+
+
+def load_archive():
+    import zipimport
+    try:
+        data = zipimport.zipimporter(archive_path).get_data(os.path.join(archive_path, '__index__.json'))
+    except (zipimport.ZipImportError, IOError, OSError):
+        return
+    index = json.loads(data.decode('utf-8'))
+    sys.path.insert(0, archive_path)
+    if sys.version_info >= (3, 4):
+        entries = dict((name, os.path.normpath(os.path.join(server_path, base))) for name, base in index['loose'].items())
+        entries.update((name, archive_path) for name in index['zip'])
+        sys.meta_path.insert(0, IndexFinder(entries))
+
+
+zygote = use_zygote()
+
+profiler = make_profiler()
+if profiler:
+    profiler.install()
+
+if os.environ.get('CODEINTEL_PYLS_ZIP', '1') != '0' and os.path.exists(archive_path):
+    load_archive()
+
+import pyls_dmypy
+pyls_dmypy.install()
+
 from pyls.__main__ import main
 
+if zygote:
+    import pyls.__main__
+    pyls.__main__.start_tcp_lang_server = start_zygote_server
+
+if profiler:
+    profiler.mark('imports done')
+    profile_initialize(profiler)
+
 if __name__ == '__main__':
-    sys.exit(main())
+    try:
+        sys.exit(main())
+    finally:
+        if profiler and not profiler.written:
+            profiler.write_report()
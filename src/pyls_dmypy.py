@@ -0,0 +1,110 @@
+"""
+Runs pyls-mypy's checks through a mypy daemon (dmypy), which keeps the
+incremental state of the whole project in memory so re-checking a file after
+an edit only re-analyzes what changed.
+
+Enabled with the `pyls.plugins.pyls_mypy.daemon` setting. There is a daemon per
+project, with its status file and cache under ~/.codeintel/mypy/<hash>; it
+shuts itself down after IDLE_TIMEOUT seconds without checks. The daemon only
+checks files on disk, so live mode (unsaved buffers passed with --command,
+pyls-mypy's default) is turned off while it's enabled: files are checked when
+saved.
+"""
+import os
+import sys
+import inspect
+import hashlib
+import subprocess
+
+STATE_DIR = os.path.expanduser('~/.codeintel/mypy')
+IDLE_TIMEOUT = 3600
+
+
+def project_dir(root):
+    return os.path.join(STATE_DIR, hashlib.sha1(root.encode('utf-8')).hexdigest()[:16])
+
+
+def daemon_flags(args):
+    flags = []
+    args = iter(args)
+    for arg in args:
+        if arg == '--incremental':
+            continue  # the daemon always is
+        if arg == '--follow-imports':
+            # dmypy does not support silent; skip is the closest it does.
+            next(args, None)
+            flags += ['--follow-imports', 'skip']
+            continue
+        flags.append(arg)
+    return flags
+
+
+def run(args, root):
+    """Same as mypy.api.run(args), but checks through the project's daemon."""
+    directory = project_dir(root)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    command = [
+        sys.executable, '-m', 'mypy.dmypy',
+        '--status-file', os.path.join(directory, 'dmypy.json'),
+        'run', '--timeout', str(IDLE_TIMEOUT), '--',
+    ] + daemon_flags(args[:-1]) + [
+        '--cache-dir', os.path.join(directory, 'cache'),
+        args[-1],
+    ]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    process = subprocess.Popen(command, cwd=root, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    return out.decode('utf-8', 'replace'), err.decode('utf-8', 'replace'), process.returncode
+
+
+class DaemonConfig(object):
+    """The pyls config, with pyls_mypy's live_mode off."""
+    def __init__(self, config):
+        self._config = config
+
+    def plugin_settings(self, plugin, *args, **kwargs):
+        settings = self._config.plugin_settings(plugin, *args, **kwargs)
+        if plugin == 'pyls_mypy':
+            settings = dict(settings, live_mode=False)
+        return settings
+
+    def __getattr__(self, name):
+        return getattr(self._config, name)
+
+
+class DaemonApi(object):
+    """Stands in for mypy.api in pyls_mypy.plugin."""
+    def __init__(self, api):
+        self.api = api
+        self.enabled = False
+        self.root = None
+
+    def run(self, args):
+        if not self.enabled or '--command' in args:
+            return self.api.run(args)
+        return run(args, self.root or os.path.dirname(os.path.abspath(args[-1])))
+
+
+def install():
+    try:
+        from pyls_mypy import plugin
+    except ImportError:
+        return
+    original = plugin.pyls_lint
+    getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+    # pluggy passes the hook arguments by name, so the wrapper must match them.
+    if getargspec(original).args != ['config', 'workspace', 'document', 'is_saved']:
+        return
+    api = plugin.mypy_api = DaemonApi(plugin.mypy_api)
+
+    def pyls_lint(config, workspace, document, is_saved):
+        api.enabled = bool(config.plugin_settings('pyls_mypy').get('daemon'))
+        api.root = workspace.root_path
+        if api.enabled:
+            config = DaemonConfig(config)
+        return original(config, workspace, document, is_saved)
+
+    pyls_lint.__dict__.update(original.__dict__)  # the hookimpl marker
+    pyls_lint.__doc__ = original.__doc__
+    plugin.pyls_lint = pyls_lint
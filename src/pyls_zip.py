@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Packs the Python language server tree into a single zip with precompiled
+bytecode, which pyls.py then loads through zipimport.
+
+Usage: pyls_zip.py SERVER_DIR
+
+Writes SERVER_DIR/pyls-pyN.zip for the major version N of the interpreter
+running this script (bytecode is only used by that same Python version, others
+fall back to the sources in the archive). Packages which ship extension
+modules or data files need real files, so they stay out of the archive. The
+archive's __index__.json maps every top level module to where it lives.
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import tempfile
+import zipfile
+import py_compile
+
+METADATA_SUFFIXES = ('.dist-info', '.egg-info')
+# Files which can live in the archive, anything else in a package keeps it loose.
+ZIPPABLE_SUFFIXES = ('.py', '.pyi', 'py.typed')
+SKIP = ('pyls.py', 'pyls_dmypy.py', 'py2', 'py3', '__pycache__')
+IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def walk_files(path):
+    for root, dirs, files in os.walk(path, followlinks=True):
+        dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+        for filename in sorted(files):
+            if not filename.endswith(('.pyc', '.pyo')):
+                yield os.path.join(root, filename)
+
+
+def module_name(filename):
+    if filename.endswith(METADATA_SUFFIXES):
+        return None
+    name = filename.split('.', 1)[0]
+    if IDENTIFIER_RE.match(name):
+        return name
+
+
+def zippable(path):
+    if path.endswith(METADATA_SUFFIXES):
+        return True
+    if os.path.isfile(path):
+        return path.endswith('.py')
+    if not os.path.exists(os.path.join(path, '__init__.py')):
+        return False
+    return all(f.endswith(ZIPPABLE_SUFFIXES) for f in walk_files(path))
+
+
+def entries(server_dir, major):
+    """
+    Yields (name, path, base) for every top level entry, in the same order
+    pyls.py puts them in sys.path (so the first one found wins).
+    """
+    seen = set()
+    for base in (server_dir, os.path.join(server_dir, 'py%d' % major)):
+        if not os.path.isdir(base):
+            continue
+        for filename in sorted(os.listdir(base)):
+            if filename in SKIP or filename.startswith('.') or filename.endswith('.zip'):
+                continue
+            path = os.path.join(base, filename)
+            if module_name(filename) is None and not filename.endswith(METADATA_SUFFIXES):
+                continue
+            if os.path.isfile(path) and not filename.endswith(('.py', '.so', '.pyd')):
+                continue
+            key = module_name(filename) or filename
+            if key in seen:
+                continue
+            seen.add(key)
+            yield module_name(filename), path, base
+
+
+def add_source(archive, path, arcname, tmp_dir):
+    archive.write(path, arcname)
+    if not arcname.endswith('.py'):
+        return
+    cfile = os.path.join(tmp_dir, 'module.pyc')
+    try:
+        py_compile.compile(path, cfile=cfile, dfile=arcname, doraise=True)
+    except py_compile.PyCompileError:
+        # Code for another Python version, zipimport will use the source.
+        return
+    # zipimport only looks for the legacy location (module.pyc next to module.py)
+    archive.write(cfile, arcname + 'c')
+
+
+def build(server_dir, major):
+    path = os.path.join(server_dir, 'pyls-py%d.zip' % major)
+    tmp_dir = tempfile.mkdtemp()
+    tmp_path = os.path.join(tmp_dir, 'pyls.zip')
+    index = {'zip': [], 'loose': {}}
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED) as archive:
+            for name, entry, base in entries(server_dir, major):
+                if zippable(entry):
+                    top = os.path.basename(entry)
+                    if os.path.isfile(entry):
+                        add_source(archive, entry, top, tmp_dir)
+                    else:
+                        for filename in walk_files(entry):
+                            arcname = os.path.join(top, os.path.relpath(filename, entry)).replace(os.sep, '/')
+                            add_source(archive, filename, arcname, tmp_dir)
+                    if name:
+                        index['zip'].append(name)
+                elif name:
+                    index['loose'][name] = os.path.relpath(base, server_dir)
+            archive.writestr('__index__.json', json.dumps(index, indent=1, sort_keys=True))
+        if os.path.exists(path):
+            os.remove(path)
+        shutil.move(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_dir)
+    print("{}: {} modules zipped, {} loose".format(path, len(index['zip']), len(index['loose'])))
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.stderr.write("usage: pyls_zip.py SERVER_DIR\n")
+        return 2
+    build(os.path.realpath(sys.argv[1]), sys.version_info[0])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
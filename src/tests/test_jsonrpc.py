@@ -0,0 +1,58 @@
+"""
+Tests for the framing of the proxies (CodeIntelCommon/server/jsonrpc.py): a
+message passed through without decoding must be told apart and routed the
+same as its decoded body.
+
+Usage: python3 -m unittest discover -s tests
+"""
+import os
+import sys
+import json
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'plugins', 'CodeIntelCommon', 'server'))
+
+import jsonrpc  # noqa: E402
+
+
+def routing(message):
+    return (message.get('id'), message.get('method'),
+            message.is_request(), message.is_notification(), message.is_response())
+
+
+class HeadTest(unittest.TestCase):
+    def assertRoutedAsDecoded(self, body):
+        decoded = jsonrpc.Message(data=json.loads(body.decode('utf-8')))
+        self.assertEqual(routing(jsonrpc.Message(body)), routing(decoded))
+
+    def test_id_straddling_head(self):
+        body = b'{"jsonrpc":"2.0","pad":"' + b'x' * (jsonrpc.HEAD_SIZE - 35) + b'","id":123456,"result":null}'
+        self.assertLess(body.index(b'123456'), jsonrpc.HEAD_SIZE)
+        self.assertGreater(body.index(b'123456') + 6, jsonrpc.HEAD_SIZE)
+        self.assertEqual(jsonrpc.Message(body).get('id'), 123456)
+        self.assertRoutedAsDecoded(body)
+
+    def test_with_id_after_straddling_id(self):
+        body = b'{"jsonrpc":"2.0","pad":"' + b'x' * (jsonrpc.HEAD_SIZE - 35) + b'","id":123456,"result":null}'
+        message = jsonrpc.Message(body).with_id(7)
+        self.assertEqual(json.loads(b"".join(bytes(part) for part in message.buffers()[1:]).decode('utf-8')),
+                         {'jsonrpc': "2.0", 'pad': "x" * (jsonrpc.HEAD_SIZE - 35), 'id': 7, 'result': None})
+
+    def test_key_orders(self):
+        for body in [
+            b'{"params":{"x":1},"method":"m","meta":{}}',
+            b'{"result":[1],"extra":{},"id":3,"z":{}}',
+            b'{"jsonrpc":"2.0","method":"r","params":{"a":{}},"id":7}',
+            b'{"jsonrpc":"2.0","params":{"method":"x"},"method":"n"}',
+            b'{"jsonrpc":"2.0","result":{"id":9},"id":2}',
+            b'{"jsonrpc":"2.0","params":{"s":"\\u00e9"},"method":"n"}',
+            b'{"error":{"code":1},"id":null}',
+            b'{"jsonrpc":"2.0","id":1,"result":{"items":[]}}',
+            b'{"jsonrpc":"2.0","method":"n","params":{"a":{}}}',
+        ]:
+            self.assertRoutedAsDecoded(body)
+
+
+if __name__ == '__main__':
+    unittest.main()